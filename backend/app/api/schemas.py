@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field
+from typing import Any, Dict, List, Optional
 
 class ChatRequest(BaseModel):
     message: str
@@ -25,3 +25,54 @@ class UploadReceiptResponse(BaseModel):
     items: List[ReceiptItem] = []
     inserted_id: Optional[int] = None
     confidence: Optional[float] = None
+    sha256: Optional[str] = None
+    image_bytes_in: Optional[int] = None     # upload size
+    image_bytes_sent: Optional[int] = None   # after pre-processing, what the model received
+    thumbnail_url: Optional[str] = None
+    cached: bool = False       # parse served from the content-hash cache (no model call)
+    duplicate: bool = False    # same image already saved; inserted_id is the existing row
+
+class ReceiptJobResponse(BaseModel):
+    job_id: str
+    status: str
+    filename: str | None = None
+    result: Optional[UploadReceiptResponse] = None
+    error: Optional[str] = None
+    created_at: float | None = None
+    started_at: float | None = None
+    finished_at: float | None = None
+
+class BatchReceiptResult(UploadReceiptResponse):
+    filename: str | None = None
+    error: Optional[str] = None
+
+class BatchUploadResponse(BaseModel):
+    ok: bool
+    saved: int
+    duplicates: int
+    failed: int
+    results: List[BatchReceiptResult] = []
+
+class RagBatchSearchRequest(BaseModel):
+    queries: List[str] = Field(..., max_length=100)
+    k: int = 5
+    mode: Optional[str] = None  # vector | lexical | hybrid
+
+class ImportLineError(BaseModel):
+    line: int
+    error: str
+
+class ImportResponse(BaseModel):
+    ok: bool
+    dry_run: bool = False
+    lines: int
+    inserted: int                    # would-be inserts on a dry run
+    duplicates: int
+    failed: int
+    batches: int
+    seconds: float
+    errors: List[ImportLineError] = []  # first 100 only
+
+class ExpensePage(BaseModel):
+    items: List[Dict[str, Any]]      # only the requested fields
+    next_cursor: Optional[str] = None
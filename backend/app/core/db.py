@@ -1,9 +1,12 @@
 from __future__ import annotations
 import os, logging, urllib.parse as up
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from typing import Any, Dict
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase
 from pathlib import Path
 from app.core.settings import settings
+from app.core.db_telemetry import DBTelemetry
 
 log = logging.getLogger(__name__)
 
@@ -37,35 +40,76 @@ DB_URL = _normalize_db_url(raw) if raw else f"sqlite+aiosqlite:///{Path(settings
 
 log.info("Using DB_URL: %s", DB_URL.replace("//", "//***:***@"))  # mask credentials
 
-# Key reliability knobs:
-# - pool_pre_ping: verifies a connection before each checkout; reconnects if broken
-# - pool_recycle: closes & reopens connections periodically (seconds)
-# - pool_size/max_overflow: a small, sane pool for dev
-engine = create_async_engine(
-    DB_URL,
-    echo=False,
-    future=True,
-    pool_pre_ping=True,
-    pool_recycle=900,   # 15 minutes
-    pool_size=5,
-    max_overflow=10,
-)
+# ---- engine profiles ----
+def sqlite_pragmas() -> Dict[str, Any]:
+    # WAL: readers don't block the writer and vice versa; busy_timeout: a second writer waits
+    # for the lock instead of failing with "database is locked"; NORMAL sync is safe under WAL
+    return {
+        "journal_mode": "WAL",
+        "synchronous": settings.SQLITE_SYNCHRONOUS,
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT_MS,
+        "cache_size": -settings.SQLITE_CACHE_MB * 1024,  # negative = KiB
+        "mmap_size": settings.SQLITE_MMAP_MB * 1024 * 1024,
+        "temp_store": "MEMORY",
+    }
 
-SessionLocal = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+def _apply_sqlite_pragmas(engine: AsyncEngine):
+    pragmas = sqlite_pragmas()
 
-class Base(DeclarativeBase):
-    pass
+    @event.listens_for(engine.sync_engine, "connect")
+    def _on_connect(dbapi_conn, _):
+        cur = dbapi_conn.cursor()
+        for k, v in pragmas.items():
+            cur.execute(f"PRAGMA {k}={v}")
+        cur.close()
 
-async def init_db():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+def make_engine(url: str, *, telemetry: DBTelemetry | None = None, **overrides) -> AsyncEngine:
+    """
+    The one place engines are built. Key reliability knobs:
+    - pool_pre_ping: verifies a connection before each checkout; reconnects if broken (network DBs)
+    - pool_recycle: closes & reopens connections periodically (seconds)
+    - pool_size/max_overflow/pool_timeout: bounded pool; exhaustion shows up in /debug/db
+    SQLite additionally gets WAL and the pragmas above on every new connection.
+    """
+    is_sqlite = url.startswith("sqlite")
+    kw: Dict[str, Any] = dict(
+        echo=settings.DB_ECHO,
+        pool_size=settings.DB_POOL_SIZE,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+        pool_timeout=settings.DB_POOL_TIMEOUT_S,
+        pool_recycle=settings.DB_POOL_RECYCLE_S,
+        pool_pre_ping=not is_sqlite,  # a local file can't drop the connection
+    )
+    if is_sqlite:
+        kw["connect_args"] = {"timeout": settings.SQLITE_BUSY_TIMEOUT_MS / 1000}
+    if telemetry is not None:
+        kw["poolclass"] = telemetry.pool_class()
+    kw.update(overrides)
+    engine = create_async_engine(url, **kw)
+    if is_sqlite:
+        _apply_sqlite_pragmas(engine)
+    if telemetry is not None:
+        telemetry.attach(engine)
+    return engine
+
+db_telemetry = DBTelemetry(slow_ms=settings.DB_SLOW_QUERY_MS)
+engine = make_engine(DB_URL, telemetry=db_telemetry)
 
-engine = create_async_engine(DB_URL, echo=False, future=True)
 SessionLocal = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
 
 class Base(DeclarativeBase):
     pass
 
 async def init_db():
+    from app.core.migrations import upgrade_schema
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(upgrade_schema)
+
+async def db_stats() -> Dict[str, Any]:
+    out: Dict[str, Any] = {"dialect": engine.dialect.name, "driver": engine.dialect.driver,
+                           **db_telemetry.stats(engine)}
+    if engine.dialect.name == "sqlite":
+        async with engine.connect() as conn:
+            out["pragmas"] = {k: (await conn.execute(text(f"PRAGMA {k}"))).scalar() for k in sqlite_pragmas()}
+    return out
@@ -0,0 +1,107 @@
+from __future__ import annotations
+import time
+from collections import deque
+from typing import Any, Dict
+from sqlalchemy import event, exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+# Pool and statement counters for one engine, served at /debug/db. Everything is
+# updated from SQLAlchemy events on the event-loop thread, so plain ints suffice.
+
+class DBTelemetry:
+    def __init__(self, slow_ms: float = 200.0, keep_slow: int = 50):
+        self.slow_ms = slow_ms
+        self.connects = self.checkouts = self.checkins = self.invalidations = 0
+        self.pool_timeouts = 0
+        self.waits = 0
+        self.wait_s = self.max_wait_s = 0.0
+        self.queries = 0
+        self.query_s = 0.0
+        self.slow_queries = 0
+        self.slow: deque = deque(maxlen=keep_slow)
+
+    def pool_class(self, base=AsyncAdaptedQueuePool):
+        """Pool subclass that times checkouts (queueing for a free connection + connecting)."""
+        telemetry = self
+
+        class TimedPool(base):
+            def connect(self):
+                t0 = time.perf_counter()
+                try:
+                    return super().connect()
+                except exc.TimeoutError:
+                    telemetry.pool_timeouts += 1
+                    raise
+                finally:
+                    telemetry._wait(time.perf_counter() - t0)
+
+        return TimedPool
+
+    def _wait(self, s: float):
+        self.waits += 1
+        self.wait_s += s
+        self.max_wait_s = max(self.max_wait_s, s)
+
+    def attach(self, engine):
+        target = engine.sync_engine if hasattr(engine, "sync_engine") else engine
+
+        @event.listens_for(target, "connect")
+        def _connect(*_):
+            self.connects += 1
+
+        @event.listens_for(target, "checkout")
+        def _checkout(*_):
+            self.checkouts += 1
+
+        @event.listens_for(target, "checkin")
+        def _checkin(*_):
+            self.checkins += 1
+
+        @event.listens_for(target, "invalidate")
+        def _invalidate(*_):
+            self.invalidations += 1
+
+        @event.listens_for(target, "before_cursor_execute")
+        def _before(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("_query_t0", []).append(time.perf_counter())
+
+        @event.listens_for(target, "after_cursor_execute")
+        def _after(conn, cursor, statement, parameters, context, executemany):
+            starts = conn.info.get("_query_t0")
+            if not starts:
+                return
+            s = time.perf_counter() - starts.pop()
+            self.queries += 1
+            self.query_s += s
+            if s * 1000 >= self.slow_ms:
+                self.slow_queries += 1
+                self.slow.append({"ms": round(s * 1000, 1), "sql": " ".join(statement.split())[:500],
+                                  "executemany": executemany, "at": time.time()})
+
+        @event.listens_for(target, "handle_error")
+        def _error(ctx):
+            starts = ctx.connection.info.get("_query_t0") if ctx.connection is not None else None
+            if starts:
+                starts.pop()
+        return self
+
+    def stats(self, engine=None) -> Dict[str, Any]:
+        out: Dict[str, Any] = {
+            "connects": self.connects,
+            "checkouts": self.checkouts,
+            "checkins": self.checkins,
+            "invalidations": self.invalidations,
+            "pool_timeouts": self.pool_timeouts,
+            "checkout_wait_ms_avg": round(self.wait_s / self.waits * 1000, 3) if self.waits else None,
+            "checkout_wait_ms_max": round(self.max_wait_s * 1000, 3),
+            "queries": self.queries,
+            "query_ms_avg": round(self.query_s / self.queries * 1000, 3) if self.queries else None,
+            "slow_query_ms": self.slow_ms,
+            "slow_queries": self.slow_queries,
+            "slowest_recent": sorted(self.slow, key=lambda q: q["ms"], reverse=True)[:10],
+        }
+        pool = getattr(engine, "pool", None)
+        if pool is not None and hasattr(pool, "checkedout"):
+            out["pool"] = {"size": pool.size(), "checked_out": pool.checkedout(),
+                           "checked_in": pool.checkedin(), "overflow": pool.overflow()}
+        return out
@@ -1,11 +1,14 @@
+from functools import lru_cache
 from google import genai
 from app.core.settings import settings
 
-_client = genai.Client(api_key=settings.GOOGLE_API_KEY)
+@lru_cache(maxsize=1)
+def get_client() -> genai.Client:
+    return genai.Client(api_key=settings.GOOGLE_API_KEY)
 
 def ask_gemini(prompt: str) -> str:
     try:
-        resp = _client.models.generate_content(
+        resp = get_client().models.generate_content(
             model=settings.GENAI_MODEL,
             contents=prompt
         )
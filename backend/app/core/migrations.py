@@ -0,0 +1,54 @@
+from __future__ import annotations
+import logging
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+
+log = logging.getLogger(__name__)
+
+# In-place upgrades for databases created before a column/index existed. create_all only
+# creates missing tables, so anything added to an existing table is brought in here.
+# Every step is idempotent; runs on startup (init_db) for SQLite and Postgres alike.
+
+_NEW_COLUMNS = {
+    "expenses": [("category_norm", "VARCHAR(64)"), ("vendor_norm", "VARCHAR(128)")],
+}
+
+def _add_missing_columns(conn: Connection) -> list[str]:
+    insp = inspect(conn)
+    added = []
+    for table, cols in _NEW_COLUMNS.items():
+        if not insp.has_table(table):
+            continue
+        have = {c["name"] for c in insp.get_columns(table)}
+        for name, ddl in cols:
+            if name not in have:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+                added.append(f"{table}.{name}")
+    return added
+
+def _backfill_expense_norms(conn: Connection, batch: int = 1000) -> int:
+    # done in Python rather than SQL lower(): SQLite's lower() is ASCII-only
+    from app.models.expense import norm
+    done = 0
+    while True:
+        rows = conn.execute(text(
+            "SELECT id, category, vendor FROM expenses "
+            "WHERE category_norm IS NULL OR vendor_norm IS NULL LIMIT :n"), {"n": batch}).all()
+        if not rows:
+            return done
+        conn.execute(text("UPDATE expenses SET category_norm = :c, vendor_norm = :v WHERE id = :id"),
+                     [{"id": r.id, "c": norm(r.category), "v": norm(r.vendor)} for r in rows])
+        done += len(rows)
+
+def _create_missing_indexes(conn: Connection):
+    from app.core.db import Base
+    for table in Base.metadata.sorted_tables:
+        for ix in table.indexes:
+            ix.create(conn, checkfirst=True)
+
+def upgrade_schema(conn: Connection):
+    added = _add_missing_columns(conn)
+    n = _backfill_expense_norms(conn)
+    _create_missing_indexes(conn)
+    if added or n:
+        log.info("Schema upgraded: added %s, backfilled %d rows.", added or "no columns", n)
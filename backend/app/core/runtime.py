@@ -6,39 +6,60 @@ from app.core.settings import settings
 os.environ.setdefault("GOOGLE_API_KEY", settings.GOOGLE_API_KEY)
 os.environ.setdefault("GOOGLE_GENAI_USE_VERTEXAI", "False")
 
-from google.adk.runners import Runner
-from google.adk.sessions.in_memory_session_service import InMemorySessionService
-from google.adk.agents.run_config import RunConfig
-from app.agent.agent import root_agent
+import hashlib, threading, uuid
 
 # NEW: import Content/Part to build a proper message
 from google.genai.types import Content, Part
 
 APP_NAME = "MultimodalExpenseAgent"
-_session_service = InMemorySessionService()
-_runner = Runner(app_name=APP_NAME, agent=root_agent, session_service=_session_service)
+
+# ADK (agent, tools, session service, Runner) is imported and built on first use or by
+# the background warm-up, so a worker that only serves SQL endpoints never pays for it.
+_init_lock = threading.Lock()
+_session_service = None
+_runner = None
+
+def get_session_service():
+    global _session_service
+    if _session_service is None:
+        with _init_lock:
+            if _session_service is None:
+                from app.core.sessions import build_session_service
+                _session_service = build_session_service()
+    return _session_service
+
+def get_runner():
+    global _runner
+    if _runner is None:
+        service = get_session_service()
+        with _init_lock:
+            if _runner is None:
+                from google.adk.runners import Runner
+                from app.agent.agent import root_agent
+                _runner = Runner(app_name=APP_NAME, agent=root_agent, session_service=service)
+    return _runner
 
 # ---- Compat helpers: handle multiple ADK signatures & None returns ----
 async def _get_session_compat(session_id: str, user_id: str):
     try:
         # Newer ADK
-        return await _session_service.get_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+        return await get_session_service().get_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
     except TypeError:
         # Older ADK takes only session_id or (app_name, user_id, session_id) positional
         try:
-            return await _session_service.get_session(session_id)
+            return await get_session_service().get_session(session_id)
         except TypeError:
-            return await _session_service.create_session(APP_NAME, user_id, session_id)
+            return await get_session_service().create_session(APP_NAME, user_id, session_id)
 
 async def _create_session_compat(session_id: str, user_id: str):
     try:
-        return await _session_service.create_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
+        return await get_session_service().create_session(app_name=APP_NAME, user_id=user_id, session_id=session_id)
     except TypeError:
         try:
-            return await _session_service.create_session(APP_NAME, user_id, session_id)
+            return await get_session_service().create_session(APP_NAME, user_id, session_id)
         except TypeError:
             # Some very old builds accept only session_id
-            return await _session_service.create_session(session_id)
+            return await get_session_service().create_session(session_id)
 
 async def ensure_session(session_id: str, user_id: str | None = None):
     user_id = user_id or session_id
@@ -62,18 +83,55 @@ def _to_content(message) -> Content:
         return message
     return Content(role="user", parts=[_mk_part(str(message))])
 
-async def run_agent(session_id: str, message_content):
+async def stream_agent(session_id: str, message_content, partial_text: bool = False):
+    """
+    Yield ADK events as the runner produces them. With partial_text=True the model
+    response is streamed (SSE mode): text arrives as `partial` delta events, followed
+    by the aggregated final event.
+    """
+    from google.adk.agents.run_config import RunConfig, StreamingMode
+    runner = get_runner()
     session = await ensure_session(session_id)
-    rc = RunConfig(response_modalities=["TEXT"])
+    rc = RunConfig(
+        response_modalities=["TEXT"],
+        streaming_mode=StreamingMode.SSE if partial_text else StreamingMode.NONE,
+    )
 
-    events = []
     # Pass Content, not str
     content = _to_content(message_content)
-    async for e in _runner.run_async(
+    async for e in runner.run_async(
         user_id=session.user_id,
         session_id=session.id,
         new_message=content,
         run_config=rc,
     ):
-        events.append(e)
-    return events
+        yield e
+
+async def run_agent(session_id: str, message_content):
+    return [e async for e in stream_agent(session_id, message_content)]
+
+# ---- turns answered without the agent (intent router, chat cache) ----
+def _event_text(e) -> str:
+    parts = getattr(getattr(e, "content", None), "parts", None) or []
+    return "".join(getattr(p, "text", None) or "" for p in parts).strip()
+
+async def turn_context(session_id: str) -> str:
+    """Fingerprint of the session's last exchange ("" for a fresh session); scopes cached answers."""
+    session = await ensure_session(session_id)
+    texts = [t for t in (_event_text(e) for e in (session.events or [])) if t][-2:]
+    return hashlib.sha256("\x1f".join(texts).encode()).hexdigest()[:16] if texts else ""
+
+async def record_turn(session_id: str, user_text: str, reply_text: str):
+    """Append a locally answered turn to the ADK session so later agent turns see it."""
+    from google.adk.events import Event
+    from app.agent.agent import root_agent
+    session = await ensure_session(session_id)
+    invocation_id = f"local-{uuid.uuid4().hex[:12]}"
+    for author, role, text in (("user", "user", user_text), (root_agent.name, "model", reply_text)):
+        event = Event(invocation_id=invocation_id, author=author, content=Content(role=role, parts=[_mk_part(text)]))
+        await get_session_service().append_event(session, event)
+
+def session_stats():
+    if _session_service is None:
+        return {"backend": settings.SESSION_BACKEND.lower(), "loaded": False}
+    return _session_service.stats()
@@ -0,0 +1,196 @@
+from __future__ import annotations
+import logging, time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from google.adk.sessions.base_session_service import BaseSessionService, GetSessionConfig, ListSessionsResponse
+from google.adk.sessions.in_memory_session_service import InMemorySessionService
+from app.core.settings import settings
+
+log = logging.getLogger(__name__)
+
+_Key = Tuple[str, str, str]  # (app_name, user_id, session_id)
+
+def _event_size(event) -> int:
+    try:
+        return len(event.model_dump_json(exclude_none=True))
+    except Exception:
+        return 1024
+
+def _history_start(events: list, max_events: int) -> int:
+    """
+    Index to keep events from so at most `max_events` remain. Cuts only at a user turn,
+    so a function_call is never separated from its function_response.
+    """
+    if max_events <= 0 or len(events) <= max_events:
+        return 0
+    for i in range(len(events) - max_events, len(events)):
+        if getattr(events[i], "author", None) == "user":
+            return i
+    return len(events) - max_events
+
+class BoundedSessionService(BaseSessionService):
+    """
+    Wraps an ADK session service with:
+    - per-session history limit (older turns are dropped from what the runner sees,
+      and from storage for the in-memory backend)
+    - idle TTL (expired sessions are deleted on access and on periodic sweeps)
+    - for the in-memory backend, an LRU cap on session count and on approximate total bytes
+    """
+
+    def __init__(self, inner: BaseSessionService, *, max_sessions: int, ttl_s: int,
+                 max_events: int, max_bytes: int):
+        self.inner = inner
+        self.max_sessions = max_sessions
+        self.ttl_s = ttl_s
+        self.max_events = max_events
+        self.max_bytes = max_bytes
+        self._in_memory = isinstance(inner, InMemorySessionService)
+        # LRU of key -> (last_used, approx_bytes); oldest first
+        self._lru: "OrderedDict[_Key, Tuple[float, int]]" = OrderedDict()
+        self._bytes = 0
+        self._apps: set[str] = set()
+        self._evicted = 0
+        self._last_sweep = time.time()
+
+    # ---- bookkeeping ----
+    def _touch(self, key: _Key, add_bytes: int = 0):
+        self._apps.add(key[0])
+        if not self._in_memory:
+            return  # persistent backend: recency lives in the shared last_update_time
+        _, size = self._lru.pop(key, (0.0, 0))
+        self._lru[key] = (time.time(), size + add_bytes)
+        self._bytes += add_bytes
+
+    def _forget(self, key: _Key):
+        _, size = self._lru.pop(key, (0.0, 0))
+        self._bytes -= size
+
+    async def _evict(self, key: _Key):
+        self._forget(key)
+        self._evicted += 1
+        app_name, user_id, session_id = key
+        await self.inner.delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+
+    async def _enforce_caps(self, keep: _Key | None = None):
+        if not self._in_memory:
+            return
+        while self._lru and (len(self._lru) > self.max_sessions or self._bytes > self.max_bytes):
+            oldest = next(iter(self._lru))
+            if oldest == keep:
+                break
+            await self._evict(oldest)
+
+    async def _sweep(self):
+        now = time.time()
+        if now - self._last_sweep < min(self.ttl_s, 300):
+            return
+        self._last_sweep = now
+        if self._in_memory:
+            for key, (last_used, _) in list(self._lru.items()):
+                if now - last_used > self.ttl_s:
+                    await self._evict(key)
+            return
+        # persistent backend: expiry is judged on the shared last_update_time
+        for app_name in self._apps:
+            resp = await self.inner.list_sessions(app_name=app_name)
+            for s in resp.sessions:
+                if now - (s.last_update_time or now) > self.ttl_s:
+                    await self._evict((s.app_name, s.user_id, s.id))
+
+    def _trim_storage(self, key: _Key):
+        # in-memory only: drop old turns from the stored copy and release their bytes
+        app_name, user_id, session_id = key
+        stored = self.inner.sessions.get(app_name, {}).get(user_id, {}).get(session_id)
+        if stored is None:
+            return
+        start = _history_start(stored.events, self.max_events)
+        if start:
+            freed = sum(_event_size(e) for e in stored.events[:start])
+            del stored.events[:start]
+            self._touch(key, -freed)
+
+    # ---- BaseSessionService ----
+    async def create_session(self, *, app_name: str, user_id: str, state: Optional[Dict[str, Any]] = None,
+                             session_id: Optional[str] = None):
+        await self._sweep()
+        sess = await self.inner.create_session(app_name=app_name, user_id=user_id, state=state, session_id=session_id)
+        key = (app_name, user_id, sess.id)
+        self._touch(key)
+        await self._enforce_caps(keep=key)
+        return sess
+
+    async def get_session(self, *, app_name: str, user_id: str, session_id: str,
+                          config: Optional[GetSessionConfig] = None):
+        await self._sweep()
+        key = (app_name, user_id, session_id)
+        sess = await self.inner.get_session(app_name=app_name, user_id=user_id, session_id=session_id, config=config)
+        if sess is None:
+            self._forget(key)
+            return None
+        last_used = self._lru.get(key, (sess.last_update_time or time.time(), 0))[0]
+        if time.time() - max(last_used, sess.last_update_time or 0) > self.ttl_s:
+            await self._evict(key)
+            return None
+        start = _history_start(sess.events, self.max_events)
+        if start:
+            sess.events = sess.events[start:]  # returned copy only; what the runner will see
+        self._touch(key)
+        return sess
+
+    async def list_sessions(self, *, app_name: str, user_id: Optional[str] = None) -> ListSessionsResponse:
+        return await self.inner.list_sessions(app_name=app_name, user_id=user_id)
+
+    async def delete_session(self, *, app_name: str, user_id: str, session_id: str) -> None:
+        self._forget((app_name, user_id, session_id))
+        await self.inner.delete_session(app_name=app_name, user_id=user_id, session_id=session_id)
+
+    async def append_event(self, session, event):
+        event = await self.inner.append_event(session=session, event=event)
+        if getattr(event, "partial", False):
+            return event
+        key = (session.app_name, session.user_id, session.id)
+        if self._in_memory:
+            self._touch(key, _event_size(event))
+            self._trim_storage(key)
+            await self._enforce_caps(keep=key)
+        return event
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory" if self._in_memory else "database",
+            "sessions": len(self._lru) if self._in_memory else None,
+            "approx_bytes": self._bytes if self._in_memory else None,
+            "evicted": self._evicted,
+            "max_sessions": self.max_sessions,
+            "max_events": self.max_events,
+            "ttl_s": self.ttl_s,
+        }
+
+def _database_session_service(url: str) -> BaseSessionService:
+    from google.adk.sessions.database_session_service import DatabaseSessionService
+    try:
+        return DatabaseSessionService(db_url=url)
+    except Exception:
+        # newer ADK builds create an async engine and need an async driver
+        if url.startswith("sqlite:///"):
+            return DatabaseSessionService(db_url=url.replace("sqlite:///", "sqlite+aiosqlite:///", 1))
+        raise
+
+def build_session_service() -> BoundedSessionService:
+    """SESSION_BACKEND=memory (default) or sqlite (survives restarts, shared across workers)."""
+    backend = settings.SESSION_BACKEND.lower()
+    if backend == "sqlite":
+        url = settings.SESSION_DB_URL or f"sqlite:///{Path(settings.SQLITE_PATH).resolve().with_name('sessions.sqlite')}"
+        inner = _database_session_service(url)
+        log.info("Chat sessions: database-backed (%s)", url.split("///")[-1])
+    else:
+        inner = InMemorySessionService()
+    return BoundedSessionService(
+        inner,
+        max_sessions=settings.SESSION_MAX,
+        ttl_s=settings.SESSION_TTL_S,
+        max_events=settings.SESSION_MAX_EVENTS,
+        max_bytes=settings.SESSION_MAX_BYTES,
+    )
@@ -14,4 +14,74 @@ class Settings(BaseSettings):
     USE_VERTEXAI: bool = False
     DATABASE_URL: str | None = None
 
+    # Database engine (app/core/db.make_engine); pool/slow-query numbers at /debug/db
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT_S: float = 30      # wait for a free connection before erroring
+    DB_POOL_RECYCLE_S: int = 900       # 15 minutes
+    DB_ECHO: bool = False
+    DB_SLOW_QUERY_MS: float = 200      # statements at least this slow are kept for /debug/db
+    # SQLite only, applied on every connection (journal_mode is always WAL)
+    SQLITE_SYNCHRONOUS: str = "NORMAL" # NORMAL is durable across app crashes under WAL; FULL for power loss
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000 # writers queue for the lock instead of "database is locked"
+    SQLITE_CACHE_MB: int = 64
+    SQLITE_MMAP_MB: int = 256
+
+    # Receipt storage: content-addressed under UPLOAD_DIR/<sha[:2]>/<sha[2:4]>/<sha>.<ext>
+    UPLOAD_DIR: str = "db/uploads"
+    RECEIPT_DEDUPE: bool = True        # duplicate upload -> return the existing expense row
+    MAX_RECEIPT_BYTES: int = 20 * 1024 * 1024
+
+    # Receipt image pre-processing before the model call
+    RECEIPT_PREPROCESS: bool = True
+    RECEIPT_MAX_EDGE: int = 1600       # px, long edge; plenty to read a total
+    RECEIPT_TARGET_BYTES: int = 350_000
+    RECEIPT_JPEG_QUALITY: int = 85     # starting quality; stepped down to hit the budget
+    RECEIPT_MIN_QUALITY: int = 45
+    RECEIPT_GRAYSCALE: bool = False
+    RECEIPT_AUTOCROP: bool = False     # trim uniform background around the paper
+    RECEIPT_THUMB_EDGE: int = 256
+
+    # Chat sessions (ADK): memory | sqlite
+    SESSION_BACKEND: str = "memory"
+    SESSION_DB_URL: str | None = None  # default: sessions.sqlite next to SQLITE_PATH
+    SESSION_MAX: int = 1000            # in-memory: LRU cap on live sessions
+    SESSION_MAX_BYTES: int = 64 * 1024 * 1024
+    SESSION_TTL_S: int = 6 * 3600      # idle sessions are dropped after this
+    SESSION_MAX_EVENTS: int = 60       # history kept per session (trimmed at turn boundaries)
+
+    # Answer plain spend/summary questions straight from SQL, skipping the agent
+    INTENT_ROUTER_ENABLED: bool = True
+
+    # Cache for read-only chat answers (invalidated by any expense write)
+    CHAT_CACHE_ENABLED: bool = True
+    CHAT_CACHE_TTL_S: int = 300
+    CHAT_CACHE_MAX: int = 512
+    CHAT_CACHE_SCOPE: str = "session"  # session | global
+
+    # Background receipt processing (/api/receipt-jobs)
+    RECEIPT_WORKERS: int = 2           # concurrent parse+insert workers per process
+    RECEIPT_QUEUE_MAX: int = 100       # pending jobs before uploads get a 503
+    RECEIPT_JOB_TTL_S: int = 3600      # how long finished jobs stay queryable
+    RECEIPT_BATCH_CONCURRENCY: int = 4 # parallel model calls per /api/upload-receipts request
+    RECEIPT_BATCH_MAX_FILES: int = 100
+
+    # /api/import/expenses and scripts/import_expenses.py: rows per INSERT + commit
+    IMPORT_BATCH_SIZE: int = 1000
+    # /api/export/expenses and scripts/export_expenses.py: rows fetched (and encoded) at a time
+    EXPORT_BATCH_SIZE: int = 5000
+
+    # Group commit: concurrent add_expense calls within the window share one INSERT + commit
+    WRITE_COALESCE: bool = False
+    WRITE_COALESCE_WINDOW_MS: float = 2.0
+    WRITE_COALESCE_MAX_BATCH: int = 256
+
+    # Answer summaries from the expense_monthly rollups (raw rows only at partial-month edges)
+    ROLLUPS_ENABLED: bool = True
+
+    # Preload the embedding model, ADK runner and Gemini clients in the background after startup
+    WARMUP_ENABLED: bool = True
+    WARMUP_ATTEMPTS: int = 5           # failed components are retried with exponential backoff
+    WARMUP_RETRY_S: float = 2.0
+
 settings = Settings()
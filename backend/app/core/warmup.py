@@ -0,0 +1,94 @@
+from __future__ import annotations
+import asyncio, logging, time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+from app.core.settings import settings
+
+log = logging.getLogger(__name__)
+
+class Warmup:
+    """
+    Startup phase timings + background warm-up of lazily built components.
+    Liveness (/healthz) never waits on this; readiness (/readyz) reports it.
+    """
+
+    def __init__(self, *, attempts: int = 5, retry_s: float = 2.0, max_retry_s: float = 60.0):
+        self.phases: Dict[str, float] = {}      # startup phase -> seconds
+        self.components: Dict[str, Dict[str, Any]] = {}
+        self._steps: List[tuple[str, Callable[[], Any], bool]] = []
+        self._task: Optional[asyncio.Task] = None
+        self.attempts = max(1, attempts)
+        self.retry_s = retry_s
+        self.max_retry_s = max_retry_s
+        self.started_at = time.time()
+
+    @contextmanager
+    def phase(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = round(time.perf_counter() - t0, 3)
+            log.info("Startup phase %s: %.3fs", name, self.phases[name])
+
+    def register(self, name: str, fn: Callable[[], Any], *, required: bool = True):
+        """
+        `fn` is blocking; it runs in a worker thread, after the ones registered before it.
+        Optional components (the app degrades without them) don't hold back readiness.
+        """
+        self._steps.append((name, fn, required))
+        self.components[name] = {"status": "pending", "required": required}
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def _load(self, name: str, fn: Callable[[], Any], required: bool, attempt: int) -> bool:
+        self.components[name] = {"status": "loading", "required": required, "attempts": attempt}
+        t0 = time.perf_counter()
+        try:
+            detail = await asyncio.to_thread(fn)
+        except Exception as e:
+            # until a retry succeeds the component stays lazy: first real use tries the load itself
+            self.components[name] = {"status": "failed", "required": required, "attempts": attempt,
+                                     "error": str(e), "seconds": round(time.perf_counter() - t0, 3)}
+            log.warning("Warm-up %s failed (attempt %d/%d): %s", name, attempt, self.attempts, e)
+            return False
+        self.components[name] = {"status": "ready", "required": required, "attempts": attempt,
+                                 "seconds": round(time.perf_counter() - t0, 3)}
+        if isinstance(detail, dict):
+            self.components[name].update(detail)
+        log.info("Warm-up %s ready in %.3fs", name, self.components[name]["seconds"])
+        return True
+
+    async def _run(self):
+        # one pass over every step, then retry just the failures with exponential backoff
+        pending, delay = list(self._steps), self.retry_s
+        for attempt in range(1, self.attempts + 1):
+            pending = [step for step in pending if not await self._load(*step, attempt)]
+            if not pending or attempt == self.attempts:
+                break
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_retry_s)
+        if pending:
+            log.warning("Warm-up gave up on %s after %d attempts.", [n for n, _, _ in pending], self.attempts)
+        log.info("Warm-up finished %.3fs after startup.", time.time() - self.started_at)
+
+    def pending(self, *names: str) -> bool:
+        """True while any of `names` is registered but not ready (loading, retrying or degraded)."""
+        return any(self.components[n]["status"] != "ready" for n in names if n in self.components)
+
+    def ready(self) -> bool:
+        return all(c["status"] == "ready" for c in self.components.values() if c["required"])
+
+    def stats(self) -> Dict[str, Any]:
+        degraded = [n for n, c in self.components.items() if not c["required"] and c["status"] == "failed"]
+        return {"ready": self.ready(), "degraded": degraded, "startup_phases": self.phases,
+                "components": self.components}
+
+warmup = Warmup(attempts=settings.WARMUP_ATTEMPTS, retry_s=settings.WARMUP_RETRY_S)
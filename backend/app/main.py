@@ -1,27 +1,42 @@
 from fastapi import FastAPI, UploadFile, File, HTTPException, Depends, Query
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.schemas import ChatRequest, ChatResponse, UploadReceiptResponse
-from app.core.runtime import run_agent
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from app.api.schemas import (
+    ChatRequest, ChatResponse, UploadReceiptResponse, ReceiptJobResponse, BatchUploadResponse,
+    RagBatchSearchRequest, ImportResponse, ExpensePage,
+)
+from app.core.runtime import run_agent, stream_agent, session_stats, get_runner, record_turn, turn_context
+from app.core.warmup import warmup
 from app.core.settings import settings
-from app.core.db import init_db
+from app.core.db import init_db, db_stats
 from app.api.db_dep import get_db
 
 import logging
 from typing import Iterable, List, Optional, Dict, Any
-from app.services.receipt import parse_receipt_bytes, guess_category
-from app.services.expense_service import add_expense
+from app.services.receipt_pipeline import process_receipt, process_receipts_batch
+from app.services.receipt_jobs import receipt_jobs, QueueFull
+from app.services.receipt_store import save_upload, UploadRejected, thumbnail_path_for
+from app.services.chat_cache import chat_cache, cache_scope
+from app.services import intent_router
+from app.services.categorizer import vendor_table
+from app.services.expense_service import data_version, list_expenses_page, select_fields, write_coalescer
+from app.services.rollups import ensure_rollups
+from app.services.importer import import_expenses, detect_format, open_text
+from app.services.exporter import export_expenses, check_format, FORMATS as EXPORT_FORMATS
+import asyncio
 from app.core.db import SessionLocal
-from datetime import datetime
+from datetime import date, datetime
 from app.api.schemas import ReceiptItem
-from app.core.llm_fallback import ask_gemini
+from app.core.llm_fallback import ask_gemini, get_client as fallback_client
+from app.services.receipt import get_client as receipt_client
 from app.services.tools import (
-    tool_add_expense, tool_total_spend, tool_summary_by_category, tool_rag_search
+    tool_add_expense, tool_total_spend, tool_summary_by_category, tool_rag_search, tool_rag_search_many
 )
 from pathlib import Path
 import json
 
 # NEW: use RAG directly (not the ADK tool wrapper)
-from app.services.rag import search as rag_search
+from app.services.rag import search as rag_search, embedding_cache, embed_batcher, warm_up as rag_warm_up
 from app.services.rag_bootstrap import ensure_seed
 import re
 
@@ -44,45 +59,107 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-UPLOAD_DIR = Path("db/uploads"); UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-
 @app.on_event("startup")
 async def _startup():
-    await init_db()
-    try:
-        if ensure_seed():
-            log.info("RAG index seeded.")
-    except Exception as e:
-        log.warning(f"RAG seed skipped: {e}")
+    with warmup.phase("init_db"):
+        await init_db()
+    with warmup.phase("rollups"):
+        async with SessionLocal() as db:
+            await ensure_rollups(db)
+    with warmup.phase("vendor_table"):
+        async with SessionLocal() as db:
+            n = await vendor_table.load(db)
+    log.info("Vendor table loaded (%d vendors).", n)
+    with warmup.phase("receipt_jobs"):
+        receipt_jobs.start()
     log.info("DB initialized.")
 
+    # heavy components load in the background; the API is live meanwhile (see /readyz)
+    # RAG is optional: search degrades to empty results, so it doesn't hold back /readyz
+    warmup.register("rag_index", _seed_rag, required=False)
+    if settings.WARMUP_ENABLED:
+        warmup.register("embeddings", rag_warm_up, required=False)
+        warmup.register("agent", _warm_agent)
+        warmup.register("genai", _warm_genai)
+    warmup.start()
+
+def _seed_rag():
+    report = ensure_seed()
+    if report.embedded or report.deleted:
+        log.info("RAG index synced: %s", report.to_dict())
+    return report.to_dict()
+
+def _warm_agent():
+    get_runner()
+
+def _warm_genai():
+    receipt_client()
+    fallback_client()
+
+@app.on_event("shutdown")
+async def _shutdown():
+    await warmup.stop()
+    await receipt_jobs.stop()
+    await write_coalescer.drain()
+
 @app.get("/healthz")
 def healthz():
     ok = bool(settings.GOOGLE_API_KEY) and bool(settings.GENAI_MODEL)
     return {"ok": ok, "model": settings.GENAI_MODEL}
 
+@app.get("/readyz")
+def readyz():
+    """503 until the background warm-up has loaded every required component."""
+    body = warmup.stats()
+    return JSONResponse(body, status_code=200 if body["ready"] else 503)
+
+@app.get("/debug/sessions")
+def debug_sessions():
+    return session_stats()
+
+@app.get("/debug/db")
+async def debug_db():
+    return {**await db_stats(), "write_coalescer": write_coalescer.stats()}
+
+@app.get("/debug/cache")
+def debug_cache():
+    return {"chat": chat_cache.stats(), "embeddings": embedding_cache.stats(), "embed_batcher": embed_batcher.stats()}
+
+def _event_texts(e) -> List[str]:
+    chunks = []
+    content = getattr(e, "content", None)
+    if content is not None:
+        parts = getattr(content, "parts", None)
+        if parts:
+            for p in parts:
+                t = getattr(p, "text", None)
+                if t:
+                    chunks.append(t)
+    t = getattr(e, "text", None)
+    if isinstance(t, str) and t.strip():
+        chunks.append(t)
+    msgs = getattr(e, "messages", None)
+    if msgs:
+        for m in msgs:
+            mt = getattr(m, "text", None)
+            if isinstance(mt, str) and mt.strip():
+                chunks.append(mt)
+    return chunks
+
+# tools that change data: a turn that called one of these is never cached
+_WRITE_TOOLS = {"add_expense_tool"}
+
+def _event_tool_calls(e) -> List[Any]:
+    content = getattr(e, "content", None)
+    return [p.function_call for p in (getattr(content, "parts", None) or [])
+            if getattr(p, "function_call", None) is not None]
+
 def _extract_text_from_events(events: Iterable) -> str:
     chunks = []
     for e in events:
         etype = type(e).__name__
         log.info(f"[ADK] event type: %s", etype)
-        content = getattr(e, "content", None)
-        if content is not None:
-            parts = getattr(content, "parts", None)
-            if parts:
-                for p in parts:
-                    t = getattr(p, "text", None)
-                    if t:
-                        chunks.append(t)
-        t = getattr(e, "text", None)
-        if isinstance(t, str) and t.strip():
-            chunks.append(t)
-        msgs = getattr(e, "messages", None)
-        if msgs:
-            for m in msgs:
-                mt = getattr(m, "text", None)
-                if isinstance(mt, str) and mt.strip():
-                    chunks.append(mt)
+        chunks.extend(_event_texts(e))
     return "\n".join([c for c in chunks if c]).strip()
 
 def _format_categories() -> str:
@@ -101,72 +178,309 @@ def _categories_from_rag() -> str | None:
     score = sum(1 for c in CATEGORIES if c.lower() in text_blob.lower())
     return _format_categories() if score >= len(CATEGORIES)//2 else None
 
+async def _categories_answer() -> str:
+    # rag_search blocks and, with lazy models, may be what loads them: never on the event loop,
+    # and not at all until warm-up has them (the static list is the same answer anyway)
+    if warmup.pending("rag_index", "embeddings"):
+        return _format_categories()
+    return await asyncio.to_thread(_categories_from_rag) or _format_categories()
+
 def _is_category_intent(q: str) -> bool:
     ql = q.lower()
     return any(t in ql for t in _TRIGGERS)
 
 @app.post("/api/chat", response_model=ChatResponse)
 async def chat(req: ChatRequest):
-    # short-circuit categories intent with deterministic answer
-    if _is_category_intent(req.message):
-        return ChatResponse(text=_categories_from_rag() or _format_categories())
+    # short-circuit categories / plain spend questions with a deterministic answer
+    local = await _local_answer(req)
+    if local is not None:
+        return ChatResponse(text=local)
+
+    scope, version = cache_scope(req.session_id), data_version()
+    context = await _cache_context(req.session_id)
+    if context is not None:
+        cached = chat_cache.get(scope, req.message, context)
+        if cached is not None:
+            await _remember(req, cached)
+            return ChatResponse(text=cached)
 
-    text = ""
+    text, wrote = "", False
     try:
         events = await run_agent(session_id=req.session_id, message_content=req.message)
         text = _extract_text_from_events(events)
+        wrote = any(fc.name in _WRITE_TOOLS for e in events for fc in _event_tool_calls(e))
     except Exception as e:
         log.exception("ADK run failed: %s", e)
 
+    if text and not wrote and context is not None:
+        chat_cache.put(scope, req.message, text, version, context)
+
     if not text:
         log.warning("ADK returned no text; using Gemini fallback.")
-        text = ask_gemini(req.message)
+        text = await asyncio.to_thread(ask_gemini, req.message)
 
     return ChatResponse(text=text or "Sorry, I couldn’t produce a response.")
 
-@app.post("/api/upload-receipt", response_model=UploadReceiptResponse)
-async def upload_receipt(file: UploadFile = File(...), db=Depends(get_db)):
-    if not file.content_type or not file.content_type.startswith(("image/")):
-        # keep images for now; PDFs can be added later with pdf->image conversion
-        raise HTTPException(status_code=400, detail="Upload a receipt image (png/jpg/webp/heic).")
-
-    # 1) persist file
-    dest = UPLOAD_DIR / file.filename
-    data = await file.read()
-    dest.write_bytes(data)
-
-    # 2) parse with Gemini (structured output)
-    parsed = parse_receipt_bytes(data, file.content_type)
-
-    # 3) choose category (model guess, else heuristic)
-    category = parsed.get("category_guess") or guess_category(parsed.get("vendor", ""), "Other")
-
-    # 4) insert 1 row (aggregate total); keep raw json for audit
-    e = await add_expense(
-        db,
-        date_=datetime.fromisoformat(parsed["transaction_date"]).date(),
-        vendor=parsed["vendor"],
-        category=category,
-        amount=float(parsed["total"]),
-        currency=parsed.get("currency") or "USD",
-        notes=None,
-        raw_text=json.dumps(parsed, ensure_ascii=False),
-        receipt_path=str(dest),
-    )
+async def _routed_answer(message: str) -> str | None:
+    """Deterministic SQL answer for plain spend/summary questions; None -> ask the agent."""
+    if not settings.INTENT_ROUTER_ENABLED:
+        return None
+    intent = intent_router.route(message)
+    if intent is None:
+        return None
+    async with SessionLocal() as db:
+        return await intent_router.answer(db, intent)
+
+async def _remember(req: ChatRequest, text: str):
+    # answers that skip the agent still belong to the conversation, or follow-ups lose context
+    try:
+        await record_turn(req.session_id, req.message, text)
+    except Exception as e:
+        log.warning("Could not record turn in session %s: %s", req.session_id, e)
+
+async def _local_answer(req: ChatRequest) -> str | None:
+    if _is_category_intent(req.message):
+        text = await _categories_answer()
+    else:
+        text = await _routed_answer(req.message)
+    if text is not None:
+        await _remember(req, text)
+    return text
+
+async def _cache_context(session_id: str) -> str | None:
+    """Last-turn fingerprint for the cache key; None disables the cache for this turn."""
+    if not settings.CHAT_CACHE_ENABLED:
+        return None
+    try:
+        return await turn_context(session_id)
+    except Exception as e:
+        log.warning("Chat cache skipped, session unavailable: %s", e)
+        return None
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
 
-    return UploadReceiptResponse(
-        ok=True,
-        note=f"Parsed and saved '{file.filename}'.",
-        vendor=parsed["vendor"],
-        transaction_date=parsed["transaction_date"],
-        total=float(parsed["total"]),
-        currency=parsed.get("currency") or "USD",
-        category=category,
-        items=parsed.get("items", []),
-        inserted_id=e.id,
-        confidence=float(parsed.get("confidence", 0.0)),
+async def _chat_events(req: ChatRequest):
+    # same short-circuits as /api/chat
+    local = await _local_answer(req)
+    if local is not None:
+        yield _sse("text", {"delta": local})
+        yield _sse("done", {"text": local})
+        return
+
+    scope, version = cache_scope(req.session_id), data_version()
+    context = await _cache_context(req.session_id)
+    if context is not None:
+        cached = chat_cache.get(scope, req.message, context)
+        if cached is not None:
+            await _remember(req, cached)
+            yield _sse("text", {"delta": cached})
+            yield _sse("done", {"text": cached, "cached": True})
+            return
+
+    streamed, parts, wrote, failed = False, [], False, False
+    try:
+        async for e in stream_agent(session_id=req.session_id, message_content=req.message, partial_text=True):
+            content = getattr(e, "content", None)
+            for p in (getattr(content, "parts", None) or []):
+                fc = getattr(p, "function_call", None)
+                if fc is not None:
+                    wrote = wrote or fc.name in _WRITE_TOOLS
+                    yield _sse("tool_call", {"name": fc.name, "args": dict(fc.args or {})})
+                fr = getattr(p, "function_response", None)
+                if fr is not None:
+                    yield _sse("tool_result", {"name": fr.name})
+            texts = _event_texts(e)
+            if getattr(e, "partial", False):
+                # SSE mode: partial events carry deltas ...
+                for t in texts:
+                    streamed = True
+                    parts.append(t)
+                    yield _sse("text", {"delta": t})
+            elif texts and not streamed:
+                # ... and the closing event repeats them in full; only forward it if nothing was streamed
+                t = "\n".join(texts)
+                parts.append(t)
+                yield _sse("text", {"delta": t})
+            else:
+                streamed = False  # next model turn (after a tool call) streams afresh
+    except Exception as e:
+        log.exception("ADK stream failed: %s", e)
+        failed = True
+        yield _sse("error", {"message": "agent run failed"})
+
+    text = "".join(parts).strip()
+    if text and not (wrote or failed) and context is not None:
+        chat_cache.put(scope, req.message, text, version, context)
+    if not text:
+        log.warning("ADK returned no text; using Gemini fallback.")
+        text = await asyncio.to_thread(ask_gemini, req.message) or "Sorry, I couldn’t produce a response."
+        yield _sse("text", {"delta": text})
+    yield _sse("done", {"text": text})
+
+@app.post("/api/chat/stream")
+async def chat_stream(req: ChatRequest):
+    """
+    Server-Sent Events variant of /api/chat. Events:
+    text {delta}, tool_call {name, args}, tool_result {name}, error {message}, done {text}.
+    """
+    return StreamingResponse(
+        _chat_events(req),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
+async def _save_receipt(file: UploadFile):
+    try:
+        return await save_upload(file)
+    except UploadRejected as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+@app.post("/api/upload-receipt", response_model=UploadReceiptResponse)
+async def upload_receipt(file: UploadFile = File(...), dedupe: Optional[bool] = Query(None), db=Depends(get_db)):
+    # 1) stream to disk under its content hash (same bytes -> same path); type is sniffed, size capped
+    stored = await _save_receipt(file)
+
+    # 2) parse (cached or off-loop) + categorize + insert
+    fields = await process_receipt(db, stored=stored, dedupe=dedupe)
+    note = f"Already saved '{file.filename}'." if fields["duplicate"] else f"Parsed and saved '{file.filename}'."
+    return UploadReceiptResponse(ok=True, note=note, **fields)
+
+@app.post("/api/upload-receipts", response_model=BatchUploadResponse)
+async def upload_receipts(files: List[UploadFile] = File(...), dedupe: Optional[bool] = Query(None), db=Depends(get_db)):
+    """Many receipts in one request: bounded parallel parsing, one bulk insert, per-file results."""
+    if len(files) > settings.RECEIPT_BATCH_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"At most {settings.RECEIPT_BATCH_MAX_FILES} files per batch.")
+
+    results: List[Dict[str, Any]] = [{} for _ in files]
+    stored, stored_idx = [], []
+    for i, f in enumerate(files):
+        try:
+            stored.append(await save_upload(f))
+            stored_idx.append(i)
+        except UploadRejected as e:
+            results[i] = {"error": e.detail}
+
+    for i, r in zip(stored_idx, await process_receipts_batch(db, stored, dedupe=dedupe)):
+        results[i] = r
+
+    out = []
+    for f, r in zip(files, results):
+        if "error" in r:
+            out.append({"ok": False, "note": f"Failed '{f.filename}'.", "filename": f.filename, "error": r["error"]})
+        else:
+            verb = "Already saved" if r["duplicate"] else "Parsed and saved"
+            out.append({"ok": True, "note": f"{verb} '{f.filename}'.", "filename": f.filename, **r})
+    failed = sum(1 for r in out if not r["ok"])
+    duplicates = sum(1 for r in out if r.get("duplicate"))
+    return BatchUploadResponse(ok=failed == 0, saved=len(out) - failed - duplicates,
+                               duplicates=duplicates, failed=failed, results=out)
+
+@app.post("/api/import/expenses", response_model=ImportResponse)
+async def import_expenses_file(
+    file: UploadFile = File(...),
+    format: Optional[str] = Query(None, pattern="^(csv|jsonl)$"),
+    dry_run: bool = False,
+    dedupe: bool = True,
+    date_format: Optional[str] = Query(None, description="strptime format, e.g. %d/%m/%Y; default: ISO or common US/EU forms"),
+    negate: bool = Query(False, description="flip signs for exports that list charges as negatives"),
+    batch_size: Optional[int] = Query(None, ge=1, le=10000),
+    db=Depends(get_db),
+):
+    """Bank/card export (CSV or JSON lines) -> expenses. Parsed incrementally, inserted in batches."""
+    # UploadFile is already spooled to a temp file; read it in place rather than into memory
+    head = (await file.read(256)).decode("utf-8", errors="replace")
+    await file.seek(0)
+    fh = open_text(file.file)
+    try:
+        report = await import_expenses(
+            db, fh, fmt=format or detect_format(file.filename, head),
+            batch_size=batch_size or settings.IMPORT_BATCH_SIZE, dedupe=dedupe, dry_run=dry_run,
+            date_format=date_format, negate=negate,
+        )
+    finally:
+        fh.detach()  # leave closing the upload to FastAPI
+    return ImportResponse(ok=report.failed == 0, dry_run=dry_run, **report.to_dict())
+
+@app.get("/api/receipts/{sha256}/thumbnail")
+async def receipt_thumbnail(sha256: str):
+    if not re.fullmatch(r"[0-9a-f]{64}", sha256):
+        raise HTTPException(status_code=400, detail="Invalid receipt hash.")
+    p = thumbnail_path_for(sha256)
+    if not p.exists():
+        raise HTTPException(status_code=404, detail="No thumbnail for this receipt.")
+    return FileResponse(p, media_type="image/jpeg", headers={"Cache-Control": "public, max-age=31536000, immutable"})
+
+@app.post("/api/receipt-jobs", response_model=ReceiptJobResponse, status_code=202)
+async def submit_receipt_job(file: UploadFile = File(...)):
+    """Queue a receipt for background parsing; poll /api/receipt-jobs/{job_id} for the result."""
+    stored = await _save_receipt(file)
+    try:
+        job = receipt_jobs.submit(stored=stored, filename=file.filename)
+    except QueueFull as e:
+        raise HTTPException(status_code=503, detail=f"Receipt queue is full ({e}); retry shortly.",
+                            headers={"Retry-After": "5"})
+    return job.to_dict()
+
+@app.get("/api/receipt-jobs/{job_id}", response_model=ReceiptJobResponse)
+async def get_receipt_job(job_id: str):
+    job = receipt_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job id.")
+    return job.to_dict()
+
+@app.get("/api/expenses", response_model=ExpensePage)
+async def api_list_expenses(
+    start: Optional[date] = None, end: Optional[date] = None,
+    category: Optional[str] = None,
+    vendor: Optional[str] = Query(None, description="vendor prefix, case-insensitive"),
+    min_amount: Optional[float] = None, max_amount: Optional[float] = None,
+    fields: Optional[str] = Query(None, description="comma-separated columns; default all but raw_text"),
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    db=Depends(get_db),
+):
+    """Newest-first expense list, keyset-paginated on (date, id)."""
+    try:
+        items, nxt = await list_expenses_page(
+            db, start=start, end=end, category=category, vendor_prefix=vendor,
+            min_amount=min_amount, max_amount=max_amount,
+            fields=[f.strip() for f in fields.split(",") if f.strip()] if fields else None,
+            limit=limit, cursor=cursor,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return ExpensePage(items=items, next_cursor=nxt)
+
+@app.get("/api/export/expenses")
+async def api_export_expenses(
+    format: str = Query("csv", description="csv | ndjson | parquet (needs pyarrow)"),
+    start: Optional[date] = None, end: Optional[date] = None,
+    category: Optional[str] = None,
+    vendor: Optional[str] = Query(None, description="vendor prefix, case-insensitive"),
+    min_amount: Optional[float] = None, max_amount: Optional[float] = None,
+    fields: Optional[str] = Query(None, description="comma-separated columns; default all but raw_text"),
+):
+    """Stream the filtered expenses (oldest first) without loading them all."""
+    try:
+        check_format(format)
+        cols = select_fields([f.strip() for f in fields.split(",") if f.strip()] if fields else None)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def body():
+        # own session: the response body outlives the request's dependencies
+        async with SessionLocal() as db:
+            async for chunk in export_expenses(
+                db, format, fields=cols, batch_size=settings.EXPORT_BATCH_SIZE, start=start, end=end,
+                category=category, vendor_prefix=vendor, min_amount=min_amount, max_amount=max_amount,
+            ):
+                yield chunk
+
+    ext = "jsonl" if format == "ndjson" else format
+    return StreamingResponse(body(), media_type=EXPORT_FORMATS[format],
+                             headers={"Content-Disposition": f'attachment; filename="expenses.{ext}"'})
+
 # ------ Simple REST helpers for testing tools without the agent ------
 @app.post("/api/expense")
 async def api_add_expense(
@@ -191,5 +505,16 @@ async def api_summary_by_category(
     return await tool_summary_by_category(db, start=start, end=end)
 
 @app.get("/api/rag/search")
-def api_rag_search(q: str, k: int=5):
-    return tool_rag_search(query=q, k=k)
\ No newline at end of file
+def api_rag_search(q: str, k: int=5, mode: Optional[str]=Query(None, description="vector | lexical | hybrid")):
+    try:
+        return tool_rag_search(query=q, k=k, mode=mode)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/api/rag/search/batch")
+def api_rag_search_batch(req: RagBatchSearchRequest):
+    """Many queries in one call: one embedding pass and one vector query for the lot."""
+    try:
+        return {"results": tool_rag_search_many(queries=req.queries, k=req.k, mode=req.mode)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
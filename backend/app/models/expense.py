@@ -1,7 +1,12 @@
 from __future__ import annotations
-from sqlalchemy import String, Integer, Float, Text, Date, Column
+from sqlalchemy import String, Integer, Float, Text, Date, Column, Index
+from sqlalchemy.orm import validates
 from app.core.db import Base
 
+def norm(s: str | None) -> str | None:
+    """Lowercased/trimmed form used for indexed equality lookups (instead of ilike)."""
+    return s.strip().lower() if s is not None else None
+
 class Expense(Base):
     __tablename__ = "expenses"
     id = Column(Integer, primary_key=True, autoincrement=True)
@@ -13,3 +18,22 @@ class Expense(Base):
     notes = Column(Text, nullable=True)
     raw_text = Column(Text, nullable=True)
     receipt_path = Column(Text, nullable=True)
+    # kept in sync by the validators below; nullable only so older databases can ADD COLUMN
+    category_norm = Column(String(64), nullable=True)
+    vendor_norm = Column(String(128), nullable=True)
+
+    __table_args__ = (
+        Index("ix_expenses_date_id", "date", "id"),  # date ranges + keyset paging on (date, id)
+        Index("ix_expenses_category_norm_date", "category_norm", "date"),
+        Index("ix_expenses_vendor_norm", "vendor_norm"),
+    )
+
+    @validates("category")
+    def _set_category_norm(self, key, value):
+        self.category_norm = norm(value)
+        return value
+
+    @validates("vendor")
+    def _set_vendor_norm(self, key, value):
+        self.vendor_norm = norm(value)
+        return value
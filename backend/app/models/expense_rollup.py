@@ -0,0 +1,17 @@
+from __future__ import annotations
+from sqlalchemy import String, Integer, Float, Date, Column, Index
+from app.core.db import Base
+
+class ExpenseMonthly(Base):
+    """Per-(month, category, currency) sums, maintained in the same transaction as expense writes."""
+    __tablename__ = "expense_monthly"
+    month = Column(Date, primary_key=True)          # first day of the month
+    category = Column(String(64), primary_key=True)
+    currency = Column(String(8), primary_key=True)
+    category_norm = Column(String(64), nullable=False)
+    total = Column(Float, nullable=False, default=0.0)
+    count = Column(Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        Index("ix_expense_monthly_category_norm_month", "category_norm", "month"),
+    )
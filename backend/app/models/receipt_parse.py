@@ -0,0 +1,13 @@
+from __future__ import annotations
+from datetime import datetime
+from sqlalchemy import String, Integer, Text, DateTime, Column
+from app.core.db import Base
+
+class ReceiptParse(Base):
+    """Parse-result cache keyed by SHA-256 of the receipt image bytes."""
+    __tablename__ = "receipt_parses"
+    sha256 = Column(String(64), primary_key=True)
+    parsed_json = Column(Text, nullable=False)
+    expense_id = Column(Integer, nullable=True)
+    receipt_path = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
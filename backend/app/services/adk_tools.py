@@ -55,8 +55,9 @@ async def summary_by_category_tool(
     async with SessionLocal() as db:
         return await summary_by_category(db, start=s, end=e)
 
-def rag_search_tool(query: str, k: int = 5) -> List[Dict[str, Any]]:
+def rag_search_tool(query: str, k: int = 5, mode: Optional[str] = None) -> List[Dict[str, Any]]:
     """
     Retrieve top-k guidance snippets relevant to the query.
+    mode: "hybrid" (default), "lexical" for exact terms such as a category or merchant name, or "vector".
     """
-    return rag_search(query, k=k)
\ No newline at end of file
+    return rag_search(query, k=k, mode=mode)
\ No newline at end of file
@@ -0,0 +1,136 @@
+from __future__ import annotations
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Optional
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.expense import Expense
+
+CATEGORIES = ["Groceries", "Dining", "Transport", "Utilities", "Shopping", "Health", "Entertainment", "Other"]
+
+# merchant keyword -> category; matched as word prefixes, longest keyword wins
+KEYWORDS: Dict[str, list[str]] = {
+    "Transport": ["uber", "lyft", "shell", "chevron", "exxon", "bp", "metro", "bus"],
+    "Dining": ["starbucks", "cafe", "coffee", "restaurant", "grill", "pizza", "chipotle", "mcdonald",
+               "burger", "ubereats", "uber eats", "doordash"],
+    "Shopping": ["walmart", "target", "best buy", "amazon", "costco"],
+    "Groceries": ["kroger", "whole foods", "safeway", "aldi", "trader joe", "grocery"],
+    "Utilities": ["comcast", "xfinity", "att", "verizon", "pg&e", "electric", "water"],
+    "Health": ["pharmacy", "walgreens", "cvs", "rite aid", "clinic", "dental"],
+    "Entertainment": ["netflix", "spotify", "hulu", "cinema", "theater"],
+}
+
+_KEYWORD_CATEGORY = {k: cat for cat, ks in KEYWORDS.items() for k in ks}
+# one compiled alternation instead of a substring scan per keyword
+_MATCHER = re.compile(
+    r"\b(?:" + "|".join(re.escape(k) for k in sorted(_KEYWORD_CATEGORY, key=len, reverse=True)) + ")"
+)
+
+_NOISE = re.compile(r"#\s*\d+|\b(?:store|inc|llc|ltd|corp|co)\b|[^\w&' ]+|\d{3,}")
+
+def normalize_vendor(vendor: str) -> str:
+    """'STARBUCKS #1234, Inc.' -> 'starbucks'"""
+    v = _NOISE.sub(" ", (vendor or "").lower())
+    return " ".join(v.split())
+
+def match_keywords(vendor: str) -> Optional[str]:
+    best = None
+    for m in _MATCHER.finditer((vendor or "").lower()):
+        if best is None or len(m.group(0)) > len(best):
+            best = m.group(0)
+    return _KEYWORD_CATEGORY[best] if best else None
+
+@dataclass
+class Classification:
+    category: str
+    source: str        # history | model | rules | fallback
+    confidence: float
+
+class VendorTable:
+    """Most frequent category per normalized vendor, learned from existing expenses."""
+
+    def __init__(self, min_support: int = 2, min_share: float = 0.6):
+        self.min_support = min_support
+        self.min_share = min_share
+        self._counts: Dict[str, Counter] = {}
+        self.loaded = False
+
+    async def load(self, db: AsyncSession) -> int:
+        res = await db.execute(
+            select(Expense.vendor, Expense.category, func.count()).group_by(Expense.vendor, Expense.category)
+        )
+        counts: Dict[str, Counter] = {}
+        for vendor, category, n in res.all():
+            key = normalize_vendor(vendor)
+            if key:
+                counts.setdefault(key, Counter())[category] += n
+        self._counts = counts
+        self.loaded = True
+        return len(counts)
+
+    def observe(self, vendor: str, category: str, n: int = 1):
+        key = normalize_vendor(vendor)
+        if key and category:
+            self._counts.setdefault(key, Counter())[category] += n
+
+    def lookup(self, vendor: str) -> Optional[Classification]:
+        c = self._counts.get(normalize_vendor(vendor))
+        if not c:
+            return None
+        category, top = c.most_common(1)[0]
+        total = sum(c.values())
+        if top < self.min_support or top / total < self.min_share:
+            return None
+        return Classification(category=category, source="history", confidence=round(top / total, 3))
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+vendor_table = VendorTable()
+
+def classify(vendor: str, model_guess: Optional[str] = None) -> Classification:
+    """
+    Known merchant -> its usual category (overrides the model: it reflects how this user files it).
+    Otherwise the model's guess, then keyword rules, then Other.
+    """
+    learned = vendor_table.lookup(vendor)
+    if learned is not None:
+        return learned
+    if model_guess and model_guess != "Other":
+        return Classification(category=model_guess, source="model", confidence=0.7)
+    ruled = match_keywords(vendor)
+    if ruled:
+        return Classification(category=ruled, source="rules", confidence=0.5)
+    return Classification(category=model_guess or "Other", source="fallback", confidence=0.0)
+
+async def recategorize(db: AsyncSession, *, only_other: bool = True, dry_run: bool = True) -> Dict[str, int]:
+    """Batch pass over stored expenses using history + rules (no model calls)."""
+    stmt = select(Expense)
+    if only_other:
+        stmt = stmt.where(Expense.category_norm == "other")
+    changed: Counter = Counter()
+    moved = []
+    for e in (await db.scalars(stmt)).all():
+        c = vendor_table.lookup(e.vendor)
+        new = c.category if c else match_keywords(e.vendor)
+        if new and new != e.category:
+            changed[new] += 1
+            if not dry_run:
+                moved.append((e, e.category))
+                e.category = new
+    if not dry_run and changed:
+        from app.services.expense_service import bump_data_version
+        from app.services import rollups
+        # move each amount between rollup rows in the same transaction
+        deltas: Dict = {}
+        for e, old in moved:
+            for sign, cat in ((-1, old), (1, e.category)):
+                k = (rollups.month_start(e.date), cat, e.currency or "USD")
+                t, n = deltas.get(k, (0.0, 0))
+                deltas[k] = (t + sign * float(e.amount), n + sign)
+        await rollups.apply_deltas(db, deltas)
+        await db.commit()
+        bump_data_version()
+        await vendor_table.load(db)
+    return dict(changed)
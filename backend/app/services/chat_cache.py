@@ -0,0 +1,77 @@
+from __future__ import annotations
+import re, time
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Dict, Optional, Tuple
+from app.core.settings import settings
+from app.services.expense_service import data_version
+
+_Key = Tuple[str, str, str, str]  # (scope, day, last-turn fingerprint, normalized message)
+
+def normalize_message(msg: str) -> str:
+    m = re.sub(r"\s+", " ", (msg or "").lower()).strip()
+    return m.rstrip("?!. ")
+
+class ChatCache:
+    """
+    LRU + TTL cache of read-only chat answers. Each entry remembers the expense
+    data version it was computed at; any write bumps the version and the entry is
+    treated as a miss. The key includes today's date so relative phrases
+    ("this month") don't outlive the day they were answered on, and a fingerprint of
+    the conversation's previous turn so a follow-up ("and for groceries?") is only
+    reused after the same exchange.
+    """
+
+    def __init__(self, max_entries: int, ttl_s: int):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._data: "OrderedDict[_Key, Tuple[float, int, str]]" = OrderedDict()
+        self.hits = self.misses = self.stale = self.stores = 0
+
+    def _key(self, scope: str, message: str, context: str) -> _Key:
+        return (scope, date.today().isoformat(), context, normalize_message(message))
+
+    def get(self, scope: str, message: str, context: str = "") -> Optional[str]:
+        key = self._key(scope, message, context)
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        at, version, text = entry
+        if version != data_version() or time.time() - at > self.ttl_s:
+            del self._data[key]
+            self.stale += 1
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return text
+
+    def put(self, scope: str, message: str, text: str, version: int, context: str = ""):
+        # version is read *before* the agent ran, so a write racing the turn leaves a stale entry
+        key = self._key(scope, message, context)
+        self._data[key] = (time.time(), version, text)
+        self._data.move_to_end(key)
+        self.stores += 1
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "stores": self.stores,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "data_version": data_version(),
+        }
+
+chat_cache = ChatCache(max_entries=settings.CHAT_CACHE_MAX, ttl_s=settings.CHAT_CACHE_TTL_S)
+
+def cache_scope(session_id: str) -> str:
+    return session_id if settings.CHAT_CACHE_SCOPE == "session" else "*"
@@ -0,0 +1,107 @@
+from __future__ import annotations
+import os, re
+from dataclasses import dataclass
+from typing import List, Tuple
+
+# Token counts are approximated by whitespace words: close enough for sizing passages,
+# and it keeps a tokenizer out of the ingest path.
+CHUNK_TOKENS = int(os.getenv("RAG_CHUNK_TOKENS", "200"))
+CHUNK_OVERLAP = int(os.getenv("RAG_CHUNK_OVERLAP", "40"))
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.+?)\s*#*\s*$")
+_FENCE = re.compile(r"^\s*(```|~~~)")
+
+@dataclass
+class Chunk:
+    text: str
+    section: str       # heading breadcrumb, e.g. "Categories > Dining"
+    level: int         # depth of the innermost heading (0 = before any heading)
+    index: int         # position within the document
+
+def _sections(text: str) -> List[Tuple[List[str], int, str]]:
+    """Split on markdown headings (not inside code fences) -> [(breadcrumb, level, body)]."""
+    out: List[Tuple[List[str], int, str]] = []
+    stack: List[Tuple[int, str]] = []
+    body: List[str] = []
+    in_fence = False
+
+    def flush():
+        if "".join(body).strip():
+            out.append(([t for _, t in stack], stack[-1][0] if stack else 0, "\n".join(body).strip()))
+        body.clear()
+
+    for line in text.splitlines():
+        if _FENCE.match(line):
+            in_fence = not in_fence
+        m = None if in_fence else _HEADING.match(line)
+        if m:
+            flush()
+            level = len(m.group(1))
+            while stack and stack[-1][0] >= level:
+                stack.pop()
+            stack.append((level, m.group(2)))
+        else:
+            body.append(line)
+    flush()
+    return out
+
+def _ntok(s: str) -> int:
+    return len(s.split())
+
+def _units(paragraph: str, max_tokens: int, overlap: int) -> List[str]:
+    """A paragraph, or if it is over budget its lines, or as a last resort overlapping word slices."""
+    if _ntok(paragraph) <= max_tokens:
+        return [paragraph]
+    out: List[str] = []
+    for line in paragraph.splitlines():
+        words = line.split()
+        if len(words) <= max_tokens:
+            out.append(line)
+        else:
+            step = max_tokens - overlap
+            out.extend(" ".join(words[i:i + max_tokens]) for i in range(0, len(words) - overlap, step))
+    return out
+
+def _windows(paragraphs: List[str], max_tokens: int, overlap: int) -> List[str]:
+    """Pack units into windows of <= max_tokens; each window repeats up to `overlap` tokens of the last one's tail."""
+    units = [u for p in paragraphs for u in _units(p, max_tokens, overlap)]
+    windows: List[str] = []
+    cur: List[str] = []
+    size = fresh = 0  # `fresh` counts units added since the overlap was carried over
+    for u in units:
+        n = _ntok(u)
+        if fresh and size + n > max_tokens:
+            windows.append("\n\n".join(cur))
+            tail, t = [], 0
+            for prev in reversed(cur):
+                if t + _ntok(prev) > overlap or t + _ntok(prev) + n > max_tokens:
+                    break
+                tail.insert(0, prev)
+                t += _ntok(prev)
+            cur, size, fresh = tail, t, 0
+        cur.append(u)
+        size += n
+        fresh += 1
+    if fresh:
+        windows.append("\n\n".join(cur))
+    return windows
+
+def chunk_markdown(text: str, title: str = "", max_tokens: int | None = None,
+                   overlap: int | None = None) -> List[Chunk]:
+    """
+    Heading-aware chunking: each section becomes one chunk if it fits the budget,
+    otherwise overlapping windows of its paragraphs. Chunk text starts with the
+    heading breadcrumb so a passage still says what it is about out of context.
+    """
+    max_tokens = max_tokens or CHUNK_TOKENS
+    overlap = CHUNK_OVERLAP if overlap is None else overlap
+    overlap = max(0, min(overlap, max_tokens // 2))
+
+    chunks: List[Chunk] = []
+    for crumbs, level, body in _sections(text):
+        section = " > ".join(crumbs) or title
+        paragraphs = [p.strip() for p in re.split(r"\n\s*\n", body) if p.strip()]
+        for passage in _windows(paragraphs, max_tokens, overlap):
+            chunks.append(Chunk(text=f"{section}\n\n{passage}" if section else passage,
+                                section=section, level=level, index=len(chunks)))
+    return chunks
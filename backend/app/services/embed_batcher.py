@@ -0,0 +1,86 @@
+from __future__ import annotations
+import logging, queue, threading, time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+EmbedFn = Callable[[List[str]], List[List[float]]]
+
+class EmbedBatcher:
+    """
+    Coalesces concurrent embed calls into one model call. Requests that arrive within
+    `window_ms` of the first one (up to `max_batch` texts) share a forward pass, which
+    runs on a single dedicated thread instead of whichever request thread called in.
+    """
+
+    def __init__(self, fn: EmbedFn, *, max_batch: int = 64, window_ms: float = 5.0):
+        self.fn = fn
+        self.max_batch = max(1, max_batch)
+        self.window_s = max(0.0, window_ms) / 1000
+        self._q: "queue.Queue[Tuple[List[str], Future]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.batches = self.requests = self.texts = 0
+
+    def _ensure_worker(self):
+        if self._thread is None:
+            with self._start_lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="embed-batcher", daemon=True)
+                    self._thread.start()
+
+    def submit(self, texts: List[str]) -> "Future[List[List[float]]]":
+        fut: "Future[List[List[float]]]" = Future()
+        if not texts:
+            fut.set_result([])
+            return fut
+        self._ensure_worker()
+        self._q.put((list(texts), fut))
+        return fut
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        return self.submit(texts).result()
+
+    def _collect(self) -> List[Tuple[List[str], Future]]:
+        batch = [self._q.get()]
+        size = len(batch[0][0])
+        deadline = time.monotonic() + self.window_s
+        while size < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                item = self._q.get(timeout=remaining) if remaining > 0 else self._q.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # identical texts across callers (the same popular query) are encoded once
+            unique = list(dict.fromkeys(t for texts, _ in batch for t in texts))
+            try:
+                vecs = dict(zip(unique, self.fn(unique)))
+            except BaseException as e:
+                log.warning("Embedding batch of %d failed: %s", len(unique), e)
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            self.batches += 1
+            self.requests += len(batch)
+            self.texts += len(unique)
+            for texts, fut in batch:
+                fut.set_result([vecs[t] for t in texts])
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "texts": self.texts,
+            "avg_requests_per_batch": round(self.requests / self.batches, 2) if self.batches else None,
+            "pending": self._q.qsize(),
+            "max_batch": self.max_batch,
+            "window_ms": self.window_s * 1000,
+        }
@@ -0,0 +1,123 @@
+from __future__ import annotations
+import hashlib, sqlite3, threading
+from array import array
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, Any, List, Optional
+
+# Two tiers keyed by sha256(provider, model, text):
+#   memory - bounded LRU, per process
+#   disk   - SQLite file next to the vector index; survives restarts and re-ingests
+# Vectors are stored as float32 blobs.
+
+def embedding_key(provider: str, model: str, text: str) -> str:
+    return hashlib.sha256(f"{provider}\x00{model}\x00{text}".encode("utf-8")).hexdigest()
+
+def _pack(vec: List[float]) -> bytes:
+    return array("f", vec).tobytes()
+
+def _unpack(blob: bytes) -> List[float]:
+    a = array("f")
+    a.frombytes(blob)
+    return a.tolist()
+
+class EmbeddingCache:
+    def __init__(self, provider: str, model: str, *, max_entries: int, path: Optional[str] = None):
+        self.provider = provider
+        self.model = model
+        self.max_entries = max_entries
+        self._mem: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()  # search() runs in threadpool workers
+        self._db: sqlite3.Connection | None = None  # opened on first lookup, not at import
+        self.path = path
+        self.mem_hits = self.disk_hits = self.misses = self.stores = 0
+
+    def _disk(self) -> sqlite3.Connection | None:
+        # callers hold self._lock
+        if self._db is None and self.path:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vec BLOB NOT NULL)")
+            db.commit()
+            self._db = db
+        return self._db
+
+    def _remember(self, key: str, vec: List[float]):
+        self._mem[key] = vec
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_entries:
+            self._mem.popitem(last=False)
+
+    def _disk_get(self, keys: List[str]) -> Dict[str, List[float]]:
+        db = self._disk() if keys else None
+        if db is None:
+            return {}
+        found: Dict[str, List[float]] = {}
+        for i in range(0, len(keys), 500):  # stay under SQLite's bound-parameter limit
+            chunk = keys[i:i + 500]
+            q = f"SELECT key, vec FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})"
+            found.update((k, _unpack(v)) for k, v in db.execute(q, chunk))
+        return found
+
+    def get_many(self, texts: List[str], embed: Callable[[List[str]], List[List[float]]]) -> List[List[float]]:
+        """Vectors for `texts`, in order. Only texts missing from both tiers go to `embed`, in one call."""
+        keys = [embedding_key(self.provider, self.model, t) for t in texts]
+        out: Dict[str, List[float]] = {}
+        with self._lock:
+            for k in keys:
+                if k in self._mem and k not in out:
+                    self._mem.move_to_end(k)
+                    out[k] = self._mem[k]
+                    self.mem_hits += 1
+            missing = [k for k in dict.fromkeys(keys) if k not in out]
+            for k, vec in self._disk_get(missing).items():
+                out[k] = vec
+                self._remember(k, vec)
+                self.disk_hits += 1
+
+        todo = {k: t for k, t in zip(keys, texts) if k not in out}
+        if todo:
+            # embed outside the lock; a concurrent miss on the same text just embeds it twice
+            vecs = embed(list(todo.values()))
+            fresh = dict(zip(todo.keys(), (list(map(float, v)) for v in vecs)))
+            with self._lock:
+                self.misses += len(fresh)
+                for k, vec in fresh.items():
+                    self._remember(k, vec)
+                db = self._disk()
+                if db is not None:
+                    db.executemany("INSERT OR REPLACE INTO embeddings (key, vec) VALUES (?, ?)",
+                                   [(k, _pack(v)) for k, v in fresh.items()])
+                    db.commit()
+                self.stores += len(fresh)
+            out.update(fresh)
+        return [out[k] for k in keys]
+
+    def clear(self, disk: bool = False):
+        with self._lock:
+            self._mem.clear()
+            db = self._disk() if disk else None
+            if db is not None:
+                db.execute("DELETE FROM embeddings")
+                db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.mem_hits + self.disk_hits + self.misses
+        disk_entries = None
+        if self._db is not None:  # don't create the file just to report on it
+            with self._lock:
+                disk_entries = self._db.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        return {
+            "provider": self.provider,
+            "model": self.model,
+            "entries": len(self._mem),
+            "max_entries": self.max_entries,
+            "disk_entries": disk_entries,
+            "path": self.path,
+            "mem_hits": self.mem_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "hit_rate": round((self.mem_hits + self.disk_hits) / lookups, 3) if lookups else None,
+        }
@@ -1,20 +1,88 @@
 from __future__ import annotations
+import base64, json
 from datetime import date
-from typing import Optional, List, Dict, Any
-from sqlalchemy import select, func
+from typing import Optional, List, Dict, Any, Tuple
+from sqlalchemy import select, func, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.models.expense import Expense
+from app.core.settings import settings
+from app.core.db import SessionLocal
+from app.models.expense import Expense, norm
+from app.models.expense_rollup import ExpenseMonthly
+from app.services.categorizer import vendor_table
+from app.services import rollups
+from app.services.write_coalescer import WriteCoalescer
+
+# Bumped on every committed write; read-side caches compare against it to invalidate.
+_data_version = 0
+
+def data_version() -> int:
+    return _data_version
+
+def bump_data_version() -> int:
+    global _data_version
+    _data_version += 1
+    return _data_version
 
 async def add_expense(db: AsyncSession, *, date_: date, vendor: str, category: str,
                       amount: float, currency: str="USD", notes: Optional[str]=None,
                       raw_text: Optional[str]=None, receipt_path: Optional[str]=None) -> Expense:
+    # Group commit: only when the caller has nothing of its own pending, since the row is
+    # written on the coalescer's session rather than `db`
+    if settings.WRITE_COALESCE and not (db.new or db.dirty or db.deleted):
+        if db.in_transaction():
+            # a prior read (e.g. the receipt parse-cache lookup) still holds a pooled connection;
+            # give it back before waiting on the coalescer, which needs one of its own. This commits
+            # the caller's transaction, as the inline path below would.
+            await db.commit()
+        return await write_coalescer.submit(dict(date_=date_, vendor=vendor, category=category, amount=amount,
+                                                 currency=currency, notes=notes, raw_text=raw_text,
+                                                 receipt_path=receipt_path))
+    e = await stage_expense(db, date_=date_, vendor=vendor, category=category, amount=amount, currency=currency,
+                            notes=notes, raw_text=raw_text, receipt_path=receipt_path)
+    await db.commit()
+    await db.refresh(e)
+    expense_committed(e)
+    return e
+
+async def stage_expense(db: AsyncSession, *, date_: date, vendor: str, category: str, amount: float,
+                        currency: str="USD", notes: Optional[str]=None, raw_text: Optional[str]=None,
+                        receipt_path: Optional[str]=None) -> Expense:
+    """add_expense without the commit: row + rollup deltas flushed into the caller's transaction
+    (e.id is set). Commit, then call expense_committed(e)."""
     e = Expense(date=date_, vendor=vendor, category=category, amount=amount, currency=currency,
                 notes=notes, raw_text=raw_text, receipt_path=receipt_path)
     db.add(e)
-    await db.commit()
-    await db.refresh(e)
+    await rollups.apply_deltas(db, rollups.deltas_for([e]))  # same transaction as the row
+    await db.flush()
     return e
 
+def expense_committed(e: Expense):
+    bump_data_version()
+    vendor_table.observe(e.vendor, e.category)
+
+async def add_expenses_bulk(db: AsyncSession, rows: List[Dict[str, Any]]) -> List[Expense]:
+    """Insert many rows in one transaction (single flush -> multi-row INSERT, one commit)."""
+    if not rows:
+        return []
+    es = [Expense(date=r["date_"], vendor=r["vendor"], category=r["category"], amount=r["amount"],
+                  currency=r.get("currency") or "USD", notes=r.get("notes"),
+                  raw_text=r.get("raw_text"), receipt_path=r.get("receipt_path"))
+          for r in rows]
+    db.add_all(es)
+    await rollups.apply_deltas(db, rollups.deltas_for(es))
+    await db.commit()
+    bump_data_version()
+    for e in es:
+        vendor_table.observe(e.vendor, e.category)
+    return es
+
+async def _write_coalesced(rows: List[Dict[str, Any]]) -> List[Expense]:
+    async with SessionLocal() as db:
+        return await add_expenses_bulk(db, rows)  # ids come back from the multi-row INSERT ... RETURNING
+
+write_coalescer = WriteCoalescer(_write_coalesced, window_ms=settings.WRITE_COALESCE_WINDOW_MS,
+                                 max_batch=settings.WRITE_COALESCE_MAX_BATCH)
+
 async def list_expenses(db: AsyncSession, *, start: Optional[date]=None, end: Optional[date]=None,
                         category: Optional[str]=None) -> List[Expense]:
     stmt = select(Expense)
@@ -23,27 +91,120 @@ async def list_expenses(db: AsyncSession, *, start: Optional[date]=None, end: Op
     if end:
         stmt = stmt.where(Expense.date <= end)
     if category:
-        stmt = stmt.where(Expense.category.ilike(category))
+        stmt = stmt.where(Expense.category_norm == norm(category))
     stmt = stmt.order_by(Expense.date.desc(), Expense.id.desc())
     res = await db.execute(stmt)
     return list(res.scalars().all())
 
-async def summary_by_category(db: AsyncSession, *, start: Optional[date]=None, end: Optional[date]=None) -> List[Dict[str, Any]]:
+# ---- keyset pagination for /api/expenses ----
+# Pages are ordered newest first by (date, id); the cursor is the last row's key, so
+# page N costs the same as page 1 (no OFFSET scan) and rows inserted meanwhile don't shift pages.
+EXPENSE_FIELDS = ("id", "date", "vendor", "category", "amount", "currency", "notes", "raw_text", "receipt_path")
+DEFAULT_FIELDS = tuple(f for f in EXPENSE_FIELDS if f != "raw_text")  # raw_text is the model JSON, often KBs
+
+def encode_cursor(d: date, id_: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([d.isoformat(), id_]).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> Tuple[date, int]:
+    try:
+        d, id_ = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        id_ = int(id_)
+        if not 0 <= id_ < 2 ** 63:  # ids are 64-bit; anything else would overflow in the driver
+            raise ValueError("cursor id out of range")
+        return date.fromisoformat(d), id_
+    except (ValueError, TypeError, OverflowError) as e:
+        raise ValueError("Invalid cursor.") from e
+
+def select_fields(fields: Optional[List[str]]) -> List[str]:
+    """Validated projection (default: all but raw_text), with the id/date key columns read first."""
+    fields = list(dict.fromkeys(fields or DEFAULT_FIELDS))
+    unknown = set(fields) - set(EXPENSE_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(sorted(unknown))}.")
+    return fields
+
+def filter_expenses(stmt, *, start: Optional[date]=None, end: Optional[date]=None,
+                    category: Optional[str]=None, vendor_prefix: Optional[str]=None,
+                    min_amount: Optional[float]=None, max_amount: Optional[float]=None):
+    if start:
+        stmt = stmt.where(Expense.date >= start)
+    if end:
+        stmt = stmt.where(Expense.date <= end)
+    if category:
+        stmt = stmt.where(Expense.category_norm == norm(category))
+    if vendor_prefix:
+        stmt = stmt.where(Expense.vendor_norm.startswith(norm(vendor_prefix), autoescape=True))
+    if min_amount is not None:
+        stmt = stmt.where(Expense.amount >= min_amount)
+    if max_amount is not None:
+        stmt = stmt.where(Expense.amount <= max_amount)
+    return stmt
+
+def projection(fields: List[str]):
+    cols = ["id", "date"] + [f for f in fields if f not in ("id", "date")]  # key columns always
+    return select(*[Expense.__table__.c[f] for f in cols])
+
+async def list_expenses_page(db: AsyncSession, *, fields: Optional[List[str]]=None, limit: int=50,
+                             cursor: Optional[str]=None, **filters) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """One page of expenses as plain dicts (only the requested columns) plus the next cursor, if any."""
+    fields = select_fields(fields)
+    stmt = filter_expenses(projection(fields), **filters)
+    if cursor:
+        stmt = stmt.where(tuple_(Expense.date, Expense.id) < tuple_(*decode_cursor(cursor)))
+    stmt = stmt.order_by(Expense.date.desc(), Expense.id.desc()).limit(limit + 1)
+    rows = (await db.execute(stmt)).all()
+    items = []
+    for r in rows[:limit]:
+        item = {f: getattr(r, f) for f in fields}
+        if "date" in item:
+            item["date"] = r.date.isoformat()
+        items.append(item)
+    nxt = encode_cursor(rows[limit - 1].date, rows[limit - 1].id) if len(rows) > limit else None
+    return items, nxt
+
+async def _raw_by_category(db: AsyncSession, start: Optional[date], end: Optional[date]) -> Dict[str, float]:
     stmt = select(Expense.category, func.sum(Expense.amount)).group_by(Expense.category)
     if start:
         stmt = stmt.where(Expense.date >= start)
     if end:
         stmt = stmt.where(Expense.date <= end)
     res = await db.execute(stmt)
-    return [{"category": c, "total": float(t or 0)} for c, t in res.all()]
+    return {c: float(t or 0) for c, t in res.all()}
 
-async def total_spend(db: AsyncSession, *, start: Optional[date]=None, end: Optional[date]=None, category: Optional[str]=None) -> float:
+async def _raw_total(db: AsyncSession, start: Optional[date], end: Optional[date], category: Optional[str]) -> float:
     stmt = select(func.sum(Expense.amount))
     if start:
         stmt = stmt.where(Expense.date >= start)
     if end:
         stmt = stmt.where(Expense.date <= end)
     if category:
-        stmt = stmt.where(Expense.category.ilike(category))
+        stmt = stmt.where(Expense.category_norm == norm(category))
     res = await db.execute(stmt)
     return float(res.scalar() or 0.0)
+
+# Whole months come from expense_monthly; only partial-month edges touch raw rows.
+async def summary_by_category(db: AsyncSession, *, start: Optional[date]=None, end: Optional[date]=None) -> List[Dict[str, Any]]:
+    split = rollups.split_range(start, end) if settings.ROLLUPS_ENABLED else None
+    if split is None:
+        totals = await _raw_by_category(db, start, end)
+    else:
+        rollup_from, rollup_to, edges = split
+        stmt = rollups.rollup_filter(
+            select(ExpenseMonthly.category, func.sum(ExpenseMonthly.total)).group_by(ExpenseMonthly.category),
+            rollup_from, rollup_to, None)
+        totals = {c: float(t or 0) for c, t in (await db.execute(stmt)).all()}
+        for s, e in edges:
+            for c, t in (await _raw_by_category(db, s, e)).items():
+                totals[c] = totals.get(c, 0.0) + t
+    return [{"category": c, "total": t} for c, t in totals.items()]
+
+async def total_spend(db: AsyncSession, *, start: Optional[date]=None, end: Optional[date]=None, category: Optional[str]=None) -> float:
+    split = rollups.split_range(start, end) if settings.ROLLUPS_ENABLED else None
+    if split is None:
+        return await _raw_total(db, start, end, category)
+    rollup_from, rollup_to, edges = split
+    stmt = rollups.rollup_filter(select(func.sum(ExpenseMonthly.total)), rollup_from, rollup_to, category)
+    total = float((await db.execute(stmt)).scalar() or 0.0)
+    for s, e in edges:
+        total += await _raw_total(db, s, e, category)
+    return total
@@ -0,0 +1,100 @@
+from __future__ import annotations
+import csv, io, json
+from typing import Any, AsyncIterator, List, Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.expense import Expense
+from app.services.expense_service import filter_expenses, projection, select_fields
+
+# Full-table exports stream through a server-side cursor: `batch_size` rows are in memory
+# at a time and each batch is encoded and handed off before the next one is fetched.
+
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson", "parquet": "application/vnd.apache.parquet"}
+
+async def iter_batches(db: AsyncSession, *, fields: List[str], batch_size: int = 5000, **filters):
+    stmt = filter_expenses(projection(fields), **filters).order_by(Expense.date, Expense.id)
+    result = await db.stream(stmt.execution_options(yield_per=batch_size))
+    async for part in result.partitions():
+        yield part
+
+async def _csv(batches, fields: List[str]) -> AsyncIterator[bytes]:
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(fields)
+    async for part in batches:
+        w.writerows([getattr(r, f) for f in fields] for r in part)
+        yield buf.getvalue().encode("utf-8")
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue().encode("utf-8")
+
+async def _ndjson(batches, fields: List[str]) -> AsyncIterator[bytes]:
+    async for part in batches:
+        lines = [json.dumps({f: getattr(r, f) for f in fields}, default=str, ensure_ascii=False) for r in part]
+        yield ("\n".join(lines) + "\n").encode("utf-8")
+
+class _Sink:
+    """Write-only file for ParquetWriter that hands out what was written since the last drain."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._pos = 0
+        self.closed = False
+
+    def write(self, b) -> int:
+        self._chunks.append(bytes(b))
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self) -> int:
+        return self._pos  # absolute offset; the Parquet footer records row-group offsets
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        out, self._chunks = b"".join(self._chunks), []
+        return out
+
+def parquet_schema(fields: List[str]):
+    import pyarrow as pa
+    types = {"id": pa.int64(), "date": pa.date32(), "amount": pa.float64()}
+    return pa.schema([(f, types.get(f, pa.string())) for f in fields])
+
+async def _parquet(batches, fields: List[str]) -> AsyncIterator[bytes]:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = parquet_schema(fields)
+    sink = _Sink()
+    writer = pq.ParquetWriter(sink, schema, compression="snappy")
+    try:
+        async for part in batches:
+            cols = {f: [getattr(r, f) for r in part] for f in fields}
+            writer.write_batch(pa.RecordBatch.from_pydict(cols, schema=schema))  # one row group per batch
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+def check_format(fmt: str):
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}; expected {', '.join(FORMATS)}.")
+    if fmt == "parquet":
+        try:
+            import pyarrow.parquet  # noqa: F401
+        except ImportError as e:
+            raise ValueError("Parquet export needs pyarrow (pip install pyarrow).") from e
+
+async def export_expenses(db: AsyncSession, fmt: str, *, fields: Optional[List[str]] = None,
+                          batch_size: int = 5000, **filters) -> AsyncIterator[bytes]:
+    """Encoded chunks of the filtered expenses (oldest first), one per fetched batch."""
+    check_format(fmt)
+    fields = select_fields(fields)
+    batches = iter_batches(db, fields=fields, batch_size=batch_size, **filters)
+    encode = {"csv": _csv, "ndjson": _ndjson, "parquet": _parquet}[fmt]
+    async for chunk in encode(batches, fields):
+        if chunk:
+            yield chunk
@@ -0,0 +1,244 @@
+from __future__ import annotations
+import asyncio, csv, io, json, logging, math, time
+from collections import Counter
+from dataclasses import dataclass, field, asdict
+from datetime import date, datetime
+from typing import Any, Dict, IO, Iterator, List, Optional, Tuple
+from sqlalchemy import select, func, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.expense import Expense, norm
+from app.services.categorizer import classify
+from app.services.expense_service import add_expenses_bulk
+
+log = logging.getLogger(__name__)
+
+# Bank/card exports name things differently; header -> our field (compared lowercased)
+ALIASES = {
+    "date": ["date", "transaction date", "trans date", "posted date", "posting date", "date_"],
+    "vendor": ["vendor", "merchant", "description", "payee", "name", "merchant name"],
+    "amount": ["amount", "value", "total"],
+    "debit": ["debit", "withdrawal"],
+    "credit": ["credit", "deposit"],
+    "category": ["category", "type"],
+    "currency": ["currency", "ccy"],
+    "notes": ["notes", "memo", "note"],
+}
+_FIELD = {a: f for f, aliases in ALIASES.items() for a in aliases}
+_DATE_FORMATS = ("%m/%d/%Y", "%m/%d/%y", "%Y/%m/%d", "%d.%m.%Y", "%b %d, %Y", "%d %b %Y")
+MAX_REPORTED_ERRORS = 100
+
+@dataclass
+class ImportReport:
+    lines: int = 0
+    inserted: int = 0
+    duplicates: int = 0
+    failed: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+    errors: List[Dict[str, Any]] = field(default_factory=list)   # first MAX_REPORTED_ERRORS only
+
+    def error(self, line: int, msg: str):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": msg})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+# ---- parsing ----
+def _parse_date(s: str, fmt: Optional[str]) -> date:
+    s = (s or "").strip()
+    if not s:
+        raise ValueError("missing date")
+    if fmt:
+        return datetime.strptime(s, fmt).date()
+    try:
+        return date.fromisoformat(s[:10])
+    except ValueError:
+        pass
+    for f in _DATE_FORMATS:
+        try:
+            return datetime.strptime(s, f).date()
+        except ValueError:
+            continue
+    raise ValueError(f"unrecognized date {s!r}")
+
+def _parse_amount(v: Any) -> Optional[float]:
+    if v is None:
+        return None
+    if isinstance(v, (int, float)):
+        try:
+            val = float(v)
+        except OverflowError:  # JSON integer too large for a float
+            raise ValueError(f"invalid amount {v!r}") from None
+    else:
+        s = str(v).strip().replace(",", "").replace("$", "").replace("€", "").replace("£", "")
+        if not s:
+            return None
+        neg = s.startswith("(") and s.endswith(")")  # accounting negatives
+        val = float(s.strip("()"))
+        val = -val if neg else val
+    # "nan", "inf", "1e309", JSON NaN/Infinity: one of these would poison every total and rollup
+    if not math.isfinite(val):
+        raise ValueError(f"invalid amount {v!r}")
+    return val
+
+def to_row(raw: Dict[str, Any], *, date_format: Optional[str] = None, negate: bool = False) -> Dict[str, Any]:
+    """One export record -> kwargs for add_expenses_bulk. Raises ValueError with a readable message."""
+    rec: Dict[str, Any] = {}
+    for k, v in raw.items():
+        f = _FIELD.get(str(k or "").strip().lower())
+        if f and f not in rec:
+            rec[f] = v.strip() if isinstance(v, str) else v
+
+    vendor = str(rec.get("vendor") or "").strip()
+    if not vendor:
+        raise ValueError("missing vendor/description")
+    amount = _parse_amount(rec.get("amount"))
+    if amount is None:
+        debit, credit = _parse_amount(rec.get("debit")), _parse_amount(rec.get("credit"))
+        if debit is None and credit is None:
+            raise ValueError("missing amount")
+        amount = (debit or 0.0) - (credit or 0.0)
+    if negate:
+        amount = -amount  # exports that list charges as negative numbers
+
+    category = str(rec.get("category") or "").strip() or classify(vendor).category
+    return {
+        "date_": _parse_date(str(rec.get("date") or ""), date_format),
+        "vendor": vendor[:128],
+        "category": category[:64],
+        "amount": round(amount, 2),
+        "currency": (str(rec.get("currency") or "USD").strip().upper() or "USD")[:8],
+        "notes": rec.get("notes") or None,
+    }
+
+def detect_format(filename: str | None, head: str) -> str:
+    name = (filename or "").lower()
+    if name.endswith((".jsonl", ".ndjson", ".json")):
+        return "jsonl"
+    if name.endswith(".csv"):
+        return "csv"
+    return "jsonl" if head.lstrip().startswith("{") else "csv"
+
+def iter_records(fh: IO[str], fmt: str) -> Iterator[Tuple[int, Dict[str, Any] | Exception]]:
+    """Yield (line_number, record or parse error) without reading the whole file."""
+    if fmt == "jsonl":
+        for n, line in enumerate(fh, start=1):
+            if not line.strip():
+                continue
+            try:
+                obj = json.loads(line)
+                yield n, obj if isinstance(obj, dict) else ValueError("expected a JSON object")
+            except ValueError as e:
+                yield n, ValueError(f"invalid JSON: {e}")
+        return
+    reader = csv.DictReader(fh)
+    for rec in reader:
+        if not any((v or "").strip() for v in rec.values() if isinstance(v, str)):
+            continue
+        yield reader.line_num, rec
+
+# ---- dedupe + insert ----
+_Key = Tuple[date, str, float, str]
+
+def _key(row: Dict[str, Any]) -> _Key:
+    return (row["date_"], norm(row["vendor"]), round(row["amount"], 2), row["currency"])
+
+async def _existing_counts(db: AsyncSession, keys: List[_Key]) -> Counter:
+    if not keys:
+        return Counter()
+    res = await db.execute(
+        select(Expense.date, Expense.vendor_norm, Expense.amount, Expense.currency, func.count())
+        .where(tuple_(Expense.date, Expense.vendor_norm).in_({(k[0], k[1]) for k in keys}))
+        .group_by(Expense.date, Expense.vendor_norm, Expense.amount, Expense.currency)
+    )
+    return Counter({(d, v, round(a, 2), c): n for d, v, a, c, n in res.all()})
+
+class _Deduper:
+    """
+    Same (date, vendor, amount, currency) can legitimately repeat (two coffees), so
+    dedupe by occurrence: the n-th copy in the file is a duplicate only if the
+    database already had at least n of them. Re-importing a file is a no-op.
+    """
+
+    def __init__(self):
+        self.existing: Counter = Counter()
+        self.looked_up: set = set()
+        self.seen: Counter = Counter()
+
+    async def filter(self, db: AsyncSession, batch: List[Tuple[int, Dict[str, Any]]]):
+        keys = [_key(r) for _, r in batch]
+        todo = [k for k in dict.fromkeys(keys) if k not in self.looked_up]
+        self.existing.update(await _existing_counts(db, todo))
+        self.looked_up.update(todo)
+        fresh, dups = [], 0
+        for (n, row), k in zip(batch, keys):
+            self.seen[k] += 1
+            if self.seen[k] <= self.existing[k]:
+                dups += 1
+            else:
+                fresh.append((n, row))
+        return fresh, dups
+
+def _parse_batch(records: Iterator[Tuple[int, Dict[str, Any] | Exception]], n: int, report: ImportReport, *,
+                 date_format: Optional[str], negate: bool) -> Tuple[List[Tuple[int, Dict[str, Any]]], bool]:
+    """Pull up to `n` valid rows off `records` (file reads + parsing; runs in a worker thread)."""
+    rows: List[Tuple[int, Dict[str, Any]]] = []
+    for line, rec in records:
+        report.lines += 1
+        if isinstance(rec, Exception):
+            report.error(line, str(rec))
+            continue
+        try:
+            rows.append((line, to_row(rec, date_format=date_format, negate=negate)))
+        except (ValueError, TypeError) as e:
+            report.error(line, str(e))
+            continue
+        if len(rows) >= n:
+            return rows, False
+    return rows, True
+
+async def import_expenses(db: AsyncSession, fh: IO[str], *, fmt: str, batch_size: int = 1000,
+                          dedupe: bool = True, dry_run: bool = False, date_format: Optional[str] = None,
+                          negate: bool = False) -> ImportReport:
+    """
+    Stream records from `fh`, validate, dedupe, insert `batch_size` rows per statement/commit.
+    Reading and parsing each batch happens in a worker thread so a large upload doesn't
+    stall the event loop; only the dedupe lookup and the insert run on it.
+    """
+    t0 = time.perf_counter()
+    report = ImportReport()
+    deduper = _Deduper()
+    records = iter_records(fh, fmt)
+
+    async def flush(batch: List[Tuple[int, Dict[str, Any]]]):
+        if not batch:
+            return
+        rows = batch
+        if dedupe:
+            rows, dups = await deduper.filter(db, batch)
+            report.duplicates += dups
+        if rows and not dry_run:
+            try:
+                await add_expenses_bulk(db, [r for _, r in rows])
+            except Exception as e:
+                await db.rollback()
+                log.warning("Import batch failed: %s", e)
+                for n, _ in rows:
+                    report.error(n, f"insert failed: {e.__class__.__name__}")
+                rows = []
+        report.inserted += len(rows)
+        report.batches += 1
+
+    done = False
+    while not done:
+        batch, done = await asyncio.to_thread(_parse_batch, records, batch_size, report,
+                                              date_format=date_format, negate=negate)
+        await flush(batch)
+    report.seconds = round(time.perf_counter() - t0, 3)
+    return report
+
+def open_text(binary: IO[bytes]) -> IO[str]:
+    # utf-8-sig: Excel-saved CSVs start with a BOM; newline="" as the csv module expects
+    return io.TextIOWrapper(binary, encoding="utf-8-sig", errors="replace", newline="")
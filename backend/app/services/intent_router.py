@@ -0,0 +1,163 @@
+from __future__ import annotations
+import calendar, re
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Callable, Optional, Tuple, List
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.services.tools import tool_total_spend, tool_summary_by_category
+
+# Deterministic fast path for spend/summary questions. Anything we can't account for
+# word-by-word falls through to the agent, so a miss costs nothing but a regex pass.
+
+CATEGORY_ALIASES = {
+    "Groceries": ["groceries", "grocery"],
+    "Dining": ["dining", "restaurants", "restaurant", "eating out", "food and drink"],
+    "Transport": ["transport", "transportation", "travel", "rides"],
+    "Utilities": ["utilities", "utility", "bills"],
+    "Shopping": ["shopping"],
+    "Health": ["health", "healthcare", "medical"],
+    "Entertainment": ["entertainment"],
+    "Other": ["other"],
+}
+
+_MONTHS = {m.lower(): i for i, m in enumerate(calendar.month_name) if m}
+_MONTHS.update({m.lower(): i for i, m in enumerate(calendar.month_abbr) if m})
+
+_BREAKDOWN = re.compile(r"\b(breakdown|break down|by category|per category|each category|summary|summarize|split)\b")
+_TOTAL = re.compile(r"\b(how much|total|spend|spent|spending)\b")
+
+# words allowed to remain once the date and category phrases are removed; no modals
+# ("can", "could", "should"): "how much can I spend" is a budget question, not a total
+_FILLER = set("""
+a all am amount and any are at be been breakdown break by categories category did do does down
+during each expense expenses far for get give have how i in is it me money much my of on over overall
+per please show so spend spending spent split summarize summary tell the to total was we were what whats
+with you your time up sum
+""".split())
+
+_ISO = r"(\d{4}-\d{2}-\d{2})"
+
+@dataclass
+class Intent:
+    kind: str                  # "total" | "breakdown"
+    start: Optional[date]
+    end: Optional[date]
+    category: Optional[str]
+    period: str                # human label, e.g. "last month"
+
+def _month_bounds(y: int, m: int) -> Tuple[date, date]:
+    return date(y, m, 1), date(y, m, calendar.monthrange(y, m)[1])
+
+def _shift_month(y: int, m: int, delta: int) -> Tuple[int, int]:
+    n = y * 12 + (m - 1) + delta
+    return n // 12, n % 12 + 1
+
+def _months_ago(d: date, n: int) -> date:
+    y, m = _shift_month(d.year, d.month, -n)
+    return date(y, m, min(d.day, calendar.monthrange(y, m)[1]))
+
+_MONTH_ALT = "|".join(sorted(_MONTHS, key=len, reverse=True))
+
+def _parse_period(q: str, today: date) -> Tuple[Optional[date], Optional[date], str, str]:
+    """Return (start, end, label, q_without_the_phrase). No phrase -> all time."""
+    rules: List[Tuple[str, Callable]] = [
+        (rf"\b(?:from|between)\s+{_ISO}\s+(?:to|and|until|through|-)\s+{_ISO}\b",
+         lambda m: (date.fromisoformat(m[1]), date.fromisoformat(m[2]), f"from {m[1]} to {m[2]}")),
+        (rf"\bsince\s+{_ISO}\b", lambda m: (date.fromisoformat(m[1]), today, f"since {m[1]}")),
+        (r"\btoday\b", lambda m: (today, today, "today")),
+        (r"\byesterday\b", lambda m: (today - timedelta(days=1), today - timedelta(days=1), "yesterday")),
+        (r"\bthis week\b", lambda m: (today - timedelta(days=today.weekday()), today, "this week")),
+        (r"\blast week\b", lambda m: (today - timedelta(days=today.weekday() + 7),
+                                      today - timedelta(days=today.weekday() + 1), "last week")),
+        (r"\b(?:this|current) month\b|\bmonth to date\b",
+         lambda m: (today.replace(day=1), today, "this month")),
+        (r"\b(?:last|previous|past) month\b",
+         lambda m: (*_month_bounds(*_shift_month(today.year, today.month, -1)), "last month")),
+        (r"\b(?:this|current) year\b|\byear to date\b|\bytd\b",
+         lambda m: (date(today.year, 1, 1), today, "this year")),
+        (r"\b(?:last|previous|past) year\b",
+         lambda m: (date(today.year - 1, 1, 1), date(today.year - 1, 12, 31), "last year")),
+        (r"\b(?:last|past)\s+(\d{1,3})\s+days?\b",
+         lambda m: (today - timedelta(days=int(m[1]) - 1), today, f"the last {m[1]} days")),
+        (r"\b(?:last|past)\s+(\d{1,2})\s+weeks?\b",
+         lambda m: (today - timedelta(weeks=int(m[1])) + timedelta(days=1), today, f"the last {m[1]} weeks")),
+        (r"\b(?:last|past)\s+(\d{1,2})\s+months?\b",
+         lambda m: (_months_ago(today, int(m[1])) + timedelta(days=1), today, f"the last {m[1]} months")),
+        # "in March", "for mar 2024", "March 2024" -- a bare "may" is too ambiguous to count
+        (rf"\b(?:in|for|during)\s+({_MONTH_ALT})\.?(?:\s+(\d{{4}}))?\b|\b({_MONTH_ALT})\.?\s+(\d{{4}})\b",
+         lambda m: _named_month(m[1] or m[3], m[2] or m[4], today)),
+        (r"\bin\s+(\d{4})\b", lambda m: (date(int(m[1]), 1, 1), date(int(m[1]), 12, 31), f"in {m[1]}")),
+    ]
+    for pat, fn in rules:
+        m = re.search(pat, q)
+        if m:
+            start, end, label = fn(m)
+            return start, end, label, (q[:m.start()] + " " + q[m.end():])
+    return None, None, "in total", q
+
+def _named_month(name: str, year: Optional[str], today: date):
+    mo = _MONTHS[name]
+    # "in March" without a year means the most recent March (this year unless it's still ahead)
+    y = int(year) if year else (today.year if mo <= today.month else today.year - 1)
+    start, end = _month_bounds(y, mo)
+    return start, end, f"in {calendar.month_name[mo]} {y}"
+
+def _parse_category(q: str) -> Tuple[Optional[str], str]:
+    for cat, aliases in CATEGORY_ALIASES.items():
+        for a in sorted(aliases, key=len, reverse=True):
+            m = re.search(rf"\b{re.escape(a)}\b", q)
+            if m:
+                return cat, q[:m.start()] + " " + q[m.end():]
+    return None, q
+
+def route(message: str, today: Optional[date] = None) -> Optional[Intent]:
+    """Parse a spend question into an Intent, or None if we're not confident."""
+    today = today or date.today()
+    q = re.sub(r"[?!.,]+(\s|$)", " ", (message or "").lower()).replace("'", "")
+    q = re.sub(r"\s+", " ", q).strip()
+    if not q or len(q) > 160:
+        return None
+
+    kind = "breakdown" if _BREAKDOWN.search(q) else ("total" if _TOTAL.search(q) else None)
+    if kind is None:
+        return None
+
+    try:
+        start, end, label, rest = _parse_period(q, today)
+    except ValueError:
+        return None  # looks like a date but isn't one ("2024-02-30", "in 0000"); the agent can ask
+    category, rest = _parse_category(rest)
+    if kind == "breakdown" and category is not None and category != "Other":
+        return None  # "breakdown of dining" isn't a per-category summary; let the agent handle it
+    if start and end and start > end:
+        return None
+
+    # every leftover word must be filler; amounts, merchants, verbs like "add" all fall through
+    leftover = [w for w in re.split(r"[\s\-/]+", rest) if w]
+    if any(w not in _FILLER for w in leftover):
+        return None
+    return Intent(kind=kind, start=start, end=end, category=category, period=label)
+
+def _money(v: float, currency: str = "USD") -> str:
+    return f"${v:,.2f}" if currency == "USD" else f"{v:,.2f} {currency}"
+
+def _range(intent: Intent) -> str:
+    if intent.start and intent.end and intent.start != intent.end:
+        return f" ({intent.start.isoformat()} – {intent.end.isoformat()})"
+    return ""
+
+async def answer(db: AsyncSession, intent: Intent) -> str:
+    s = intent.start.isoformat() if intent.start else None
+    e = intent.end.isoformat() if intent.end else None
+    if intent.kind == "total":
+        res = await tool_total_spend(db, start=s, end=e, category=intent.category)
+        what = f" on {intent.category}" if intent.category else ""
+        return f"You spent {_money(res['total'], res['currency'])}{what} {intent.period}{_range(intent)}."
+
+    rows = await tool_summary_by_category(db, start=s, end=e)
+    rows = sorted((r for r in rows if r["total"]), key=lambda r: r["total"], reverse=True)
+    if not rows:
+        return f"No expenses recorded {intent.period}{_range(intent)}."
+    lines = "\n".join(f"- {r['category']}: {_money(r['total'])}" for r in rows)
+    total = sum(r["total"] for r in rows)
+    return f"Spending by category {intent.period}{_range(intent)}:\n{lines}\n\nTotal: {_money(total)}"
@@ -0,0 +1,141 @@
+from __future__ import annotations
+import json, math, os, re, threading
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# BM25 over the same chunks as the vector index. The chunks themselves are persisted
+# (JSON next to the Chroma files); postings are rebuilt in memory on load, which is
+# milliseconds for a guide-sized corpus.
+
+_TOKEN = re.compile(r"[a-z0-9]+(?:[&'][a-z0-9]+)*")
+_STOP = frozenset("""
+a an and are as at be by can do does for from how i in is it its me my of on or our so that the their
+this to was we what when where which who will with you your
+""".split())
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall((text or "").lower()) if t not in _STOP]
+
+class BM25Index:
+    def __init__(self, path: Optional[str] = None, k1: float = 1.2, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._docs: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._lens: Dict[str, int] = {}
+        self._total_len = 0
+        self._mtime = 0.0
+        self._lock = threading.Lock()
+
+    # ---- maintenance ----
+    def _index(self, doc_id: str, text: str):
+        tf = Counter(tokenize(text))
+        for term, n in tf.items():
+            self._postings.setdefault(term, {})[doc_id] = n
+        self._lens[doc_id] = sum(tf.values())
+        self._total_len += self._lens[doc_id]
+
+    def _unindex(self, doc_id: str):
+        text, _ = self._docs.pop(doc_id)
+        for term in set(tokenize(text)):
+            posting = self._postings.get(term)
+            if posting is not None:
+                posting.pop(doc_id, None)
+                if not posting:
+                    del self._postings[term]
+        self._total_len -= self._lens.pop(doc_id, 0)
+
+    def upsert(self, docs: Iterable[Dict[str, Any]]):
+        with self._lock:
+            for d in docs:
+                if d["id"] in self._docs:
+                    self._unindex(d["id"])
+                self._docs[d["id"]] = (d["text"], d.get("metadata") or {})
+                self._index(d["id"], d["text"])
+            self._save()
+
+    def set_metadata(self, ids: List[str], metas: List[Dict[str, Any]]):
+        with self._lock:
+            for i, m in zip(ids, metas):
+                if i in self._docs:
+                    self._docs[i] = (self._docs[i][0], m)
+            self._save()
+
+    def delete(self, ids: Iterable[str]):
+        with self._lock:
+            for i in ids:
+                if i in self._docs:
+                    self._unindex(i)
+            self._save()
+
+    def clear(self):
+        with self._lock:
+            self._docs, self._postings, self._lens, self._total_len = {}, {}, {}, 0
+            self._save()
+
+    # ---- persistence ----
+    def _save(self):
+        if not self.path:
+            return
+        p = Path(self.path)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        tmp = p.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"docs": self._docs}, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, p)
+        self._mtime = p.stat().st_mtime
+
+    def load(self) -> bool:
+        """(Re)load from disk if the file changed since we last saw it (e.g. ingest ran in another process)."""
+        if not self.path or not os.path.exists(self.path):
+            return False
+        mtime = os.path.getmtime(self.path)
+        if mtime == self._mtime:
+            return True
+        with self._lock:
+            data = json.loads(Path(self.path).read_text(encoding="utf-8"))
+            self._docs, self._postings, self._lens, self._total_len = {}, {}, {}, 0
+            for doc_id, (text, meta) in data.get("docs", {}).items():
+                self._docs[doc_id] = (text, meta)
+                self._index(doc_id, text)
+            self._mtime = mtime
+        return True
+
+    # ---- query ----
+    def search(self, query: str, k: int = 5) -> List[Dict[str, Any]]:
+        terms = tokenize(query)
+        if not terms:
+            return []
+        # writers (upsert/delete/load) mutate the postings from other threads
+        with self._lock:
+            if not self._docs:
+                return []
+            n = len(self._docs)
+            avg = self._total_len / n or 1.0
+            scores: Dict[str, float] = {}
+            for term in set(terms):
+                posting = self._postings.get(term)
+                if not posting:
+                    continue
+                idf = math.log(1 + (n - len(posting) + 0.5) / (len(posting) + 0.5))
+                for doc_id, tf in posting.items():
+                    norm = tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * self._lens[doc_id] / avg))
+                    scores[doc_id] = scores.get(doc_id, 0.0) + idf * norm
+            top = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:k]
+            return [{"id": i, "text": self._docs[i][0], "metadata": self._docs[i][1], "score": round(s, 4)}
+                    for i, s in top]
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+def rrf_fuse(ranked: List[Tuple[List[Dict[str, Any]], float]], k: int, rrf_k: int = 60) -> List[Dict[str, Any]]:
+    """Reciprocal rank fusion of several ranked hit lists, each with a weight."""
+    fused: Dict[str, float] = {}
+    first: Dict[str, Dict[str, Any]] = {}
+    for hits, weight in ranked:
+        for rank, h in enumerate(hits):
+            fused[h["id"]] = fused.get(h["id"], 0.0) + weight / (rrf_k + rank + 1)
+            first.setdefault(h["id"], h)
+    top = sorted(fused.items(), key=lambda kv: kv[1], reverse=True)[:k]
+    return [{**first[i], "score": round(s, 6)} for i, s in top]
@@ -1,86 +1,171 @@
 from __future__ import annotations
-from typing import List, Dict, Any, Optional
-import os, pathlib
-import chromadb
-from chromadb.config import Settings as ChromaSettings
+from typing import Callable, List, Dict, Any, Optional
+import os, pathlib, threading
+from app.services.embedding_cache import EmbeddingCache
+from app.services.embed_batcher import EmbedBatcher
+from app.services.lexical import BM25Index, rrf_fuse
+from app.services.vector_store import VectorStore, build_store
 
 EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "local").lower()
 EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-004")
+LOCAL_EMBED_MODEL = os.getenv("LOCAL_EMBED_MODEL", "all-MiniLM-L6-v2")
 INDEX_DIR = os.getenv("RAG_INDEX_DIR", str(pathlib.Path("rag/index").resolve()))
+VECTOR_STORE = os.getenv("VECTOR_STORE", "chroma").lower()
+EMBED_CACHE_MAX = int(os.getenv("EMBED_CACHE_MAX", "4096"))
+# on-disk tier; set EMBED_CACHE_PATH= (empty) to keep the cache in memory only
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", str(pathlib.Path(INDEX_DIR) / "embeddings.sqlite"))
+# search modes: vector (vector store only) | lexical (BM25 only, no embedding) | hybrid (RRF of both)
+SEARCH_MODE = os.getenv("RAG_SEARCH_MODE", "hybrid").lower()
+SEARCH_MODES = ("vector", "lexical", "hybrid")
+HYBRID_VECTOR_WEIGHT = float(os.getenv("RAG_HYBRID_VECTOR_WEIGHT", "1.0"))
+HYBRID_LEXICAL_WEIGHT = float(os.getenv("RAG_HYBRID_LEXICAL_WEIGHT", "1.0"))
+RRF_K = int(os.getenv("RAG_RRF_K", "60"))
+EMBED_BATCH_WINDOW_MS = float(os.getenv("RAG_EMBED_BATCH_WINDOW_MS", "5"))
+EMBED_MAX_BATCH = int(os.getenv("RAG_EMBED_MAX_BATCH", "64"))
 
-# --- Embeddings (unchanged from your current file) ---
-if EMBEDDING_PROVIDER == "local":
-    from sentence_transformers import SentenceTransformer
-    _model_name = os.getenv("LOCAL_EMBED_MODEL", "all-MiniLM-L6-v2")
-    _st_model = SentenceTransformer(_model_name)
-    def _embed(texts: List[str]) -> List[List[float]]:
-        arr = _st_model.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
-        return arr.tolist()
-else:
-    from google import genai
-    from app.core.settings import settings
-    _client_g = genai.Client(api_key=settings.GOOGLE_API_KEY)
-    def _embed(texts: List[str]) -> List[List[float]]:
-        res = _client_g.models.embed_content(model=EMBEDDING_MODEL, contents=texts)
-        return [v.values for v in res.embeddings]
-
-# --- Chroma setup with safe (re)creation ---
-_client = chromadb.PersistentClient(path=INDEX_DIR, settings=ChromaSettings(allow_reset=True))
-_collection_name = "guides"
-_collection = None  # defer until first use
-
-def _ensure_collection():
-    global _collection
-    if _collection is None:
-        _collection = _client.get_or_create_collection(_collection_name)
-    return _collection
+# Nothing heavy happens at import: the embedding model and the vector store are built
+# on first use (or by the background warm-up), so /healthz and the SQL endpoints don't wait on them.
+_init_lock = threading.Lock()
+_embed_fn: Optional[Callable[[List[str]], List[List[float]]]] = None
+_vstore: Optional[VectorStore] = None
+
+# --- Embeddings ---
+def _load_embedder() -> Callable[[List[str]], List[List[float]]]:
+    if EMBEDDING_PROVIDER == "local":
+        from sentence_transformers import SentenceTransformer
+        st_model = SentenceTransformer(LOCAL_EMBED_MODEL)
+        def _embed(texts: List[str]) -> List[List[float]]:
+            arr = st_model.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+            return arr.tolist()
+    else:
+        from google import genai
+        from app.core.settings import settings
+        client_g = genai.Client(api_key=settings.GOOGLE_API_KEY)
+        def _embed(texts: List[str]) -> List[List[float]]:
+            res = client_g.models.embed_content(model=EMBEDDING_MODEL, contents=texts)
+            return [v.values for v in res.embeddings]
+    return _embed
+
+def _embed_direct(texts: List[str]) -> List[List[float]]:
+    global _embed_fn
+    if _embed_fn is None:
+        with _init_lock:
+            if _embed_fn is None:
+                _embed_fn = _load_embedder()
+    return _embed_fn(texts)
+
+# concurrent callers share forward passes on one worker thread; RAG_EMBED_BATCH_WINDOW_MS=0 disables
+embed_batcher = EmbedBatcher(_embed_direct, max_batch=EMBED_MAX_BATCH, window_ms=EMBED_BATCH_WINDOW_MS)
+
+def _embed(texts: List[str]) -> List[List[float]]:
+    return embed_batcher.embed(texts) if EMBED_BATCH_WINDOW_MS > 0 else _embed_direct(texts)
+
+# --- Embedding cache: identical texts (repeat queries, unchanged docs) skip the model ---
+embedding_cache = EmbeddingCache(
+    EMBEDDING_PROVIDER,
+    LOCAL_EMBED_MODEL if EMBEDDING_PROVIDER == "local" else EMBEDDING_MODEL,
+    max_entries=EMBED_CACHE_MAX,
+    path=EMBED_CACHE_PATH or None,
+)
+
+def _embed_cached(texts: List[str]) -> List[List[float]]:
+    return embedding_cache.get_many(texts, _embed)
+
+# --- Vector store: chroma (default) | numpy (memory-mapped brute force) ---
+def _store() -> VectorStore:
+    global _vstore
+    if _vstore is None:
+        with _init_lock:
+            if _vstore is None:
+                _vstore = build_store(VECTOR_STORE, INDEX_DIR)
+    return _vstore
+
+# --- Lexical (BM25) index over the same chunks, kept in step with every write below ---
+_bm25 = BM25Index(path=str(pathlib.Path(INDEX_DIR) / "bm25.json"))
+_bm25_ready = False
+
+def _lexical() -> BM25Index:
+    global _bm25_ready
+    if not _bm25.load() and not _bm25_ready:
+        # index built before the lexical side existed: backfill once from the vector store
+        ids, texts, metas = _store().get_all()
+        _bm25.upsert({"id": i, "text": t or "", "metadata": m or {}} for i, t, m in zip(ids, texts, metas))
+    _bm25_ready = True
+    return _bm25
+
+def warm_up() -> Dict[str, Any]:
+    """Load the embedding model and open the index (blocking; run it off the event loop)."""
+    _embed(["warm-up"])  # not cached: forces the model load and first forward pass
+    return {"provider": EMBEDDING_PROVIDER, "store": VECTOR_STORE, "documents": collection_count(),
+            "lexical_documents": len(_lexical())}
 
 def collection_count() -> int:
     try:
-        return _collection.count()
+        return _store().count()
     except Exception:
         return 0
 
 def reset_index():
-    global _collection
-    try:
-        _client.delete_collection(_collection_name)
-    except Exception:
-        pass
-    _collection = None
-    return _ensure_collection()
+    _store().reset()
+    _bm25.clear()
+    return _store()
 
-def add_documents(docs: List[Dict[str, Any]]) -> int:
+def upsert_documents(docs: List[Dict[str, Any]]) -> int:
+    """Insert or replace by id; the live index keeps serving throughout."""
     if not docs:
         return 0
-    col = _ensure_collection()
-    ids = [d["id"] for d in docs]
     texts = [d["text"] for d in docs]
-    metas = [d.get("metadata", {}) for d in docs]
-    embeds = _embed(texts)
-    col.add(ids=ids, embeddings=embeds, documents=texts, metadatas=metas)
+    _store().upsert([d["id"] for d in docs], _embed_cached(texts), texts, [d.get("metadata", {}) for d in docs])
+    _lexical().upsert(docs)
+    return len(docs)
+
+add_documents = upsert_documents
+
+def update_metadatas(ids: List[str], metas: List[Dict[str, Any]]) -> int:
+    # metadata-only change (e.g. a chunk moved position): no re-embedding
+    if ids:
+        _store().update_metadatas(ids, metas)
+        _lexical().set_metadata(ids, metas)
     return len(ids)
 
-def search(query: str, k: int = 5, n_results: Optional[int] = None) -> List[Dict[str, Any]]:
+def delete_documents(ids: List[str]) -> int:
+    if ids:
+        _store().delete(ids)
+        _lexical().delete(ids)
+    return len(ids)
+
+def list_ids() -> List[str]:
+    return _store().ids()
+
+def _mode(mode: Optional[str]) -> str:
+    mode = (mode or SEARCH_MODE).lower()
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"Unknown search mode {mode!r}; expected one of {', '.join(SEARCH_MODES)}.")
+    return mode
+
+def search_many(queries: List[str], k: int = 5, mode: Optional[str] = None) -> List[List[Dict[str, Any]]]:
+    """
+    One hit list per query. The vector side embeds every query in one call and
+    scores them with one store query.
+    """
+    mode = _mode(mode)
+    if not queries:
+        return []
+    if mode == "lexical":
+        return [_lexical().search(q, k) for q in queries]
+    depth = k if mode == "vector" else max(k * 4, 20)  # fuse deeper lists than we return
+    vector_hits = _store().query(_embed_cached(list(queries)), depth)
+    if mode == "vector":
+        return vector_hits
+    return [rrf_fuse([(hits, HYBRID_VECTOR_WEIGHT), (_lexical().search(q, depth), HYBRID_LEXICAL_WEIGHT)],
+                     k=k, rrf_k=RRF_K)
+            for q, hits in zip(queries, vector_hits)]
+
+def search(query: str, k: int = 5, n_results: Optional[int] = None, mode: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Top-k chunks for `query`. `score` depends on the mode: vector -> distance
+    (lower is better); lexical -> BM25; hybrid -> weighted reciprocal-rank-fusion (higher is better).
+    """
     if n_results is not None:
         k = n_results
-    col = _ensure_collection()
-    embeds = _embed([query])[0]
-    res = col.query(
-        query_embeddings=[embeds],
-        n_results=k,
-        include=["documents", "metadatas", "distances", "ids"]
-    )
-    out = []
-    ids = res.get("ids", [[]])[0] if res.get("ids") else []
-    docs = res.get("documents", [[]])[0] if res.get("documents") else []
-    metas = res.get("metadatas", [[]])[0] if res.get("metadatas") else []
-    dists = res.get("distances", [[]])[0] if res.get("distances") else []
-    for i in range(min(len(ids), len(docs), len(metas), len(dists))):
-        out.append({
-            "id": ids[i],
-            "text": docs[i],
-            "metadata": metas[i],
-            "score": float(dists[i]),
-        })
-    return out
+    return search_many([query], k=k, mode=mode)[0]
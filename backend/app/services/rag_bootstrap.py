@@ -1,21 +1,123 @@
 from pathlib import Path
+from dataclasses import dataclass, asdict
 from datetime import datetime
-from hashlib import md5
-from .rag import add_documents, reset_index, collection_count
+from hashlib import sha256
+from typing import Any, Dict, List
+import json, os, time
+from .rag import INDEX_DIR, reset_index, upsert_documents, update_metadatas, delete_documents, list_ids
+from .chunking import chunk_markdown
 
-def ensure_seed() -> bool:
-    # If the index already has docs, skip
-    if collection_count() > 0:
-        return False
-    base = Path("rag/data")
-    docs = []
-    for p in base.glob("*.md"):
-        text = p.read_text(encoding="utf-8")
+# Manifest of what the index holds: source file name -> file hash + its chunk ids.
+# Chunk ids are content hashes, so "changed" means "new id" and nothing is re-embedded twice.
+MANIFEST_PATH = Path(os.getenv("RAG_MANIFEST_PATH", str(Path(INDEX_DIR) / "manifest.json")))
+
+def _hash(s: str) -> str:
+    return sha256(s.encode("utf-8")).hexdigest()
+
+def _chunk_docs(p: Path, text: str, ingested_at: str) -> List[Dict[str, Any]]:
+    docs, seen = [], {}
+    for c in chunk_markdown(text, title=p.stem):
+        base = f"{_hash(p.name)[:8]}-{_hash(c.text)[:24]}"
+        n = seen.get(base, 0)  # identical passages within one file still get distinct ids
+        seen[base] = n + 1
         docs.append({
-            "id": md5((p.name + str(len(text))).encode()).hexdigest(),
-            "text": text,
-            "metadata": {"source": str(p), "title": p.stem, "ingested_at": datetime.utcnow().isoformat()}
+            "id": base if n == 0 else f"{base}-{n}",
+            "text": c.text,
+            "metadata": {"source": str(p), "title": p.stem, "section": c.section,
+                         "level": c.level, "chunk": c.index, "ingested_at": ingested_at},
         })
+    return docs
+
+def load_markdown_docs(base: Path) -> List[Dict[str, Any]]:
+    """rag/data/*.md -> one index document per chunk (section-aware, overlapping)."""
+    ingested_at = datetime.utcnow().isoformat()
+    docs = []
+    for p in sorted(base.glob("*.md")):
+        docs.extend(_chunk_docs(p, p.read_text(encoding="utf-8"), ingested_at))
+    return docs
+
+def _read_manifest() -> Dict[str, Any] | None:
+    try:
+        return json.loads(MANIFEST_PATH.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+def _write_manifest(sources: Dict[str, Any]):
+    MANIFEST_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp = MANIFEST_PATH.with_suffix(".tmp")
+    tmp.write_text(json.dumps({"version": 1, "sources": sources}, indent=1), encoding="utf-8")
+    os.replace(tmp, MANIFEST_PATH)
+
+@dataclass
+class SyncReport:
+    sources: int = 0
+    unchanged: int = 0
+    embedded: int = 0      # new/changed chunks (upserted)
+    relabeled: int = 0     # already-embedded chunks of a changed file (metadata refreshed only)
+    deleted: int = 0
+    seconds: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+def sync_index(base: Path) -> SyncReport:
+    """
+    Bring the index in line with base/*.md, touching only what changed:
+    unchanged files are skipped by hash, new chunks are upserted before stale
+    ones are deleted, so searches keep working for the whole run.
+    """
+    t0 = time.perf_counter()
+    manifest = _read_manifest()
+    old: Dict[str, Any] = (manifest or {}).get("sources", {})
+    report = SyncReport()
+    ingested_at = datetime.utcnow().isoformat()
+    live = set(list_ids())
+    if manifest is not None and not live:
+        old = {}  # index was wiped; the manifest no longer describes it
+
+    new: Dict[str, Any] = {}
+    stale: List[str] = []
+    for p in sorted(base.glob("*.md")):
+        report.sources += 1
+        text = p.read_text(encoding="utf-8")
+        file_hash = _hash(text)
+        prev = old.get(p.name)
+        if prev and prev["sha256"] == file_hash and all(i in live for i in prev["chunks"]):
+            new[p.name] = prev
+            report.unchanged += 1
+            continue
+        docs = _chunk_docs(p, text, ingested_at)
+        ids = [d["id"] for d in docs]
+        fresh = [d for d in docs if d["id"] not in live]
+        kept = [d for d in docs if d["id"] in live]
+        report.embedded += upsert_documents(fresh)
+        report.relabeled += update_metadatas([d["id"] for d in kept], [d["metadata"] for d in kept])
+        current = set(ids)
+        stale.extend(i for i in (prev or {}).get("chunks", []) if i not in current)
+        new[p.name] = {"sha256": file_hash, "chunks": ids}
+
+    # removed files, and on first run anything not produced by this manifest (legacy ids)
+    for name, prev in old.items():
+        if name not in new:
+            stale.extend(prev["chunks"])
+    if manifest is None:
+        wanted = {i for src in new.values() for i in src["chunks"]}
+        stale.extend(i for i in live if i not in wanted)
+    report.deleted = delete_documents(sorted(set(stale) & live))
+
+    _write_manifest(new)
+    report.seconds = round(time.perf_counter() - t0, 3)
+    return report
+
+def rebuild_index(base: Path) -> SyncReport:
+    """Full drop-and-re-add (the old behaviour); the index is empty while it runs."""
     reset_index()
-    add_documents(docs)
-    return True
\ No newline at end of file
+    MANIFEST_PATH.unlink(missing_ok=True)
+    return sync_index(base)
+
+def ensure_seed() -> SyncReport:
+    """Sync the index with rag/data at startup (cheap when nothing changed)."""
+    base = Path("rag/data")
+    if not base.is_dir():
+        return SyncReport()  # no corpus here: leave whatever rag/ingest.py built alone
+    return sync_index(base)
@@ -1,12 +1,20 @@
 from __future__ import annotations
 from typing import Dict, Any, List
+from dataclasses import dataclass
 from datetime import datetime
-import json
+from functools import lru_cache
+import io, json, logging
 from google import genai
 from google.genai import types
 from app.core.settings import settings
+from app.services.categorizer import match_keywords
 
-client = genai.Client(api_key=settings.GOOGLE_API_KEY)
+log = logging.getLogger(__name__)
+
+@lru_cache(maxsize=1)
+def get_client() -> genai.Client:
+    # built on first receipt, not at import
+    return genai.Client(api_key=settings.GOOGLE_API_KEY)
 
 RECEIPT_SCHEMA: Dict[str, Any] = {
     "type": "object",
@@ -57,9 +65,81 @@ def _coerce_date(d: str | None) -> str:
                 pass
     return datetime.utcnow().date().isoformat()
 
+# ---- Image pre-processing (runs in a worker thread, before the model call) ----
+
+@dataclass
+class PreparedImage:
+    data: bytes
+    mime_type: str
+    bytes_in: int
+    bytes_out: int
+    thumbnail: bytes | None = None
+
+def _autocrop(img):
+    from PIL import Image, ImageChops
+    # diff against the corner colour: everything that isn't background is the receipt
+    bg = img.getpixel((0, 0))
+    diff = ImageChops.difference(img, Image.new(img.mode, img.size, bg)).convert("L")
+    bbox = diff.point(lambda p: 255 if p > 24 else 0).getbbox()
+    if not bbox:
+        return img
+    pad = max(img.size) // 100
+    l, t, r, b = bbox
+    return img.crop((max(0, l - pad), max(0, t - pad), min(img.width, r + pad), min(img.height, b + pad)))
+
+def _encode_jpeg(img, quality: int) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=quality, optimize=True)
+    return buf.getvalue()
+
+def preprocess_image(image_bytes: bytes, mime_type: str) -> PreparedImage:
+    """
+    Auto-orient, optionally crop/grayscale, cap the long edge and recompress to
+    RECEIPT_TARGET_BYTES. Falls back to the original bytes if PIL can't decode
+    (e.g. HEIC without a plugin) or recompression wouldn't help.
+    """
+    original = PreparedImage(data=image_bytes, mime_type=mime_type,
+                             bytes_in=len(image_bytes), bytes_out=len(image_bytes))
+    if not settings.RECEIPT_PREPROCESS:
+        return original
+    try:
+        from PIL import Image, ImageOps
+        img = Image.open(io.BytesIO(image_bytes))
+        img = ImageOps.exif_transpose(img)
+    except Exception as e:
+        log.info("Receipt pre-processing skipped (%s): %s", mime_type, e)
+        return original
+
+    img = img.convert("L") if settings.RECEIPT_GRAYSCALE else img.convert("RGB")
+    if settings.RECEIPT_AUTOCROP:
+        img = _autocrop(img)
+    if max(img.size) > settings.RECEIPT_MAX_EDGE:
+        img.thumbnail((settings.RECEIPT_MAX_EDGE, settings.RECEIPT_MAX_EDGE), Image.LANCZOS)
+
+    # step quality down to the budget; if that's not enough, shrink and try again
+    quality, out = settings.RECEIPT_JPEG_QUALITY, b""
+    for _ in range(8):
+        out = _encode_jpeg(img, quality)
+        if len(out) <= settings.RECEIPT_TARGET_BYTES:
+            break
+        if quality > settings.RECEIPT_MIN_QUALITY:
+            quality = max(settings.RECEIPT_MIN_QUALITY, quality - 10)
+        else:
+            img = img.resize((int(img.width * 0.8), int(img.height * 0.8)), Image.LANCZOS)
+
+    thumb = img.copy()
+    thumb.thumbnail((settings.RECEIPT_THUMB_EDGE, settings.RECEIPT_THUMB_EDGE))
+    thumbnail = _encode_jpeg(thumb, 70)
+
+    if len(out) >= len(image_bytes) and mime_type in ("image/jpeg", "image/png", "image/webp"):
+        return PreparedImage(data=image_bytes, mime_type=mime_type, bytes_in=len(image_bytes),
+                             bytes_out=len(image_bytes), thumbnail=thumbnail)
+    return PreparedImage(data=out, mime_type="image/jpeg", bytes_in=len(image_bytes),
+                         bytes_out=len(out), thumbnail=thumbnail)
+
 def parse_receipt_bytes(image_bytes: bytes, mime_type: str) -> Dict[str, Any]:
     """Return dict conforming to RECEIPT_SCHEMA."""
-    resp = client.models.generate_content(
+    resp = get_client().models.generate_content(
         model=settings.GENAI_MODEL,
         contents=[
             types.Part.from_bytes(data=image_bytes, mime_type=mime_type),
@@ -81,21 +161,6 @@ def parse_receipt_bytes(image_bytes: bytes, mime_type: str) -> Dict[str, Any]:
         data["items"] = []
     return data
 
-# very small heuristic for vendor->category
+# very small heuristic for vendor->category (compiled keyword matcher lives in categorizer)
 def guess_category(vendor: str, fallback: str = "Other") -> str:
-    v = (vendor or "").lower()
-    if any(k in v for k in ["uber", "lyft", "shell", "chevron", "exxon", "bp", "metro", "bus"]):
-        return "Transport"
-    if any(k in v for k in ["starbucks", "cafe", "coffee", "restaurant", "grill", "pizza", "chipotle", "mcdonald", "burger", "ubereats", "doordash"]):
-        return "Dining"
-    if any(k in v for k in ["walmart", "target", "best buy", "amazon", "costco"]):
-        return "Shopping"
-    if any(k in v for k in ["kroger", "whole foods", "safeway", "aldi", "trader joe", "grocery"]):
-        return "Groceries"
-    if any(k in v for k in ["comcast", "xfinity", "att", "verizon", "pg&e", "electric", "water"]):
-        return "Utilities"
-    if any(k in v for k in ["pharmacy", "walgreens", "cvs", "rite aid", "clinic", "dental"]):
-        return "Health"
-    if any(k in v for k in ["netflix", "spotify", "hulu", "cinema", "theater"]):
-        return "Entertainment"
-    return fallback
\ No newline at end of file
+    return match_keywords(vendor) or fallback
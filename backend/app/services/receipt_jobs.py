@@ -0,0 +1,119 @@
+from __future__ import annotations
+import asyncio, logging, time, uuid
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional
+from app.core.db import SessionLocal
+from app.core.settings import settings
+from app.services.receipt_pipeline import process_receipt
+from app.services.receipt_store import StoredReceipt
+
+log = logging.getLogger(__name__)
+
+class QueueFull(Exception):
+    pass
+
+@dataclass
+class ReceiptJob:
+    id: str
+    filename: str
+    stored: StoredReceipt
+    status: str = "queued"            # queued | running | done | failed
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "filename": self.filename,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+class ReceiptJobQueue:
+    """
+    Bounded in-process queue + fixed pool of asyncio workers.
+    Each worker runs parse -> categorize -> insert for one receipt at a time,
+    so at most `workers` Gemini calls are in flight per process.
+    """
+
+    def __init__(self, workers: int, max_pending: int, ttl_s: int):
+        self.workers = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self.ttl_s = ttl_s
+        self._queue: asyncio.Queue[ReceiptJob] | None = None
+        self._tasks: List[asyncio.Task] = []
+        self._jobs: Dict[str, ReceiptJob] = {}
+
+    def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        log.info("Receipt job queue started (%d workers, %d max pending).", self.workers, self.max_pending)
+
+    async def stop(self):
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    def submit(self, *, stored: StoredReceipt, filename: str) -> ReceiptJob:
+        if self._queue is None:
+            raise RuntimeError("Receipt job queue is not running.")
+        self._prune()
+        job = ReceiptJob(id=uuid.uuid4().hex, filename=filename, stored=stored)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFull(f"{self.max_pending} receipts already pending")
+        self._jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> ReceiptJob | None:
+        return self._jobs.get(job_id)
+
+    def stats(self) -> Dict[str, Any]:
+        counts: Dict[str, int] = {}
+        for j in self._jobs.values():
+            counts[j.status] = counts.get(j.status, 0) + 1
+        return {"workers": len(self._tasks), "pending": self._queue.qsize() if self._queue else 0, "jobs": counts}
+
+    def _prune(self):
+        # drop finished jobs past their TTL so the table doesn't grow forever
+        cutoff = time.time() - self.ttl_s
+        for jid in [j.id for j in self._jobs.values() if j.finished_at and j.finished_at < cutoff]:
+            del self._jobs[jid]
+
+    async def _worker(self, n: int):
+        assert self._queue is not None
+        while True:
+            job = await self._queue.get()
+            job.status, job.started_at = "running", time.time()
+            try:
+                async with SessionLocal() as db:
+                    fields = await process_receipt(db, stored=job.stored)
+                verb = "Already saved" if fields["duplicate"] else "Parsed and saved"
+                job.result = {"ok": True, "note": f"{verb} '{job.filename}'.", **fields}
+                job.status = "done"
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.exception("Receipt job %s failed: %s", job.id, e)
+                job.status, job.error = "failed", str(e)
+            finally:
+                job.finished_at = time.time()
+                self._queue.task_done()
+
+receipt_jobs = ReceiptJobQueue(
+    workers=settings.RECEIPT_WORKERS,
+    max_pending=settings.RECEIPT_QUEUE_MAX,
+    ttl_s=settings.RECEIPT_JOB_TTL_S,
+)
@@ -0,0 +1,192 @@
+from __future__ import annotations
+import asyncio, json, logging
+from datetime import datetime
+from typing import Dict, Any, List, Tuple
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.settings import settings
+from app.models.expense import Expense
+from app.services.expense_service import add_expense, add_expenses_bulk, expense_committed, stage_expense
+from app.services.receipt import parse_receipt_bytes, preprocess_image
+from app.services.categorizer import classify
+from app.services.receipt_store import (
+    StoredReceipt, claim_parse, get_cached_parse, get_cached_parses, put_cached_parse, put_cached_parses,
+    save_thumbnail, set_parse_expense, thumbnail_path_for,
+)
+
+log = logging.getLogger(__name__)
+
+def _response_fields(parsed: Dict[str, Any], category: str, expense_id: int | None,
+                     sha256: str, image: Dict[str, int] | None = None) -> Dict[str, Any]:
+    image = image or {}
+    return {
+        "vendor": parsed["vendor"],
+        "transaction_date": parsed["transaction_date"],
+        "total": float(parsed["total"]),
+        "currency": parsed.get("currency") or "USD",
+        "category": category,
+        "items": parsed.get("items", []),
+        "inserted_id": expense_id,
+        "confidence": float(parsed.get("confidence", 0.0)),
+        "sha256": sha256,
+        "image_bytes_in": image.get("bytes_in"),
+        "image_bytes_sent": image.get("bytes_out"),
+        "thumbnail_url": f"/api/receipts/{sha256}/thumbnail" if thumbnail_path_for(sha256).exists() else None,
+    }
+
+def _choose_category(parsed: Dict[str, Any]) -> str:
+    # known merchant -> learned category; else model guess, else keyword rules
+    return classify(parsed.get("vendor", ""), parsed.get("category_guess")).category
+
+def _expense_row(parsed: Dict[str, Any], category: str, receipt_path: str) -> Dict[str, Any]:
+    # 1 row per receipt (aggregate total); keep raw json for audit
+    return {
+        "date_": datetime.fromisoformat(parsed["transaction_date"]).date(),
+        "vendor": parsed["vendor"],
+        "category": category,
+        "amount": float(parsed["total"]),
+        "currency": parsed.get("currency") or "USD",
+        "notes": None,
+        "raw_text": json.dumps(parsed, ensure_ascii=False),
+        "receipt_path": receipt_path,
+    }
+
+def _parse_stored(stored: StoredReceipt) -> Tuple[Dict[str, Any], Dict[str, int]]:
+    # the image is only pulled back into memory here, for pre-processing + the model call
+    prepared = preprocess_image(stored.path.read_bytes(), stored.mime_type)
+    if prepared.thumbnail:
+        save_thumbnail(stored.sha256, prepared.thumbnail)
+    log.info("Receipt %s: %d -> %d bytes sent to model", stored.sha256[:12], prepared.bytes_in, prepared.bytes_out)
+    parsed = parse_receipt_bytes(prepared.data, prepared.mime_type)
+    return parsed, {"bytes_in": prepared.bytes_in, "bytes_out": prepared.bytes_out}
+
+async def process_receipt(db: AsyncSession, *, stored: StoredReceipt, dedupe: bool | None = None) -> Dict[str, Any]:
+    """Parse -> categorize -> insert. Returns fields for UploadReceiptResponse."""
+    dedupe = settings.RECEIPT_DEDUPE if dedupe is None else dedupe
+    sha256, receipt_path = stored.sha256, str(stored.path)
+
+    # 0) same bytes seen before? reuse the parse (and the row, if dedupe is on)
+    hit, image = await get_cached_parse(db, sha256), None
+    if hit is not None:
+        parsed = json.loads(hit.parsed_json)
+        existing = await db.get(Expense, hit.expense_id) if (dedupe and hit.expense_id) else None
+        if existing is not None:
+            out = _response_fields(parsed, existing.category, existing.id, sha256)
+            return {**out, "cached": True, "duplicate": True}
+    else:
+        # 1) pre-process + parse with Gemini (structured output); blocking work, keep it off the event loop
+        parsed, image = await asyncio.to_thread(_parse_stored, stored)
+
+    # 2) categorize + 3) insert
+    category = _choose_category(parsed)
+    row = _expense_row(parsed, category, receipt_path)
+    if hit is None and dedupe:
+        # claim the sha and insert the row in one transaction: of two concurrent uploads of
+        # the same bytes, the second waits for the first to commit and then returns its row
+        if await claim_parse(db, sha256, parsed, receipt_path=receipt_path):
+            e = await stage_expense(db, **row)
+            await set_parse_expense(db, sha256, e.id)
+            await db.commit()
+            expense_committed(e)
+            return {**_response_fields(parsed, category, e.id, sha256, image), "cached": False, "duplicate": False}
+        await db.rollback()
+        winner = await get_cached_parse(db, sha256)
+        existing = await db.get(Expense, winner.expense_id) if winner and winner.expense_id else None
+        if existing is not None:
+            out = _response_fields(parsed, existing.category, existing.id, sha256, image)
+            return {**out, "cached": True, "duplicate": True}
+
+    e = await add_expense(db, **row)
+    expense_id = e.id  # before the cache write, which commits again
+    if hit is None:
+        await put_cached_parse(db, sha256, parsed, expense_id=expense_id, receipt_path=receipt_path)
+
+    return {**_response_fields(parsed, category, expense_id, sha256, image), "cached": hit is not None, "duplicate": False}
+
+async def process_receipts_batch(db: AsyncSession, stored: List[StoredReceipt], *,
+                                 dedupe: bool | None = None, concurrency: int | None = None) -> List[Dict[str, Any]]:
+    """
+    Batch variant of process_receipt. Cache lookups are one query, model calls fan out
+    (at most `concurrency` in flight), and all new rows go in with a single commit.
+    Returns one result per input, in order: response fields, or {"error": str}.
+    """
+    dedupe = settings.RECEIPT_DEDUPE if dedupe is None else dedupe
+    sem = asyncio.Semaphore(max(1, concurrency or settings.RECEIPT_BATCH_CONCURRENCY))
+    results: List[Dict[str, Any] | None] = [None] * len(stored)
+
+    # 0) cache + dedupe: one lookup for the whole batch; identical files inside the batch share one parse
+    hits = await get_cached_parses(db, (s.sha256 for s in stored))
+    existing_ids = [h.expense_id for h in hits.values() if dedupe and h.expense_id]
+    existing: Dict[int, Expense] = {}
+    if existing_ids:
+        existing = {e.id: e for e in await db.scalars(select(Expense).where(Expense.id.in_(existing_ids)))}
+
+    first_by_sha: Dict[str, int] = {}
+    parsed_by_sha: Dict[str, Dict[str, Any]] = {}
+    image_by_sha: Dict[str, Dict[str, int]] = {}
+    to_parse: List[int] = []
+    for i, s in enumerate(stored):
+        hit = hits.get(s.sha256)
+        if hit is not None:
+            parsed = json.loads(hit.parsed_json)
+            row = existing.get(hit.expense_id)
+            if row is not None:
+                results[i] = {**_response_fields(parsed, row.category, row.id, s.sha256),
+                              "cached": True, "duplicate": True}
+            else:
+                parsed_by_sha[s.sha256] = parsed
+        elif s.sha256 not in first_by_sha:
+            first_by_sha[s.sha256] = i
+            to_parse.append(i)
+
+    # 1) bounded concurrent model calls, each in a worker thread
+    async def _parse_one(i: int):
+        async with sem:
+            return await asyncio.to_thread(_parse_stored, stored[i])
+
+    outcomes = await asyncio.gather(*(_parse_one(i) for i in to_parse), return_exceptions=True)
+    for i, out in zip(to_parse, outcomes):
+        if isinstance(out, BaseException):
+            log.warning("Batch parse failed for %s: %s", stored[i].path.name, out)
+            results[i] = {"error": f"parse failed: {out}"}
+        else:
+            parsed_by_sha[stored[i].sha256], image_by_sha[stored[i].sha256] = out
+
+    # 2) categorize; within-batch duplicates point at the first copy's row when dedupe is on
+    rows, row_idx, dup_of = [], [], {}
+    for i, s in enumerate(stored):
+        if results[i] is not None:
+            continue
+        if s.sha256 not in parsed_by_sha:
+            results[i] = results[first_by_sha[s.sha256]]  # same bytes as a failed parse
+            continue
+        first = first_by_sha.get(s.sha256)
+        if dedupe and first is not None and first != i:
+            dup_of[i] = first
+            continue
+        parsed = parsed_by_sha[s.sha256]
+        try:
+            rows.append(_expense_row(parsed, _choose_category(parsed), str(s.path)))
+            row_idx.append(i)
+        except Exception as e:
+            results[i] = {"error": f"invalid parse: {e}"}
+
+    # 3) one transaction for every new row, then one for the new cache entries
+    inserted = await add_expenses_bulk(db, rows)
+    by_idx = dict(zip(row_idx, inserted))
+    for i, e in by_idx.items():
+        s = stored[i]
+        results[i] = {**_response_fields(parsed_by_sha[s.sha256], e.category, e.id, s.sha256,
+                                         image_by_sha.get(s.sha256)),
+                      "cached": s.sha256 in hits, "duplicate": False}
+    for i, first in dup_of.items():
+        src = results[first]
+        results[i] = {**src, "cached": True, "duplicate": True} if src and "error" not in src else src
+    new_cache: Dict[str, Dict[str, Any]] = {}
+    for i, e in by_idx.items():
+        s = stored[i]
+        if s.sha256 not in hits and s.sha256 not in new_cache:
+            new_cache[s.sha256] = {"sha256": s.sha256, "parsed": parsed_by_sha[s.sha256],
+                                   "expense_id": e.id, "receipt_path": str(s.path)}
+    await put_cached_parses(db, list(new_cache.values()))
+    return results
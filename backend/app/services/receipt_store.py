@@ -0,0 +1,178 @@
+from __future__ import annotations
+import asyncio, hashlib, json, os, tempfile
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Any, Iterable, List, Optional
+from fastapi import UploadFile
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.core.settings import settings
+from app.models.receipt_parse import ReceiptParse
+
+UPLOAD_DIR = Path(settings.UPLOAD_DIR); UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+_INCOMING = UPLOAD_DIR / ".incoming"
+CHUNK_SIZE = 256 * 1024
+
+_EXT = {
+    "image/png": ".png", "image/jpeg": ".jpg", "image/webp": ".webp",
+    "image/heic": ".heic", "image/heif": ".heif", "image/gif": ".gif",
+}
+
+class UploadRejected(Exception):
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+@dataclass
+class StoredReceipt:
+    sha256: str
+    path: Path
+    size: int
+    mime_type: str
+
+def sniff_mime(head: bytes) -> str | None:
+    """Identify the image type from magic bytes; the client's Content-Type is not trusted."""
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    if head[4:8] == b"ftyp":
+        brand = head[8:12]
+        if brand in (b"heic", b"heix", b"hevc", b"hevx", b"heim", b"heis", b"hevm", b"hevs"):
+            return "image/heic"
+        if brand in (b"mif1", b"msf1"):
+            return "image/heif"
+    return None
+
+def receipt_path_for(sha: str, mime_type: str) -> Path:
+    # two-level sharding keeps directories small (65k buckets)
+    return UPLOAD_DIR / sha[:2] / sha[2:4] / f"{sha}{_EXT.get(mime_type, '.bin')}"
+
+def thumbnail_path_for(sha: str) -> Path:
+    return UPLOAD_DIR / sha[:2] / sha[2:4] / f"{sha}.thumb.jpg"
+
+def save_thumbnail(sha: str, data: bytes) -> Path:
+    dest = thumbnail_path_for(sha)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    dest.write_bytes(data)
+    return dest
+
+def _finalize(tmp: Path, sha: str, mime_type: str) -> Path:
+    dest = receipt_path_for(sha, mime_type)
+    if dest.exists():
+        tmp.unlink(missing_ok=True)  # identical bytes already stored
+    else:
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp, dest)        # atomic: readers never see a partial file
+    return dest
+
+async def save_upload(file: UploadFile, *, max_bytes: int | None = None) -> StoredReceipt:
+    """
+    Stream an upload to disk in CHUNK_SIZE pieces, hashing and size-checking on the fly.
+    Only one chunk is held in memory; disk writes run in a worker thread.
+    """
+    max_bytes = max_bytes or settings.MAX_RECEIPT_BYTES
+    _INCOMING.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(dir=_INCOMING, prefix="upload-")
+    tmp = Path(tmp_name)
+    h, size, mime = hashlib.sha256(), 0, None
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while chunk := await file.read(CHUNK_SIZE):
+                if mime is None:
+                    mime = sniff_mime(chunk[:32])
+                    if mime is None:
+                        raise UploadRejected(415, "Upload a receipt image (png/jpg/webp/heic).")
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadRejected(413, f"Receipt exceeds the {max_bytes}-byte upload limit.")
+                h.update(chunk)
+                await asyncio.to_thread(out.write, chunk)
+        if mime is None:
+            raise UploadRejected(400, "Empty upload.")
+        sha = h.hexdigest()
+        dest = await asyncio.to_thread(_finalize, tmp, sha, mime)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return StoredReceipt(sha256=sha, path=dest, size=size, mime_type=mime)
+
+# ---- persistent parse cache (sha256 -> parsed RECEIPT_SCHEMA dict) ----
+
+async def get_cached_parse(db: AsyncSession, sha: str) -> Optional[ReceiptParse]:
+    return await db.get(ReceiptParse, sha)
+
+async def get_cached_parses(db: AsyncSession, shas: Iterable[str]) -> Dict[str, ReceiptParse]:
+    shas = list(set(shas))
+    if not shas:
+        return {}
+    res = await db.execute(select(ReceiptParse).where(ReceiptParse.sha256.in_(shas)))
+    return {r.sha256: r for r in res.scalars().all()}
+
+def _parse_row(e: Dict[str, Any]) -> Dict[str, Any]:
+    return {"sha256": e["sha256"], "parsed_json": json.dumps(e["parsed"], ensure_ascii=False),
+            "expense_id": e.get("expense_id"), "receipt_path": e.get("receipt_path"),
+            "created_at": datetime.utcnow()}
+
+def _insert_ignore(db: AsyncSession):
+    """INSERT that skips shas already cached, or None when the dialect has no ON CONFLICT."""
+    dialect = db.get_bind().dialect.name
+    if dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        return None
+    return insert(ReceiptParse).on_conflict_do_nothing(index_elements=["sha256"])
+
+async def put_cached_parses(db: AsyncSession, entries: List[Dict[str, Any]]) -> None:
+    """entries: [{"sha256", "parsed", "expense_id", "receipt_path"}]; one commit for all."""
+    if not entries:
+        return
+    stmt = _insert_ignore(db)
+    if stmt is not None:
+        # a concurrent upload of the same bytes may have cached it first; keep its entry.
+        # No IntegrityError means no rollback, so the caller's freshly committed objects stay loaded.
+        await db.execute(stmt, [_parse_row(e) for e in entries])
+        await db.commit()
+        return
+    db.add_all(ReceiptParse(**_parse_row(e)) for e in entries)
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        if len(entries) > 1:
+            for e in entries:
+                await put_cached_parses(db, [e])
+
+async def claim_parse(db: AsyncSession, sha: str, parsed: Dict[str, Any], *, receipt_path: Optional[str]) -> bool:
+    """
+    Insert the cache row for `sha` inside the caller's transaction (no commit); False if
+    another upload of the same bytes already holds it. The caller records its expense with
+    set_parse_expense and commits both together, so a loser always finds the winner's row.
+    """
+    stmt = _insert_ignore(db)
+    row = _parse_row({"sha256": sha, "parsed": parsed, "receipt_path": receipt_path})
+    if stmt is not None:
+        return (await db.scalar(stmt.values(**row).returning(ReceiptParse.sha256))) is not None
+    try:
+        async with db.begin_nested():
+            db.add(ReceiptParse(**row))
+        return True
+    except IntegrityError:
+        return False
+
+async def set_parse_expense(db: AsyncSession, sha: str, expense_id: int) -> None:
+    await db.execute(update(ReceiptParse).where(ReceiptParse.sha256 == sha).values(expense_id=expense_id))
+
+async def put_cached_parse(db: AsyncSession, sha: str, parsed: Dict[str, Any], *,
+                           expense_id: Optional[int], receipt_path: Optional[str]) -> None:
+    await put_cached_parses(db, [{"sha256": sha, "parsed": parsed,
+                                  "expense_id": expense_id, "receipt_path": receipt_path}])
@@ -0,0 +1,112 @@
+from __future__ import annotations
+import calendar, logging
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+from sqlalchemy import select, func, delete
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.expense import Expense, norm
+from app.models.expense_rollup import ExpenseMonthly
+
+log = logging.getLogger(__name__)
+
+_Key = Tuple[date, str, str]  # (month, category, currency)
+
+def month_start(d: date) -> date:
+    return d.replace(day=1)
+
+def month_end(d: date) -> date:
+    return d.replace(day=calendar.monthrange(d.year, d.month)[1])
+
+def split_range(start: Optional[date], end: Optional[date]):
+    """
+    Split [start, end] into whole months (answered from rollups) and partial-month
+    edges (answered from raw rows). Returns (rollup_from, rollup_to, raw_ranges), with
+    rollup_from/to as month starts (None = unbounded), or None when no whole month fits.
+    """
+    first = None if start is None else (start if start.day == 1 else month_end(start) + timedelta(days=1))
+    last = None if end is None else (end if end == month_end(end) else month_start(end) - timedelta(days=1))
+    if first is not None and last is not None and first > last:
+        return None
+    raw: List[Tuple[date, date]] = []
+    if start is not None and first != start:
+        raw.append((start, first - timedelta(days=1)))
+    if end is not None and last != end:
+        raw.append((last + timedelta(days=1), end))
+    return first, (month_start(last) if last is not None else None), raw
+
+# ---- maintenance ----
+async def apply_deltas(db: AsyncSession, deltas: Dict[_Key, Tuple[float, int]]):
+    """Add (total, count) deltas to rollup rows inside the caller's transaction (no commit)."""
+    if not deltas:
+        return
+    dialect = db.get_bind().dialect.name
+    rows = [{"month": m, "category": c, "currency": cur, "category_norm": norm(c), "total": t, "count": n}
+            for (m, c, cur), (t, n) in deltas.items()]
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert
+        stmt = insert(ExpenseMonthly)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["month", "category", "currency"],
+            set_={"total": ExpenseMonthly.total + stmt.excluded.total,
+                  "count": ExpenseMonthly.count + stmt.excluded.count},
+        )
+        await db.execute(stmt, rows)
+        return
+    for r in rows:  # other backends: read-modify-write
+        cur = await db.get(ExpenseMonthly, (r["month"], r["category"], r["currency"]))
+        if cur is None:
+            db.add(ExpenseMonthly(**r))
+        else:
+            cur.total += r["total"]
+            cur.count += r["count"]
+
+def deltas_for(expenses: Iterable[Expense], sign: int = 1) -> Dict[_Key, Tuple[float, int]]:
+    out: Dict[_Key, List[float]] = defaultdict(lambda: [0.0, 0])
+    for e in expenses:
+        acc = out[(month_start(e.date), e.category, e.currency or "USD")]
+        acc[0] += sign * float(e.amount)
+        acc[1] += sign
+    return {k: (t, int(n)) for k, (t, n) in out.items()}
+
+async def rebuild_rollups(db: AsyncSession) -> int:
+    """Recompute every rollup row from raw expenses (repairs drift); returns rows written."""
+    res = await db.execute(
+        select(Expense.date, Expense.category, Expense.currency, func.sum(Expense.amount), func.count())
+        .group_by(Expense.date, Expense.category, Expense.currency)
+    )
+    acc: Dict[_Key, List[float]] = defaultdict(lambda: [0.0, 0])
+    for d, c, cur, t, n in res.all():
+        a = acc[(month_start(d), c, cur or "USD")]
+        a[0] += float(t or 0)
+        a[1] += n
+    await db.execute(delete(ExpenseMonthly))
+    db.add_all(ExpenseMonthly(month=m, category=c, currency=cur, category_norm=norm(c), total=t, count=int(n))
+               for (m, c, cur), (t, n) in acc.items())
+    await db.commit()
+    return len(acc)
+
+async def ensure_rollups(db: AsyncSession) -> int | None:
+    """First start after the upgrade (or an external bulk load into an empty rollup table): build them."""
+    has_rollups = await db.scalar(select(func.count()).select_from(ExpenseMonthly))
+    if has_rollups:
+        return None
+    if not await db.scalar(select(func.count()).select_from(Expense)):
+        return None
+    n = await rebuild_rollups(db)
+    log.info("Built %d monthly rollup rows from existing expenses.", n)
+    return n
+
+# ---- queries ----
+def rollup_filter(stmt, rollup_from: Optional[date], rollup_to: Optional[date], category: Optional[str]):
+    stmt = stmt.where(ExpenseMonthly.count > 0)
+    if rollup_from is not None:
+        stmt = stmt.where(ExpenseMonthly.month >= rollup_from)
+    if rollup_to is not None:
+        stmt = stmt.where(ExpenseMonthly.month <= rollup_to)
+    if category:
+        stmt = stmt.where(ExpenseMonthly.category_norm == norm(category))
+    return stmt
@@ -3,7 +3,7 @@ from typing import Optional, List, Dict, Any
 from datetime import datetime, date
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.services.expense_service import add_expense, list_expenses, total_spend, summary_by_category
-from app.services.rag import search as rag_search
+from app.services.rag import search as rag_search, search_many as rag_search_many
 
 def _parse_date(s: str) -> date:
     return datetime.fromisoformat(s).date()
@@ -32,5 +32,8 @@ async def tool_summary_by_category(
     e = _parse_date(end) if end else None
     return await summary_by_category(db, start=s, end=e)
 
-def tool_rag_search(*, query: str, k: int = 5) -> List[Dict[str, Any]]:
-    return rag_search(query, k=k)
+def tool_rag_search(*, query: str, k: int = 5, mode: Optional[str] = None) -> List[Dict[str, Any]]:
+    return rag_search(query, k=k, mode=mode)
+
+def tool_rag_search_many(*, queries: List[str], k: int = 5, mode: Optional[str] = None) -> List[List[Dict[str, Any]]]:
+    return rag_search_many(queries, k=k, mode=mode)
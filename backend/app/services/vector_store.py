@@ -0,0 +1,281 @@
+from __future__ import annotations
+import json, os, threading, uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+try:
+    import fcntl  # cross-process writer lock for NumpyStore; POSIX only
+except ImportError:
+    fcntl = None
+
+# Storage behind rag.py. Both backends take precomputed embeddings (rag.py owns the
+# model + cache) and return hits as {"id", "text", "metadata", "score"} with score a
+# distance, lower is better.
+
+Hit = Dict[str, Any]
+
+class VectorStore(ABC):
+    name = "base"
+
+    @abstractmethod
+    def count(self) -> int: ...
+
+    @abstractmethod
+    def get_all(self) -> Tuple[List[str], List[str], List[Dict[str, Any]]]: ...
+
+    @abstractmethod
+    def upsert(self, ids: List[str], embeddings: List[List[float]], documents: List[str],
+               metadatas: List[Dict[str, Any]]): ...
+
+    @abstractmethod
+    def update_metadatas(self, ids: List[str], metadatas: List[Dict[str, Any]]): ...
+
+    @abstractmethod
+    def delete(self, ids: List[str]): ...
+
+    @abstractmethod
+    def reset(self): ...
+
+    @abstractmethod
+    def query(self, embeddings: List[List[float]], k: int) -> List[List[Hit]]:
+        """One ranked hit list per query embedding."""
+
+    def ids(self) -> List[str]:
+        return self.get_all()[0]
+
+# ---- Chroma ----
+class ChromaStore(VectorStore):
+    name = "chroma"
+
+    def __init__(self, path: str, collection: str = "guides"):
+        import chromadb
+        from chromadb.config import Settings as ChromaSettings
+        self._client = chromadb.PersistentClient(path=path, settings=ChromaSettings(allow_reset=True))
+        self._name = collection
+        self._collection = None  # defer until first use
+
+    def _col(self):
+        if self._collection is None:
+            self._collection = self._client.get_or_create_collection(self._name)
+        return self._collection
+
+    def count(self) -> int:
+        return self._col().count()
+
+    def get_all(self):
+        res = self._col().get(include=["documents", "metadatas"])
+        return list(res.get("ids") or []), list(res.get("documents") or []), list(res.get("metadatas") or [])
+
+    def ids(self) -> List[str]:
+        return list(self._col().get(include=[]).get("ids") or [])
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        self._col().upsert(ids=ids, embeddings=embeddings, documents=documents, metadatas=metadatas)
+
+    def update_metadatas(self, ids, metadatas):
+        self._col().update(ids=ids, metadatas=metadatas)
+
+    def delete(self, ids):
+        self._col().delete(ids=ids)
+
+    def reset(self):
+        try:
+            self._client.delete_collection(self._name)
+        except Exception:
+            pass
+        self._collection = None
+
+    def query(self, embeddings, k):
+        if not embeddings:
+            return []
+        res = self._col().query(query_embeddings=embeddings, n_results=k,
+                                include=["documents", "metadatas", "distances"])
+        out = []
+        for qi in range(len(embeddings)):
+            ids = (res.get("ids") or [[]])[qi]
+            docs = (res.get("documents") or [[]])[qi]
+            metas = (res.get("metadatas") or [[]])[qi]
+            dists = (res.get("distances") or [[]])[qi]
+            out.append([{"id": ids[i], "text": docs[i], "metadata": metas[i], "score": float(dists[i])}
+                        for i in range(min(len(ids), len(docs), len(metas), len(dists)))])
+        return out
+
+# ---- NumPy, memory-mapped ----
+class NumpyStore(VectorStore):
+    """
+    Brute-force cosine search over a float32 matrix of L2-normalized rows.
+
+    <dir>/vectors-<gen>.f32  raw row-major matrix, opened with np.memmap (read-only), so
+                             workers on one host share the page cache instead of each holding a copy
+    <dir>/rows.json          ids, documents, metadatas, dim, and which vectors file they belong to
+
+    A write produces a new vectors file, then swaps rows.json in atomically; other processes
+    pick the new version up on their next query (by rows.json mtime). Writers serialize on a
+    thread lock plus an flock on <dir>/.lock, so read-modify-write never loses an update.
+    Fine up to ~10^5 chunks.
+    """
+    name = "numpy"
+
+    def __init__(self, path: str):
+        import numpy as np
+        self._np = np
+        self.dir = Path(path)
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self._rows_path = self.dir / "rows.json"
+        self._lock = threading.RLock()
+        self._lock_path = self.dir / ".lock"
+        self._mtime = None
+        self._vectors: Optional[str] = None  # generation file behind the loaded rows
+        self._ids: List[str] = []
+        self._docs: List[str] = []
+        self._metas: List[Dict[str, Any]] = []
+        self._pos: Dict[str, int] = {}
+        self._mat = np.zeros((0, 0), dtype=np.float32)
+
+    def _refresh(self):
+        try:
+            mtime = os.path.getmtime(self._rows_path)
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        with self._lock:
+            for attempt in range(3):
+                rows = json.loads(self._rows_path.read_text(encoding="utf-8"))
+                n, dim = len(rows["ids"]), rows["dim"]
+                try:
+                    mat = (self._np.memmap(self.dir / rows["vectors"], dtype=self._np.float32, mode="r", shape=(n, dim))
+                           if n and dim else None)
+                    break
+                except FileNotFoundError:
+                    # a writer swapped generations between our two reads; re-read rows.json
+                    if attempt == 2:
+                        raise
+            self._vectors = rows.get("vectors")
+            if mat is not None:
+                self._mat = mat
+            else:
+                self._mat = self._np.zeros((0, dim or 0), dtype=self._np.float32)
+            self._ids, self._docs, self._metas = rows["ids"], rows["documents"], rows["metadatas"]
+            self._pos = {i: n for n, i in enumerate(self._ids)}
+            self._mtime = mtime
+
+    def _normalize(self, vecs):
+        a = self._np.asarray(vecs, dtype=self._np.float32)
+        if a.ndim == 1:
+            a = a[None, :]
+        norms = self._np.linalg.norm(a, axis=1, keepdims=True)
+        return a / self._np.maximum(norms, 1e-12)
+
+    @contextmanager
+    def _writing(self):
+        """Exclusive across threads and processes; state is reloaded so the write builds on the latest version."""
+        with self._lock, open(self._lock_path, "a+") as lf:
+            if fcntl is not None:
+                fcntl.flock(lf, fcntl.LOCK_EX)
+            try:
+                self._mtime = None
+                self._refresh()
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lf, fcntl.LOCK_UN)
+
+    def _write(self, ids, docs, metas, mat):
+        # callers hold _writing(). New vectors file first, then rows.json pointing at it:
+        # a reader never pairs rows with the wrong matrix
+        vec_name = f"vectors-{uuid.uuid4().hex[:12]}.f32"
+        self._np.ascontiguousarray(mat, dtype=self._np.float32).tofile(self.dir / vec_name)
+        tmp_rows = self._rows_path.with_suffix(".json.tmp")
+        tmp_rows.write_text(json.dumps({"ids": ids, "documents": docs, "metadatas": metas, "vectors": vec_name,
+                                        "dim": int(mat.shape[1]) if mat.ndim == 2 else 0},
+                                       ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_rows, self._rows_path)
+        # only the generation we replaced; unlinking is safe on POSIX, live memmaps keep their pages
+        replaced = self._vectors
+        if replaced and replaced != vec_name:
+            try:
+                (self.dir / replaced).unlink()
+            except OSError:
+                pass
+        self._mtime = None
+        self._refresh()
+
+    def count(self) -> int:
+        self._refresh()
+        return len(self._ids)
+
+    def get_all(self):
+        self._refresh()
+        return list(self._ids), list(self._docs), list(self._metas)
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        new = self._normalize(embeddings)
+        with self._writing():
+            if len(self._ids) and self._mat.shape[1] != new.shape[1]:
+                raise ValueError(f"Embedding dim {new.shape[1]} != index dim {self._mat.shape[1]}; rebuild the index.")
+            all_ids, docs, metas = list(self._ids), list(self._docs), list(self._metas)
+            mat = self._np.array(self._mat, dtype=self._np.float32) if len(all_ids) else new[:0]
+            pos = dict(self._pos)
+            append = []
+            last = {i: row for row, i in enumerate(ids)}  # repeated id within one call: last one wins
+            for i, row in last.items():
+                if i in pos:
+                    mat[pos[i]] = new[row]
+                    docs[pos[i]], metas[pos[i]] = documents[row], metadatas[row]
+                else:
+                    pos[i] = len(all_ids)
+                    all_ids.append(i)
+                    docs.append(documents[row])
+                    metas.append(metadatas[row])
+                    append.append(row)
+            if append:
+                mat = self._np.vstack([mat, new[append]])
+            self._write(all_ids, docs, metas, mat)
+
+    def update_metadatas(self, ids, metadatas):
+        with self._writing():
+            metas = list(self._metas)
+            for i, m in zip(ids, metadatas):
+                if i in self._pos:
+                    metas[self._pos[i]] = m
+            self._write(list(self._ids), list(self._docs), metas, self._np.array(self._mat))
+
+    def delete(self, ids):
+        with self._writing():
+            drop = {self._pos[i] for i in ids if i in self._pos}
+            if not drop:
+                return
+            keep = [n for n in range(len(self._ids)) if n not in drop]
+            self._write([self._ids[n] for n in keep], [self._docs[n] for n in keep],
+                        [self._metas[n] for n in keep], self._np.array(self._mat[keep]))
+
+    def reset(self):
+        with self._writing():
+            self._write([], [], [], self._np.zeros((0, 0), dtype=self._np.float32))
+
+    def query(self, embeddings, k):
+        self._refresh()
+        mat, ids = self._mat, self._ids
+        if not len(ids) or not embeddings:
+            return [[] for _ in embeddings]
+        q = self._normalize(embeddings)
+        sims = q @ mat.T                      # (queries, rows): one matmul for the whole batch
+        k = min(k, len(ids))
+        top = self._np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        out = []
+        for qi in range(len(q)):
+            order = top[qi][self._np.argsort(-sims[qi, top[qi]])]
+            out.append([{"id": ids[n], "text": self._docs[n], "metadata": self._metas[n],
+                         "score": float(1.0 - sims[qi, n])} for n in order])
+        return out
+
+def build_store(kind: str, index_dir: str) -> VectorStore:
+    """VECTOR_STORE=chroma (default) | numpy."""
+    kind = (kind or "chroma").lower()
+    if kind == "numpy":
+        return NumpyStore(str(Path(index_dir) / "numpy"))
+    if kind == "chroma":
+        return ChromaStore(index_dir)
+    raise ValueError(f"Unknown VECTOR_STORE {kind!r}; expected chroma or numpy.")
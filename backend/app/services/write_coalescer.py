@@ -0,0 +1,100 @@
+from __future__ import annotations
+import asyncio, logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+log = logging.getLogger(__name__)
+
+WriteFn = Callable[[List[Dict[str, Any]]], Awaitable[List[Any]]]
+
+class WriteCoalescer:
+    """
+    Group commit for single-row writes. Rows submitted within `window_ms` of the first
+    one (up to `max_batch`) are written by one `write(rows)` call, i.e. one multi-row
+    INSERT and one commit/fsync, and each caller gets its own result back. If the
+    batch fails, its rows are retried one by one so a bad row only fails its own caller.
+    """
+
+    def __init__(self, write: WriteFn, *, window_ms: float = 2.0, max_batch: int = 256):
+        self.write = write
+        self.window_s = max(0.0, window_ms) / 1000
+        self.max_batch = max(1, max_batch)
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self.batches = self.rows = self.retried = 0
+
+    async def submit(self, row: Dict[str, Any]) -> Any:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((row, fut))
+        if len(self._pending) >= self.max_batch:
+            self._spawn(self._take())
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_s, self._on_timer)
+        return await fut
+
+    def _on_timer(self):
+        self._timer = None
+        if self._pending:
+            self._spawn(self._take())
+
+    def _take(self) -> List[Tuple[Dict[str, Any], asyncio.Future]]:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        return batch
+
+    def _spawn(self, batch):
+        t = asyncio.ensure_future(self._flush(batch))
+        self._tasks.add(t)
+        t.add_done_callback(self._tasks.discard)
+
+    @staticmethod
+    def _resolve(fut: asyncio.Future, result=None, error: BaseException | None = None):
+        if fut.done():  # caller was cancelled; the row is written regardless
+            return
+        if error is not None:
+            fut.set_exception(error)
+        else:
+            fut.set_result(result)
+
+    async def _flush(self, batch):
+        try:
+            results = await self.write([r for r, _ in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                self._resolve(batch[0][1], error=e)
+                return
+            log.warning("Coalesced write of %d rows failed (%s); retrying individually", len(batch), e)
+            self.retried += len(batch)
+            for row, fut in batch:
+                try:
+                    (res,) = await self.write([row])
+                    self._resolve(fut, res)
+                except Exception as e1:
+                    self._resolve(fut, error=e1)
+            return
+        self.batches += 1
+        self.rows += len(batch)
+        for (_, fut), res in zip(batch, results):
+            self._resolve(fut, res)
+
+    async def drain(self):
+        """Write anything still waiting (shutdown)."""
+        if self._pending:
+            self._spawn(self._take())
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "rows": self.rows,
+            "avg_rows_per_commit": round(self.rows / self.batches, 2) if self.batches else None,
+            "retried_individually": self.retried,
+            "pending": len(self._pending),
+            "in_flight": len(self._tasks),
+            "window_ms": self.window_s * 1000,
+            "max_batch": self.max_batch,
+        }
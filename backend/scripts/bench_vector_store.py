@@ -0,0 +1,85 @@
+"""
+Compare vector-store backends on synthetic data: build time, query latency
+(single and batched) and process RSS. Each store runs in its own subprocess so
+RSS numbers aren't mixed.
+
+    PYTHONPATH=. python scripts/bench_vector_store.py --docs 5000 --dim 384
+    PYTHONPATH=. python scripts/bench_vector_store.py --store numpy   # one backend only
+"""
+import argparse, json, os, resource, statistics, subprocess, sys, tempfile, time
+import numpy as np
+from app.services.vector_store import build_store
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # peak, KB on Linux
+
+def _pct(xs, p):
+    xs = sorted(xs)
+    return xs[min(len(xs) - 1, int(p / 100 * len(xs)))]
+
+def run_one(kind: str, docs: int, dim: int, queries: int, batch: int, k: int) -> dict:
+    rng = np.random.default_rng(0)
+    vecs = rng.normal(size=(docs, dim)).astype(np.float32)
+    qs = rng.normal(size=(queries, dim)).astype(np.float32)
+    rss0 = _rss_mb()
+    with tempfile.TemporaryDirectory() as d:
+        store = build_store(kind, d)
+        t0 = time.perf_counter()
+        for i in range(0, docs, 1000):
+            n = min(1000, docs - i)
+            store.upsert([f"d{j}" for j in range(i, i + n)], vecs[i:i + n].tolist(),
+                         [f"doc {j}" for j in range(i, i + n)], [{"n": j} for j in range(i, i + n)])
+        build_s = time.perf_counter() - t0
+
+        store.query([qs[0].tolist()], k)  # first query pays for lazy loading
+        single = []
+        for q in qs:
+            t = time.perf_counter()
+            store.query([q.tolist()], k)
+            single.append((time.perf_counter() - t) * 1000)
+        t = time.perf_counter()
+        for i in range(0, queries, batch):
+            store.query(qs[i:i + batch].tolist(), k)
+        batched_ms = (time.perf_counter() - t) * 1000 / queries
+        return {
+            "store": kind, "docs": docs, "dim": dim,
+            "build_s": round(build_s, 3),
+            "query_p50_ms": round(statistics.median(single), 3),
+            "query_p95_ms": round(_pct(single, 95), 3),
+            f"batched_{batch}_ms_per_query": round(batched_ms, 3),
+            "rss_mb": round(_rss_mb(), 1), "rss_delta_mb": round(_rss_mb() - rss0, 1),
+        }
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--store", choices=["chroma", "numpy"], help="run only this backend (in-process)")
+    ap.add_argument("--docs", type=int, default=5000)
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--batch", type=int, default=32)
+    ap.add_argument("--k", type=int, default=5)
+    args = ap.parse_args()
+
+    if args.store:
+        print(json.dumps(run_one(args.store, args.docs, args.dim, args.queries, args.batch, args.k)))
+        return
+
+    base = [sys.argv[0], "--docs", str(args.docs), "--dim", str(args.dim), "--queries", str(args.queries),
+            "--batch", str(args.batch), "--k", str(args.k)]
+    for kind in ("chroma", "numpy"):
+        p = subprocess.run([sys.executable, *base, "--store", kind], capture_output=True, text=True, env=os.environ)
+        if p.returncode != 0:
+            print(f"{kind}: failed: {p.stderr.strip().splitlines()[-1] if p.stderr.strip() else p.returncode}")
+            continue
+        r = json.loads(p.stdout.strip().splitlines()[-1])
+        print(f"{kind:>6}: " + ", ".join(f"{k}={v}" for k, v in r.items() if k not in ("store", "docs", "dim")))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Export expenses (oldest first) to CSV, NDJSON or Parquet, streamed in batches so
+memory stays flat however large the table is. Same filters as GET /api/export/expenses.
+
+    PYTHONPATH=. python scripts/export_expenses.py --start 2024-01-01 --end 2024-12-31 > 2024.csv
+    PYTHONPATH=. python scripts/export_expenses.py --format parquet --out 2024.parquet --fields id,date,vendor,amount
+"""
+import argparse, asyncio, sys
+from datetime import date
+from app.core.db import SessionLocal, init_db
+from app.core.settings import settings
+from app.services.exporter import export_expenses, check_format, FORMATS
+from app.services.expense_service import select_fields
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--format", choices=list(FORMATS), default="csv")
+    ap.add_argument("--out", help="output file (default: stdout; required for parquet)")
+    ap.add_argument("--start", type=date.fromisoformat)
+    ap.add_argument("--end", type=date.fromisoformat)
+    ap.add_argument("--category")
+    ap.add_argument("--vendor", help="vendor prefix, case-insensitive")
+    ap.add_argument("--min-amount", type=float)
+    ap.add_argument("--max-amount", type=float)
+    ap.add_argument("--fields", help="comma-separated columns; default all but raw_text")
+    ap.add_argument("--batch-size", type=int, default=settings.EXPORT_BATCH_SIZE)
+    args = ap.parse_args()
+
+    try:
+        check_format(args.format)
+        fields = select_fields([f.strip() for f in args.fields.split(",") if f.strip()] if args.fields else None)
+    except ValueError as e:
+        raise SystemExit(str(e))
+    if args.format == "parquet" and not args.out:
+        raise SystemExit("--out is required for parquet.")
+
+    await init_db()
+    out = open(args.out, "wb") if args.out else sys.stdout.buffer
+    try:
+        async with SessionLocal() as db:
+            async for chunk in export_expenses(
+                db, args.format, fields=fields, batch_size=max(1, args.batch_size),
+                start=args.start, end=args.end, category=args.category, vendor_prefix=args.vendor,
+                min_amount=args.min_amount, max_amount=args.max_amount,
+            ):
+                out.write(chunk)
+    finally:
+        if args.out:
+            out.close()
+        else:
+            out.flush()
+
+if __name__ == "__main__":
+    asyncio.run(main())
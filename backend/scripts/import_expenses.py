@@ -0,0 +1,41 @@
+"""
+Import a bank/card export (CSV or JSON lines) into expenses, same code path as
+POST /api/import/expenses. Re-running on the same file inserts nothing new.
+
+    PYTHONPATH=. python scripts/import_expenses.py statement.csv --dry-run
+    PYTHONPATH=. python scripts/import_expenses.py statement.csv --date-format %d/%m/%Y --negate
+"""
+import argparse, asyncio, json
+from app.core.db import SessionLocal, init_db
+from app.core.settings import settings
+from app.services.importer import import_expenses, detect_format, open_text
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("path")
+    ap.add_argument("--format", choices=["csv", "jsonl"], help="default: from the extension/contents")
+    ap.add_argument("--dry-run", action="store_true", help="validate and dedupe, insert nothing")
+    ap.add_argument("--no-dedupe", action="store_true")
+    ap.add_argument("--batch-size", type=int, default=settings.IMPORT_BATCH_SIZE)
+    ap.add_argument("--date-format", help="strptime format, e.g. %%d/%%m/%%Y")
+    ap.add_argument("--negate", action="store_true", help="charges are negative in the export")
+    args = ap.parse_args()
+
+    await init_db()
+    with open(args.path, "rb") as raw:
+        head = raw.read(256).decode("utf-8", errors="replace")
+        raw.seek(0)
+        async with SessionLocal() as db:
+            report = await import_expenses(
+                db, open_text(raw), fmt=args.format or detect_format(args.path, head),
+                batch_size=max(1, args.batch_size), dedupe=not args.no_dedupe, dry_run=args.dry_run,
+                date_format=args.date_format, negate=args.negate,
+            )
+    d = report.to_dict()
+    errors = d.pop("errors")
+    print(json.dumps(d))
+    for e in errors:
+        print(f"  line {e['line']}: {e['error']}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,73 +1,212 @@
-import os, asyncio
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy import text
+"""
+Copy the app's tables from one database to another: SQLite -> Postgres by default,
+but any two SQLAlchemy URLs work (SQLite -> SQLite is handy for a dry rehearsal).
+
+Rows are streamed from the source in primary-key order and written in multi-row
+INSERT batches, one commit per batch. After each commit the last copied key is
+written to a checkpoint file, so an interrupted run picks up where it stopped.
+Primary keys are kept (receipt_parses.expense_id points at expenses.id) and the
+Postgres id sequence is moved past them. expense_monthly is rebuilt, not copied.
+
+    PYTHONPATH=. python scripts/migrate_sqlite_to_pg.py                 # SQLITE_PATH -> DATABASE_URL
+    PYTHONPATH=. python scripts/migrate_sqlite_to_pg.py --source sqlite:///old.sqlite --target sqlite:///new.sqlite
+    PYTHONPATH=. python scripts/migrate_sqlite_to_pg.py --restart       # ignore the checkpoint
+
+The source is opened read-only with a plain engine, so the file being migrated is
+left exactly as it was. URLs come from the flags, else SQLITE_PATH / DATABASE_URL
+(environment or .env); the app settings, and so GOOGLE_API_KEY, aren't needed.
+"""
+import argparse, asyncio, hashlib, json, os, time
 from pathlib import Path
+from dotenv import load_dotenv
+from sqlalchemy import Integer, func, inspect, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 
-SQLITE_PATH = os.getenv("SQLITE_PATH", "./db/expenses.sqlite")
-PG_URL = os.getenv("DATABASE_URL")
-
-def norm_pg(url: str) -> str:
-    import urllib.parse as up
-    url = url.replace("postgres://", "postgresql://")
-    if url.startswith("postgresql://") and "+psycopg" not in url and "+asyncpg" not in url:
-        url = url.replace("postgresql://", "postgresql+psycopg://", 1)
-    # For psycopg/libpq, ensure ssl + TCP keepalives (Neon-friendly)
-    if "+psycopg" in url:
-        p = up.urlparse(url)
-        q = dict(up.parse_qsl(p.query, keep_blank_values=True))
-        q.setdefault("sslmode", "require")
-        q.setdefault("keepalives", "1")
-        q.setdefault("keepalives_idle", "30")
-        q.setdefault("keepalives_interval", "10")
-        q.setdefault("keepalives_count", "5")
-        url = up.urlunparse(p._replace(query=up.urlencode(q)))
-    return url
+load_dotenv()
+# the app modules below build app.core.settings on import; this script never calls the model
+os.environ.setdefault("GOOGLE_API_KEY", "")
 
-async def main():
-    if not PG_URL:
-        raise SystemExit("Set DATABASE_URL for the target Postgres.")
-    # read from sqlite (sync)
-    import sqlite3, json
-    sp = Path(SQLITE_PATH).resolve()
-    if not sp.exists():
-        print("No SQLite file found; nothing to migrate.")
+from app.core.db import Base, _normalize_db_url, make_engine
+from app.core.migrations import upgrade_schema
+from app.models.expense import norm
+from app.models import expense, expense_rollup, receipt_parse  # noqa: F401  (register tables)
+from app.services.rollups import rebuild_rollups
+
+DERIVED = {"expense_monthly"}  # rebuilt from expenses on the target instead of copied
+
+def _async_url(url: str) -> str:
+    if url.startswith("sqlite:///"):
+        return url.replace("sqlite:///", "sqlite+aiosqlite:///", 1)
+    return _normalize_db_url(url)
+
+def _source_engine(url: str) -> AsyncEngine:
+    # not make_engine: its connect pragmas (journal_mode=WAL) would permanently change the source file
+    if url.startswith("sqlite+aiosqlite:///"):
+        path = Path(url.split(":///", 1)[1]).resolve()
+        return create_async_engine(f"sqlite+aiosqlite:///file:{path.as_posix()}?mode=ro&uri=true")
+    return create_async_engine(url)
+
+def _masked(url: str) -> str:
+    return url.split("@")[-1] if "@" in url else url
+
+# ---- checkpoint ----
+class Checkpoint:
+    """{"run": <source+target hash>, "tables": {name: {"last": pk, "rows": n}}}; rewritten atomically."""
+
+    def __init__(self, path: Path, run: str, restart: bool):
+        self.path = path
+        self.run = run
+        self.tables = {}
+        if path.exists() and not restart:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            if data.get("run") == run:
+                self.tables = data.get("tables", {})
+            else:
+                print(f"Checkpoint {path} is for a different source/target; starting over.")
+
+    def get(self, table: str):
+        return self.tables.get(table, {"last": None, "rows": 0})
+
+    def save(self, table: str, last, rows: int):
+        self.tables[table] = {"last": last, "rows": rows}
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"run": self.run, "tables": self.tables}, default=str), encoding="utf-8")
+        os.replace(tmp, self.path)
+
+# ---- copy ----
+async def _source_columns(src: AsyncEngine, table: str):
+    async with src.connect() as conn:
+        def cols(c):
+            insp = inspect(c)
+            return {col["name"] for col in insp.get_columns(table)} if insp.has_table(table) else None
+        return await conn.run_sync(cols)
+
+def _insert(tgt: AsyncEngine, table, pk):
+    # a crash between the target commit and the checkpoint write re-sends one batch; skip those rows
+    if tgt.dialect.name in ("sqlite", "postgresql"):
+        if tgt.dialect.name == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        return dialect_insert(table).on_conflict_do_nothing(index_elements=[pk.name])
+    return insert(table)
+
+async def copy_table(src: AsyncEngine, tgt: AsyncEngine, table, ckpt: Checkpoint, batch: int) -> int:
+    have = await _source_columns(src, table.name)
+    if have is None:
+        print(f"{table.name}: not in source, skipped")
+        return 0
+    (pk,) = table.primary_key.columns
+    cols = [c for c in table.columns if c.name in have]
+    # older SQLite files predate the *_norm columns; derive them here so the target is complete
+    derive = {f"{c}_norm": c for c in ("category", "vendor") if f"{c}_norm" in table.c and c in table.c}
+
+    state = ckpt.get(table.name)
+    last, done = state["last"], state["rows"]
+    stmt = select(*cols).order_by(pk)
+    if last is not None:
+        stmt = stmt.where(pk > last)
+        print(f"{table.name}: resuming after {pk.name}={last} ({done} rows already copied)")
+    ins = _insert(tgt, table, pk)
+
+    t0, copied, reported = time.perf_counter(), 0, 0.0
+    async with src.connect() as sconn:
+        result = await sconn.stream(stmt.execution_options(yield_per=batch))
+        while True:
+            part = await result.fetchmany(batch)
+            if not part:
+                break
+            rows = [dict(r._mapping) for r in part]
+            for dst, field in derive.items():
+                for r in rows:
+                    if r.get(dst) is None:
+                        r[dst] = norm(r[field])
+            async with tgt.begin() as tconn:
+                await tconn.execute(ins, rows)
+            last = rows[-1][pk.name]
+            copied += len(rows)
+            ckpt.save(table.name, last, done + copied)
+            elapsed = time.perf_counter() - t0
+            if elapsed - reported >= 2:
+                reported = elapsed
+                print(f"{table.name}: {done + copied} rows ({copied / elapsed:,.0f} rows/s)")
+    elapsed = time.perf_counter() - t0
+    rate = f"{copied / elapsed:,.0f} rows/s" if copied and elapsed else "-"
+    print(f"{table.name}: copied {copied} rows in {elapsed:.1f}s ({rate}); {done + copied} total")
+    return copied
+
+async def fix_sequences(tgt: AsyncEngine, tables):
+    """Postgres: move SERIAL sequences past the ids we inserted explicitly."""
+    if tgt.dialect.name != "postgresql":
         return
-    rows = []
-    con = sqlite3.connect(str(sp))
+    async with tgt.begin() as conn:
+        for table in tables:
+            (pk,) = table.primary_key.columns
+            if not isinstance(pk.type, Integer):
+                continue
+            await conn.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table.name}', '{pk.name}'), "
+                f"COALESCE(MAX({pk.name}), 1), MAX({pk.name}) IS NOT NULL) FROM {table.name}"))
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--source", help="SQLAlchemy URL, opened read-only (default: sqlite:///$SQLITE_PATH)")
+    ap.add_argument("--target", help="SQLAlchemy URL (default: $DATABASE_URL)")
+    ap.add_argument("--batch-size", type=int, default=5000, help="rows per INSERT + commit")
+    ap.add_argument("--checkpoint", help="default: <source sqlite file>.migrate.json, else ./migrate.json")
+    ap.add_argument("--restart", action="store_true", help="ignore an existing checkpoint")
+    ap.add_argument("--no-rollups", action="store_true", help="skip rebuilding expense_monthly on the target")
+    args = ap.parse_args()
+
+    if not args.source:
+        sp = Path(os.getenv("SQLITE_PATH") or Path(__file__).resolve().parents[2] / "db" / "expenses.sqlite").resolve()
+        if not sp.exists():
+            print("No SQLite file found; nothing to migrate.")
+            return
+        args.source = f"sqlite:///{sp}"
+    args.target = args.target or os.getenv("DATABASE_URL")
+    if not args.target:
+        raise SystemExit("Set DATABASE_URL or pass --target.")
+    src_url, tgt_url = _async_url(args.source), _async_url(args.target)
+    if src_url == tgt_url:
+        raise SystemExit("Source and target are the same database.")
+
+    if args.checkpoint:
+        ckpt_path = Path(args.checkpoint)
+    elif src_url.startswith("sqlite+aiosqlite:///"):
+        ckpt_path = Path(src_url.split(":///", 1)[1] + ".migrate.json")
+    else:
+        ckpt_path = Path("migrate.json")
+    run = hashlib.sha256(f"{src_url}|{tgt_url}".encode()).hexdigest()[:16]
+    ckpt = Checkpoint(ckpt_path, run, args.restart)
+
+    print(f"Migrating {_masked(src_url)} -> {_masked(tgt_url)} (batch {args.batch_size}, checkpoint {ckpt_path})")
+    src = _source_engine(src_url)
+    tgt = make_engine(tgt_url)
     try:
-        for r in con.execute("select id,date,vendor,category,amount,currency,notes,raw_text,receipt_path from expenses"):
-            rows.append(r)
-    finally:
-        con.close()
+        async with tgt.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(upgrade_schema)
 
-    if not rows:
-        print("No rows to migrate.")
-        return
+        t0, total = time.perf_counter(), 0
+        tables = [t for t in Base.metadata.sorted_tables if t.name not in DERIVED]
+        for table in tables:
+            total += await copy_table(src, tgt, table, ckpt, max(1, args.batch_size))
+        await fix_sequences(tgt, tables)
+        elapsed = time.perf_counter() - t0
+        print(f"Copied {total} rows in {elapsed:.1f}s ({total / elapsed if elapsed else 0:,.0f} rows/s).")
 
-    # write to PG (async)
-    pg = create_async_engine(norm_pg(PG_URL), echo=False, future=True)
-    async with pg.begin() as conn:
-        # ensure table exists
-        await conn.execute(text("""
-        CREATE TABLE IF NOT EXISTS expenses (
-            id SERIAL PRIMARY KEY,
-            date DATE NOT NULL,
-            vendor VARCHAR(128) NOT NULL,
-            category VARCHAR(64) NOT NULL,
-            amount DOUBLE PRECISION NOT NULL,
-            currency VARCHAR(8) NOT NULL DEFAULT 'USD',
-            notes TEXT NULL,
-            raw_text TEXT NULL,
-            receipt_path TEXT NULL
-        )"""))
-        for r in rows:
-            await conn.execute(
-                text("""INSERT INTO expenses (date,vendor,category,amount,currency,notes,raw_text,receipt_path)
-                        VALUES (:date,:vendor,:category,:amount,:currency,:notes,:raw_text,:receipt_path)"""),
-                dict(date=r[1], vendor=r[2], category=r[3], amount=r[4], currency=r[5],
-                     notes=r[6], raw_text=r[7], receipt_path=r[8])
-            )
-    print(f"Migrated {len(rows)} rows to Postgres.")
+        if not args.no_rollups:
+            async with AsyncSession(tgt) as db:
+                n = await rebuild_rollups(db)
+            print(f"Rebuilt {n} monthly rollup rows on the target.")
+        async with tgt.connect() as conn:
+            for table in tables:
+                n = (await conn.execute(select(func.count()).select_from(table))).scalar_one()
+                print(f"  {table.name}: {n} rows on target")
+    finally:
+        await src.dispose()
+        await tgt.dispose()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,18 @@
+"""
+Recompute the expense_monthly rollups from raw expenses, e.g. after rows were
+written outside the app (SQL console, migrate_sqlite_to_pg.py).
+
+    PYTHONPATH=. python scripts/rebuild_rollups.py
+"""
+import asyncio
+from app.core.db import SessionLocal, init_db
+from app.services.rollups import rebuild_rollups
+
+async def main():
+    await init_db()
+    async with SessionLocal() as db:
+        n = await rebuild_rollups(db)
+    print(f"Rebuilt {n} monthly rollup rows.")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,25 @@
+"""
+Re-file stored expenses using learned vendor history + keyword rules (no model calls).
+
+    PYTHONPATH=. python scripts/recategorize.py            # dry run, only rows in "Other"
+    PYTHONPATH=. python scripts/recategorize.py --all --apply
+"""
+import argparse, asyncio
+from app.core.db import SessionLocal, init_db
+from app.services.categorizer import vendor_table, recategorize
+
+async def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--all", action="store_true", help="consider every row, not just category 'Other'")
+    ap.add_argument("--apply", action="store_true", help="write changes (default is a dry run)")
+    args = ap.parse_args()
+    await init_db()
+    async with SessionLocal() as db:
+        n = await vendor_table.load(db)
+        changed = await recategorize(db, only_other=not args.all, dry_run=not args.apply)
+    print(f"Vendor table: {n} vendors.")
+    verb = "Recategorized" if args.apply else "Would recategorize"
+    print(f"{verb} {sum(changed.values())} rows: {changed}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
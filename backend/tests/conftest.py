@@ -0,0 +1,28 @@
+import os, tempfile
+
+# settings and the engine are read at import time: point everything at a scratch dir first
+_tmp = tempfile.mkdtemp(prefix="expense-tests-")
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+os.environ["SQLITE_PATH"] = os.path.join(_tmp, "expenses.sqlite")
+os.environ["UPLOAD_DIR"] = os.path.join(_tmp, "uploads")
+os.environ["RAG_INDEX_DIR"] = os.path.join(_tmp, "rag-index")
+os.environ["EMBED_CACHE_PATH"] = ""
+os.environ.pop("DATABASE_URL", None)
+
+import pytest
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+@pytest.fixture
+async def db():
+    """Fresh schema per test on the scratch SQLite file; yields a session."""
+    from app.core.db import Base, SessionLocal, engine, init_db
+    from app.models import expense, expense_rollup, receipt_parse  # noqa: F401  (register tables)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+    await init_db()
+    async with SessionLocal() as session:
+        yield session
+    await engine.dispose()  # connections are bound to this test's event loop
@@ -0,0 +1,25 @@
+import pytest
+from app.services.chat_cache import ChatCache
+from app.services.expense_service import data_version
+
+def test_follow_up_only_hits_after_the_same_previous_turn():
+    cache = ChatCache(max_entries=10, ttl_s=60)
+    cache.put("s1", "and for groceries?", "You spent $40 on groceries last month.", data_version(), "ctx-a")
+    assert cache.get("s1", "And for groceries", "ctx-a") == "You spent $40 on groceries last month."
+    assert cache.get("s1", "and for groceries?", "ctx-b") is None
+    assert cache.get("s1", "and for groceries?", "") is None
+
+@pytest.mark.anyio
+async def test_local_turns_are_recorded_in_the_session():
+    from app.core.runtime import ensure_session, record_turn, turn_context
+    sid = "test-record-turn"
+    assert await turn_context(sid) == ""
+    await record_turn(sid, "how much did I spend this month", "You spent $12.00 this month.")
+    first = await turn_context(sid)
+    assert first != ""
+    session = await ensure_session(sid)
+    assert [e.author for e in session.events][-2:] == ["user", "expense_assistant"]
+    assert session.events[-1].content.parts[0].text == "You spent $12.00 this month."
+
+    await record_turn(sid, "and last month?", "You spent $30.00 last month.")
+    assert await turn_context(sid) not in ("", first)
@@ -0,0 +1,32 @@
+import base64
+import json
+from datetime import date
+
+import pytest
+
+from app.services.expense_service import decode_cursor, encode_cursor, list_expenses_page
+
+def _raw(payload) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+def test_round_trip():
+    assert decode_cursor(encode_cursor(date(2024, 2, 29), 2 ** 63 - 1)) == (date(2024, 2, 29), 2 ** 63 - 1)
+
+@pytest.mark.parametrize("cursor", [
+    "not-base64!",
+    _raw(["2024-01-01", 10 ** 24]),
+    _raw(["2024-01-01", -1]),
+    _raw(["2024-01-01", 1e400]),   # json.dumps writes Infinity
+    _raw(["2024-01-01", "x"]),
+    _raw(["2024-13-01", 1]),
+    _raw(["2024-01-01"]),
+    _raw({"d": "2024-01-01"}),
+])
+def test_bad_cursors_are_value_errors(cursor):
+    with pytest.raises(ValueError, match="Invalid cursor."):
+        decode_cursor(cursor)
+
+@pytest.mark.anyio
+async def test_oversized_id_is_rejected_before_the_query(db):
+    with pytest.raises(ValueError, match="Invalid cursor."):
+        await list_expenses_page(db, cursor=_raw(["2024-01-01", 10 ** 24]))
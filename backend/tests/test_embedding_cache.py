@@ -0,0 +1,18 @@
+from app.services.embedding_cache import EmbeddingCache
+
+def test_disk_tier_opens_on_first_use_and_survives_restart(tmp_path):
+    path = tmp_path / "cache" / "embeddings.sqlite"
+    calls = []
+    def embed(texts):
+        calls.append(list(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+
+    cache = EmbeddingCache("local", "m", max_entries=10, path=str(path))
+    assert not path.exists()
+    assert cache.stats()["disk_entries"] is None and not path.exists()
+    assert cache.get_many(["ab", "abc", "ab"], embed) == [[2.0, 1.0], [3.0, 1.0], [2.0, 1.0]]
+    assert path.exists() and calls == [["ab", "abc"]]
+
+    again = EmbeddingCache("local", "m", max_entries=10, path=str(path))
+    assert again.get_many(["abc"], embed) == [[3.0, 1.0]]
+    assert calls == [["ab", "abc"]] and again.disk_hits == 1
@@ -0,0 +1,55 @@
+import io
+import threading
+
+import pytest
+
+from app.services import importer
+
+CSV = """Date,Description,Amount,Category
+2024-01-03,Blue Bottle,4.50,Food
+2024-01-04,,3.00,Food
+2024-01-05,Shell,40.00,Transport
+not a date,Corner Shop,2.00,Food
+2024-01-06,Blue Bottle,4.50,Food
+"""
+
+@pytest.mark.anyio
+async def test_import_parses_off_the_event_loop(db, monkeypatch):
+    loop_thread = threading.get_ident()
+    parsed_on = set()
+    to_row = importer.to_row
+
+    def spy(*args, **kwargs):
+        parsed_on.add(threading.get_ident())
+        return to_row(*args, **kwargs)
+
+    monkeypatch.setattr(importer, "to_row", spy)
+    report = await importer.import_expenses(db, io.StringIO(CSV), fmt="csv", batch_size=2)
+
+    assert parsed_on and loop_thread not in parsed_on
+    assert (report.lines, report.inserted, report.failed, report.batches) == (5, 3, 2, 2)
+    assert [e["line"] for e in report.errors] == [3, 5]
+
+@pytest.mark.anyio
+async def test_reimport_is_all_duplicates(db):
+    await importer.import_expenses(db, io.StringIO(CSV), fmt="csv")
+    again = await importer.import_expenses(db, io.StringIO(CSV), fmt="csv")
+    assert (again.inserted, again.duplicates) == (0, 3)
+
+@pytest.mark.anyio
+async def test_non_finite_amounts_are_line_errors(db):
+    csv_text = ("Date,Description,Amount\n"
+                "2024-01-03,Blue Bottle,4.50\n"
+                "2024-01-04,A,nan\n"
+                "2024-01-05,B,inf\n"
+                "2024-01-06,C,1e309\n"
+                "2024-01-07,D,-Infinity\n")
+    jsonl = ('{"date": "2024-01-08", "vendor": "E", "amount": NaN}\n'
+             '{"date": "2024-01-09", "vendor": "F", "amount": Infinity}\n'
+             '{"date": "2024-01-10", "vendor": "G", "amount": 1' + "0" * 400 + '}\n'
+             '{"date": "2024-01-11", "vendor": "H", "amount": 2.5}\n')
+    a = await importer.import_expenses(db, io.StringIO(csv_text), fmt="csv")
+    b = await importer.import_expenses(db, io.StringIO(jsonl), fmt="jsonl")
+    assert (a.inserted, a.failed, [e["line"] for e in a.errors]) == (1, 4, [3, 4, 5, 6])
+    assert (b.inserted, b.failed, [e["line"] for e in b.errors]) == (1, 3, [1, 2, 3])
+    assert all("invalid amount" in e["error"] for e in a.errors + b.errors)
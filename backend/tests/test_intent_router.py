@@ -0,0 +1,35 @@
+from datetime import date
+import pytest
+from app.services.intent_router import route
+
+TODAY = date(2024, 5, 15)
+
+@pytest.mark.parametrize("q,kind,start,end,category", [
+    ("how much did I spend this month", "total", date(2024, 5, 1), TODAY, None),
+    ("How much did I spend on dining last month?", "total", date(2024, 4, 1), date(2024, 4, 30), "Dining"),
+    ("total spent on groceries in March", "total", date(2024, 3, 1), date(2024, 3, 31), "Groceries"),
+    ("breakdown by category this year", "breakdown", date(2024, 1, 1), TODAY, None),
+    ("what have I spent so far", "total", None, None, None),
+])
+def test_routes_plain_spend_questions(q, kind, start, end, category):
+    intent = route(q, today=TODAY)
+    assert intent is not None
+    assert (intent.kind, intent.start, intent.end, intent.category) == (kind, start, end, category)
+
+@pytest.mark.parametrize("q", [
+    "how much can I spend on dining this month",
+    "how much could I save on groceries",
+    "how much should I spend this month",
+    "how much did I spend at starbucks last month",
+    "add an expense of 12 dollars for lunch",
+    "breakdown of dining this month",
+    "what are the categories",
+    "and for groceries?",
+    "how much did I spend from 2024-05-01 to 2024-04-01",
+    "how much did I spend since 2024-02-30",
+    "total spent from 2024-13-01 to 2024-12-31",
+    "how much did I spend in 0000",
+    "how much did I spend in march 0000",
+])
+def test_falls_through_to_the_agent(q):
+    assert route(q, today=TODAY) is None
@@ -0,0 +1,42 @@
+import threading
+from app.services.lexical import BM25Index, rrf_fuse
+
+def test_search_ranks_matching_chunks():
+    idx = BM25Index()
+    idx.upsert([{"id": "a", "text": "Groceries include supermarket food"},
+                {"id": "b", "text": "Fuel and parking go under Transport"}])
+    assert [h["id"] for h in idx.search("where does parking go")] == ["b"]
+    idx.delete(["b"])
+    assert idx.search("parking") == []
+
+def test_search_is_safe_during_concurrent_writes():
+    idx = BM25Index()
+    idx.upsert([{"id": f"seed{i}", "text": f"coffee receipt {i}"} for i in range(50)])
+    errors, stop = [], threading.Event()
+
+    def writer():
+        n = 0
+        while not stop.is_set():
+            idx.upsert([{"id": f"w{n}", "text": f"coffee term{n} receipt"}])
+            idx.delete([f"w{n - 5}"])
+            n += 1
+
+    def reader():
+        try:
+            for _ in range(300):
+                idx.search("coffee receipt", k=5)
+        except Exception as e:  # "dictionary changed size during iteration" before the fix
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads[1:]:
+        t.join()
+    stop.set()
+    threads[0].join()
+    assert errors == []
+
+def test_rrf_prefers_docs_ranked_by_both():
+    fused = rrf_fuse([([{"id": "x"}, {"id": "y"}], 1.0), ([{"id": "y"}, {"id": "z"}], 1.0)], k=3)
+    assert fused[0]["id"] == "y"
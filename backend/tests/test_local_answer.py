@@ -0,0 +1,30 @@
+import threading
+
+import pytest
+
+from app import main
+from app.core.warmup import Warmup
+
+@pytest.mark.anyio
+async def test_category_rag_check_runs_off_the_event_loop(monkeypatch):
+    seen = []
+
+    def search(query, k):
+        seen.append(threading.get_ident())
+        return [{"text": " ".join(main.CATEGORIES)}]
+
+    monkeypatch.setattr(main, "rag_search", search)
+    monkeypatch.setattr(main, "warmup", Warmup())
+    assert await main._categories_answer() == main._format_categories()
+    assert seen and seen[0] != threading.get_ident()
+
+@pytest.mark.anyio
+async def test_category_rag_check_waits_for_warm_up(monkeypatch):
+    def search(query, k):
+        raise AssertionError("must not load the models before warm-up has")
+
+    w = Warmup()
+    w.register("embeddings", lambda: None, required=False)
+    monkeypatch.setattr(main, "rag_search", search)
+    monkeypatch.setattr(main, "warmup", w)
+    assert await main._categories_answer() == main._format_categories()
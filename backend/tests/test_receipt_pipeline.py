@@ -0,0 +1,54 @@
+import asyncio
+import time
+from pathlib import Path
+
+import pytest
+from sqlalchemy import func, select
+
+from app.core.db import SessionLocal
+from app.models.expense import Expense
+from app.models.receipt_parse import ReceiptParse
+from app.services import receipt_pipeline
+from app.services.receipt_store import StoredReceipt, put_cached_parse
+
+SHA = "ab" * 32
+PARSED = {"vendor": "Blue Bottle", "transaction_date": "2024-03-01", "total": 4.5, "currency": "USD",
+          "category_guess": "Dining", "items": [], "confidence": 0.9}
+
+@pytest.fixture
+def stored(tmp_path):
+    p = tmp_path / f"{SHA}.jpg"
+    p.write_bytes(b"\xff\xd8\xff")
+    return StoredReceipt(sha256=SHA, path=p, size=3, mime_type="image/jpeg")
+
+@pytest.fixture
+def slow_parse(monkeypatch):
+    def parse(_stored):
+        time.sleep(0.05)  # both uploads miss the cache and overlap in the model call
+        return dict(PARSED), {"bytes_in": 3, "bytes_out": 3}
+    monkeypatch.setattr(receipt_pipeline, "_parse_stored", parse)
+
+async def _upload(stored, **kw):
+    async with SessionLocal() as s:
+        return await receipt_pipeline.process_receipt(s, stored=stored, **kw)
+
+@pytest.mark.anyio
+async def test_concurrent_duplicate_uploads_share_one_row(db, stored, slow_parse):
+    a, b = await asyncio.gather(_upload(stored, dedupe=True), _upload(stored, dedupe=True))
+    assert a["inserted_id"] == b["inserted_id"] is not None
+    assert sorted([a["duplicate"], b["duplicate"]]) == [False, True]
+    assert await db.scalar(select(func.count()).select_from(Expense)) == 1
+    assert (await db.get(ReceiptParse, SHA)).expense_id == a["inserted_id"]
+
+@pytest.mark.anyio
+async def test_losing_the_cache_race_keeps_the_new_row_readable(db, stored, slow_parse, monkeypatch):
+    # another upload cached these bytes after our lookup missed
+    await put_cached_parse(db, SHA, PARSED, expense_id=None, receipt_path=None)
+
+    async def miss(_db, _sha):
+        return None
+    monkeypatch.setattr(receipt_pipeline, "get_cached_parse", miss)
+
+    out = await _upload(stored, dedupe=False)
+    assert out["inserted_id"] is not None and out["duplicate"] is False
+    assert await db.scalar(select(func.count()).select_from(Expense)) == 1
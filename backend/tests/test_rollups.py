@@ -0,0 +1,104 @@
+from datetime import date
+
+import pytest
+from sqlalchemy import select
+
+from app.core.settings import settings
+from app.models.expense_rollup import ExpenseMonthly
+from app.services import categorizer, rollups
+from app.services.expense_service import add_expenses_bulk, summary_by_category, total_spend
+
+D = date
+
+ROWS = [
+    # month edges, both case variants of one category, two currencies
+    (D(2024, 1, 1), "Blue Bottle", "Food", 4.5),
+    (D(2024, 1, 15), "Corner Shop", "food", 2.25),
+    (D(2024, 1, 31), "Shell", "Transport", 40.0),
+    (D(2024, 2, 1), "Blue Bottle", "Food", 5.0),
+    (D(2024, 2, 29), "Chevron", "Other", 35.0),
+    (D(2024, 3, 10), "Corner Shop", "FOOD", 3.0),
+    (D(2024, 3, 31), "Lyft", "Other", 18.0),
+    (D(2024, 4, 1), "Netflix", "Entertainment", 15.99),
+    (D(2024, 4, 30), "Shell", "Transport", 42.0),
+    (D(2023, 12, 31), "Blue Bottle", "Food", 4.0),
+]
+
+RANGES = [
+    (None, None),
+    (D(2024, 1, 1), D(2024, 3, 31)),    # whole months only
+    (D(2024, 1, 15), D(2024, 3, 10)),   # partial first and last month
+    (D(2024, 1, 31), D(2024, 2, 1)),    # no whole month in between
+    (D(2024, 2, 1), D(2024, 2, 28)),    # ends the day before a leap-month end
+    (D(2024, 3, 15), D(2024, 3, 20)),   # inside one month
+    (D(2024, 2, 2), None),              # open end
+    (None, D(2024, 2, 29)),             # open start
+    (None, D(2024, 1, 30)),
+    (D(2024, 5, 1), None),              # nothing there
+]
+
+async def _seed(db):
+    await add_expenses_bulk(db, [dict(date_=d, vendor=v, category=c, amount=a, currency="EUR" if v == "Netflix" else "USD")
+                                 for d, v, c, a in ROWS])
+
+async def _both(monkeypatch, fn):
+    monkeypatch.setattr(settings, "ROLLUPS_ENABLED", True)
+    with_rollups = await fn()
+    monkeypatch.setattr(settings, "ROLLUPS_ENABLED", False)
+    raw = await fn()
+    monkeypatch.setattr(settings, "ROLLUPS_ENABLED", True)
+    return with_rollups, raw
+
+def _by_category(summary):
+    return {r["category"]: pytest.approx(r["total"]) for r in summary if abs(r["total"]) > 1e-9}
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("start,end", RANGES)
+@pytest.mark.parametrize("category", [None, "food", "Food", "FOOD", "transport", "Nope"])
+async def test_total_spend_matches_raw(db, monkeypatch, start, end, category):
+    await _seed(db)
+    rolled, raw = await _both(monkeypatch, lambda: total_spend(db, start=start, end=end, category=category))
+    assert rolled == pytest.approx(raw)
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("start,end", RANGES)
+async def test_summary_matches_raw(db, monkeypatch, start, end):
+    await _seed(db)
+    rolled, raw = await _both(monkeypatch, lambda: summary_by_category(db, start=start, end=end))
+    assert _by_category(rolled) == _by_category(raw)
+
+@pytest.mark.parametrize("start,end,expected", [
+    (D(2024, 1, 1), D(2024, 3, 31), (D(2024, 1, 1), D(2024, 3, 1), [])),
+    (D(2024, 1, 15), D(2024, 3, 10),
+     (D(2024, 2, 1), D(2024, 2, 1), [(D(2024, 1, 15), D(2024, 1, 31)), (D(2024, 3, 1), D(2024, 3, 10))])),
+    (D(2024, 3, 15), D(2024, 3, 20), None),
+    (None, D(2024, 2, 28), (None, D(2024, 1, 1), [(D(2024, 2, 1), D(2024, 2, 28))])),
+    (D(2024, 2, 2), None, (D(2024, 3, 1), None, [(D(2024, 2, 2), D(2024, 2, 29))])),
+    (None, None, (None, None, [])),
+])
+def test_split_range(start, end, expected):
+    assert rollups.split_range(start, end) == expected
+
+async def _rollup_rows(db):
+    res = await db.execute(select(ExpenseMonthly.month, ExpenseMonthly.category, ExpenseMonthly.currency,
+                                  ExpenseMonthly.total, ExpenseMonthly.count).where(ExpenseMonthly.count != 0))
+    return {(m, c, cur): (pytest.approx(t), n) for m, c, cur, t, n in res.all()}
+
+@pytest.mark.anyio
+async def test_recategorize_moves_rollup_amounts(db, monkeypatch):
+    await _seed(db)
+    # fresh table: only the keyword rules decide, not what the seed taught the shared one
+    monkeypatch.setattr(categorizer, "vendor_table", categorizer.VendorTable())
+    before = await total_spend(db, category="transport")
+
+    changed = await categorizer.recategorize(db, only_other=True, dry_run=False)
+
+    assert changed == {"Transport": 2}
+    assert await total_spend(db, category="transport") == pytest.approx(before + 35.0 + 18.0)
+    assert await total_spend(db, category="other") == pytest.approx(0.0)
+    moved = await _rollup_rows(db)
+    assert moved[(D(2024, 2, 1), "Transport", "USD")] == (pytest.approx(35.0), 1)
+    assert (D(2024, 3, 1), "Other", "USD") not in moved
+    # the incremental moves leave the table exactly as a full rebuild would
+    await rollups.rebuild_rollups(db)
+    assert await _rollup_rows(db) == moved
@@ -0,0 +1,55 @@
+import multiprocessing as mp
+import threading
+
+import pytest
+
+from app.services.vector_store import NumpyStore, VectorStore
+
+def _vec(n: int):
+    return [float(n % 7 + 1), float(n % 5 + 1), 1.0]
+
+def _upsert_range(path: str, start: int, n: int):
+    store = NumpyStore(path)
+    for i in range(start, start + n):
+        store.upsert([f"c{i}"], [_vec(i)], [f"doc {i}"], [{"i": i}])
+
+def test_incomplete_store_fails_at_instantiation():
+    class Partial(VectorStore):
+        def count(self):
+            return 0
+
+    with pytest.raises(TypeError):
+        Partial()
+
+def test_concurrent_upserts_lose_nothing(tmp_path):
+    threads = [threading.Thread(target=_upsert_range, args=(str(tmp_path), t * 25, 25)) for t in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    store = NumpyStore(str(tmp_path))
+    assert store.count() == 100
+    assert sorted(store.ids()) == sorted(f"c{i}" for i in range(100))
+
+def test_cross_process_writers_keep_every_row_and_one_generation(tmp_path):
+    ctx = mp.get_context("fork")
+    procs = [ctx.Process(target=_upsert_range, args=(str(tmp_path), p * 20, 20)) for p in range(3)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    assert all(p.exitcode == 0 for p in procs)
+    store = NumpyStore(str(tmp_path))
+    assert store.count() == 60
+    # each writer removed only the generation it replaced, so exactly the live one is left
+    assert len(list(tmp_path.glob("vectors-*.f32"))) == 1
+
+def test_delete_and_metadata_updates(tmp_path):
+    store = NumpyStore(str(tmp_path))
+    store.upsert(["a", "b"], [_vec(1), _vec(2)], ["A", "B"], [{"k": 1}, {"k": 2}])
+    store.update_metadatas(["b"], [{"k": 20}])
+    store.delete(["a"])
+    ids, docs, metas = store.get_all()
+    assert (ids, docs, metas) == (["b"], ["B"], [{"k": 20}])
+    (hits,) = store.query([_vec(2)], k=1)
+    assert hits[0]["id"] == "b"
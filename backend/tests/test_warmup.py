@@ -0,0 +1,51 @@
+import asyncio
+import pytest
+from app.core.warmup import Warmup
+
+def _flaky(failures: int):
+    calls = {"n": 0}
+    def fn():
+        calls["n"] += 1
+        if calls["n"] <= failures:
+            raise RuntimeError("not yet")
+        return {"loaded": True}
+    return fn, calls
+
+@pytest.mark.anyio
+async def test_failed_step_is_retried_until_ready():
+    w = Warmup(attempts=4, retry_s=0.01)
+    fn, calls = _flaky(2)
+    w.register("agent", fn)
+    w.start()
+    await asyncio.wait_for(w._task, 5)
+    assert w.ready() and calls["n"] == 3
+    assert w.components["agent"]["status"] == "ready" and w.components["agent"]["attempts"] == 3
+
+@pytest.mark.anyio
+async def test_optional_failure_does_not_block_readiness():
+    w = Warmup(attempts=2, retry_s=0.01)
+    broken, calls = _flaky(100)
+    w.register("rag_index", broken, required=False)
+    w.register("agent", lambda: None)
+    w.start()
+    await asyncio.wait_for(w._task, 5)
+    assert w.ready() and calls["n"] == 2
+    assert w.stats()["degraded"] == ["rag_index"]
+
+@pytest.mark.anyio
+async def test_required_failure_keeps_not_ready():
+    w = Warmup(attempts=2, retry_s=0.01)
+    broken, _ = _flaky(100)
+    w.register("agent", broken)
+    w.start()
+    await asyncio.wait_for(w._task, 5)
+    assert not w.ready() and w.components["agent"]["status"] == "failed"
+
+@pytest.mark.anyio
+async def test_pending_until_the_component_is_ready():
+    w = Warmup(attempts=1)
+    w.register("embeddings", lambda: None, required=False)
+    assert w.pending("embeddings") and not w.pending("unregistered")
+    w.start()
+    await asyncio.wait_for(w._task, 5)
+    assert not w.pending("embeddings", "unregistered")
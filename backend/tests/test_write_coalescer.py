@@ -0,0 +1,108 @@
+import asyncio
+from datetime import date
+
+import pytest
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.db import engine, make_engine
+from app.core.settings import settings
+from app.models.expense import Expense
+from app.services import expense_service
+from app.services.expense_service import add_expense, add_expenses_bulk, total_spend
+from app.services.write_coalescer import WriteCoalescer
+
+def _recording_write(fail_on=None):
+    calls = []
+
+    async def write(rows):
+        calls.append(list(rows))
+        if any(r.get("vendor") == fail_on for r in rows):
+            raise RuntimeError("bad row")
+        return [f"id-{r['vendor']}" for r in rows]
+
+    return write, calls
+
+@pytest.mark.anyio
+async def test_callers_share_one_write_and_get_their_own_result():
+    write, calls = _recording_write()
+    c = WriteCoalescer(write, window_ms=20)
+    results = await asyncio.gather(*(c.submit({"vendor": f"v{i}"}) for i in range(5)))
+    assert results == [f"id-v{i}" for i in range(5)]
+    assert len(calls) == 1
+    assert (c.batches, c.rows) == (1, 5)
+
+@pytest.mark.anyio
+async def test_full_batch_is_written_without_waiting_for_the_window():
+    write, calls = _recording_write()
+    c = WriteCoalescer(write, window_ms=10_000, max_batch=3)
+    results = await asyncio.wait_for(asyncio.gather(*(c.submit({"vendor": f"v{i}"}) for i in range(3))), 1)
+    assert len(results) == 3 and len(calls) == 1
+
+@pytest.mark.anyio
+async def test_failed_batch_is_retried_row_by_row():
+    write, calls = _recording_write(fail_on="bad")
+    c = WriteCoalescer(write, window_ms=20)
+    results = await asyncio.gather(*(c.submit({"vendor": v}) for v in ("a", "bad", "b")),
+                                   return_exceptions=True)
+    assert results[0] == "id-a" and results[2] == "id-b"
+    assert isinstance(results[1], RuntimeError)
+    assert [len(b) for b in calls] == [3, 1, 1, 1]
+    assert c.retried == 3
+
+@pytest.mark.anyio
+async def test_drain_writes_pending_rows():
+    write, calls = _recording_write()
+    c = WriteCoalescer(write, window_ms=60_000)
+    waiting = [asyncio.ensure_future(c.submit({"vendor": f"v{i}"})) for i in range(3)]
+    await asyncio.sleep(0)
+    assert c.stats()["pending"] == 3 and not calls
+    await c.drain()
+    assert [w.result() for w in waiting] == ["id-v0", "id-v1", "id-v2"]
+    assert c.stats()["pending"] == 0 and c.stats()["in_flight"] == 0
+
+@pytest.mark.anyio
+async def test_coalesced_rows_keep_rollups_in_sync(db, monkeypatch):
+    monkeypatch.setattr(settings, "WRITE_COALESCE", True)
+    rows = [(date(2024, 1, 31), 10.0), (date(2024, 2, 1), 2.5), (date(2024, 2, 29), 7.25)]
+
+    async def add(d, amount):
+        async with expense_service.SessionLocal() as s:
+            return await add_expense(s, date_=d, vendor="Shell", category="Transport", amount=amount)
+
+    es = await asyncio.gather(*(add(d, a) for d, a in rows))
+    assert len({e.id for e in es}) == 3
+    assert expense_service.write_coalescer.rows >= 3
+    for start, end in [(None, None), (date(2024, 2, 1), date(2024, 2, 29)), (date(2024, 1, 15), None)]:
+        rolled = await total_spend(db, start=start, end=end, category="transport")
+        monkeypatch.setattr(settings, "ROLLUPS_ENABLED", False)
+        raw = await total_spend(db, start=start, end=end, category="transport")
+        monkeypatch.setattr(settings, "ROLLUPS_ENABLED", True)
+        assert rolled == pytest.approx(raw)
+
+@pytest.mark.anyio
+async def test_callers_holding_a_read_do_not_starve_the_pool(db, monkeypatch):
+    # 2 connections, no overflow: callers that read first must not keep theirs while
+    # they wait for the coalescer, which needs one to write the batch
+    small = make_engine(engine.url.render_as_string(hide_password=False),
+                        pool_size=2, max_overflow=0, pool_timeout=2)
+    Session = async_sessionmaker(small, expire_on_commit=False, class_=AsyncSession)
+
+    async def write(rows):
+        async with Session() as s:
+            return await add_expenses_bulk(s, rows)
+
+    monkeypatch.setattr(settings, "WRITE_COALESCE", True)
+    monkeypatch.setattr(expense_service, "write_coalescer", WriteCoalescer(write, window_ms=5))
+
+    async def caller(i):
+        async with Session() as s:
+            await s.scalar(select(func.count()).select_from(Expense))  # like the parse-cache lookup
+            return await add_expense(s, date_=date(2024, 3, 1), vendor=f"Vendor {i}", category="Other", amount=1.0)
+
+    try:
+        es = await asyncio.gather(*(caller(i) for i in range(10)))
+    finally:
+        await small.dispose()
+    assert len({e.id for e in es}) == 10
+    assert await db.scalar(select(func.count()).select_from(Expense)) == 10
@@ -1,26 +1,19 @@
+import argparse
 from pathlib import Path
-from datetime import datetime
-from hashlib import md5
-from app.services.rag import add_documents, reset_index
+from app.services.rag_bootstrap import load_markdown_docs, sync_index, rebuild_index
+
+DATA_DIR = Path(__file__).resolve().parent / "data"  # relative to THIS script, regardless of CWD
 
 def load_docs():
-    # Resolve data folder relative to THIS script, regardless of CWD
-    base = Path(__file__).resolve().parent / "data"
-    docs = []
-    for p in base.glob("*.md"):
-        text = p.read_text(encoding="utf-8")
-        docs.append({
-            "id": md5((p.name + str(len(text))).encode()).hexdigest(),
-            "text": text,
-            "metadata": {"source": str(p), "title": p.stem, "ingested_at": datetime.utcnow().isoformat()}
-        })
-    return docs
+    return load_markdown_docs(DATA_DIR)
 
 if __name__ == "__main__":
-    reset_index()
-    docs = load_docs()
-    if not docs:
+    ap = argparse.ArgumentParser(description="Sync the RAG index with rag/data/*.md")
+    ap.add_argument("--rebuild", action="store_true", help="drop the collection and re-embed everything")
+    args = ap.parse_args()
+    if not any(DATA_DIR.glob("*.md")):
         print("No docs found in rag/data. Create *.md files and re-run.")
     else:
-        n = add_documents(docs)
-        print(f"Ingested {n} docs.")
+        r = rebuild_index(DATA_DIR) if args.rebuild else sync_index(DATA_DIR)
+        print(f"{r.sources} docs: {r.unchanged} unchanged, {r.embedded} chunks embedded, "
+              f"{r.relabeled} relabeled, {r.deleted} deleted ({r.seconds}s).")